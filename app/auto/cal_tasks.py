@@ -1,3 +1,5 @@
+import time
+from concurrent.futures import as_completed
 from datetime import datetime, timedelta
 
 import logfire
@@ -5,15 +7,41 @@ from fastapi import HTTPException
 from googleapiclient.errors import HttpError
 
 from app.auto._utils import app_logger
+from app.cal.ratelimit import TokenBucket
 from app.cal.tasks import delete_calendar_watch_channel, initialize_trips_from_cal, sync_calendar_events
+from app.cal.workers import sync_scheduler
 from app.firebase_setup import db
 from app.models import PropertyCal
 from app.utils import settings
 
 
+def renew_property_channel(prop_id: str, external_calendar: str):
+    """
+    Renew the watch channel for a property and resync its calendar, recreating the channel if its id clashes.
+    """
+    property_ref = 'properties/' + prop_id
+    property_cal = PropertyCal(property_ref=property_ref, cal_id=external_calendar)
+    try:
+        initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
+        app_logger.info('Google Calendar ID successfully set.')
+    except HttpError as e:
+        error_message = str(e)
+        app_logger.error('Error setting Google Calendar ID: %s', error_message)
+        if 'not unique' not in error_message:
+            raise
+        with logfire.span('Channel id not unique'):
+            delete_calendar_watch_channel(property_cal.property_ref, settings.g_calendar_resource_id)
+            initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
+
+
 def auto_check_and_renew_channels(force_renew=False):
+    """
+    Renew the watch channels that expire within two days as rate limited bulk work on the sync scheduler.
+    """
     with logfire.span(f'auto_check_and_renew_channels; force renew: {force_renew}'):
+        start = time.monotonic()
         now = datetime.utcnow()
+        to_renew = []
         properties_ref = db.collection('properties').stream()
         for prop in properties_ref:
             app_logger.info('Checking property: %s', prop.id)
@@ -26,49 +54,109 @@ def auto_check_and_renew_channels(force_renew=False):
             if force_renew or (
                 channel_expiration and datetime.fromtimestamp(int(channel_expiration) / 1000) - now < timedelta(days=2)
             ):
-                app_logger.info('Renewing channel for property: %s', prop.id)
-                try:
-                    external_calendar = prop.get('externalCalendar')
-                    if not external_calendar:
-                        app_logger.info('externalCalendar not found for property: %s', prop.id)
-                        continue
-
-                    property_ref = 'properties/' + prop.id
-                    property_cal = PropertyCal(property_ref=property_ref, cal_id=external_calendar)
-
-                    initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
-                    app_logger.info('Google Calendar ID successfully set.')
-
-                except HttpError as e:
-                    error_message = str(e)
-                    app_logger.error('Error setting Google Calendar ID: %s', error_message)
-                    if 'not unique' in error_message:
-                        with logfire.span('Channel id not unique'):
-                            delete_calendar_watch_channel(property_cal.property_ref, settings.g_calendar_resource_id)
-                            initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
-                    else:
-                        app_logger.error('Unrecoverable error renewing channel for property: %s', prop.id)
+                external_calendar = prop.get('externalCalendar')
+                if not external_calendar:
+                    app_logger.info('externalCalendar not found for property: %s', prop.id)
                     continue
-
+                to_renew.append((prop.id, external_calendar))
             else:
                 app_logger.info('Channel for property: %s does not need to be renewed', prop.id)
-    app_logger.info('Finished auto_check_and_renew_channels')
+
+        # Renewals start no faster than the bucket allows, keeping them under the Calendar quota. The token is taken
+        # when a worker picks the renewal up, since renewals queued behind other bulk work would otherwise all start
+        # back to back once it clears
+        bucket = TokenBucket(settings.cal_renew_rate_per_second, capacity=settings.cal_renew_burst)
+
+        def renew(prop_id: str, external_calendar: str):
+            bucket.acquire()
+            app_logger.info('Renewing channel for property: %s', prop_id)
+            renew_property_channel(prop_id, external_calendar)
+
+        summary = {'renewed': 0, 'failed': 0, 'failed_properties': []}
+        futures = {}
+        for prop_id, cal_id in to_renew:
+            future = sync_scheduler.submit(
+                prop_id, lambda prop_id=prop_id, cal_id=cal_id: renew(prop_id, cal_id), 'bulk', block=True
+            )
+            futures[future] = prop_id
+        for future in as_completed(futures):
+            prop_id = futures[future]
+            try:
+                future.result()
+                summary['renewed'] += 1
+            except Exception as e:
+                app_logger.error('Unrecoverable error renewing channel for property: %s: %s', prop_id, e)
+                summary['failed'] += 1
+                summary['failed_properties'].append(prop_id)
+
+        summary['wall_seconds'] = round(time.monotonic() - start, 3)
+    app_logger.info(
+        'Finished auto_check_and_renew_channels: %s renewed, %s failed in %ss',
+        summary['renewed'],
+        summary['failed'],
+        summary['wall_seconds'],
+    )
+    return summary
 
 
-def resync_all_calendar_events():
+def resync_all_calendar_events(property_ids: list[str] | None = None):
     """
-    Resync all calendar events for all
+    Resync all calendar events for all properties with an external calendar, or just `property_ids`.
+
+    Properties are synced as bulk work on the sync scheduler with `sync_calendar_events` as the unit of work, so
+    webhook and manual syncs keep running ahead of them. A failing property does not stop the rest; the failures
+    are returned and recorded in `calendarResyncs` so they can be retried by passing them back in as
+    `property_ids`. Properties whose trips overlap are returned with their number of conflicting trips.
     """
     with logfire.span('resync_all_calendar_events'):
-        # Iterate over all property documents
-        properties_ref = db.collection('properties').stream()
-        for prop in properties_ref:
+        start = time.monotonic()
+        if property_ids is None:
+            properties = [
+                prop.reference
+                for prop in db.collection('properties').stream()
+                if prop.to_dict().get('externalCalendar')
+            ]
+        else:
+            properties = [db.collection('properties').document(prop_id) for prop_id in property_ids]
+
+        total = len(properties)
+        done = 0
+        failed_properties = []
+        conflicting_properties = {}
+        futures = {
+            sync_scheduler.submit(
+                prop_ref.id, lambda prop_ref=prop_ref: sync_calendar_events(prop_ref), 'bulk', block=True
+            ): prop_ref
+            for prop_ref in properties
+        }
+        for future in as_completed(futures):
+            prop_ref = futures[future]
+            done += 1
             try:
-                sync_calendar_events(prop.reference)
+                result = future.result()
+                app_logger.info('Calendar events for property: %s successfully synced', prop_ref.id)
+                if result and result['conflicts']:
+                    conflicting_properties[prop_ref.id] = len(result['conflicts'])
             except Exception as e:
-                app_logger.error('Error syncing calendar events for property: %s', prop.id)
+                app_logger.error('Error syncing calendar events for property: %s', prop_ref.id)
                 app_logger.error(e)
-                continue
-            app_logger.info('Calendar events for property: %s successfully synced', prop.id)
+                failed_properties.append(prop_ref.id)
+
+            elapsed = time.monotonic() - start
+            app_logger.info('Resynced %s/%s properties, ETA %.0fs', done, total, elapsed / done * (total - done))
+
+        summary = {
+            'total': total,
+            'synced': total - len(failed_properties),
+            'failed': len(failed_properties),
+            'failedProperties': failed_properties,
+            'conflictingProperties': conflicting_properties,
+            'wallSeconds': round(time.monotonic() - start, 3),
+        }
+        db.collection('calendarResyncs').add(dict(summary, processedAt=datetime.utcnow()))
 
-        app_logger.info('All calendar events successfully synced')
+        if failed_properties:
+            app_logger.error('Failed to sync calendar events for properties: %s', failed_properties)
+        else:
+            app_logger.info('All calendar events successfully synced')
+        return summary
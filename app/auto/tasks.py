@@ -7,29 +7,31 @@ from google.cloud.firestore_v1 import FieldFilter
 
 from app.auto._utils import app_logger
 from app.firebase_setup import db
+from app.property_cache import property_cache
+from app.user_cache import user_cache
 from app.utils import settings
 
 
 def get_contact_details(trip_doc, property_doc):
     """Get host and guest contact details from already-fetched trip/property docs."""
     with logfire.span('get_contact_details'):
-        host_doc = db.collection('users').document(property_doc.get('userRef').id).get()
-        if not host_doc.exists:
+        host = user_cache.get(property_doc.get('userRef'))
+        if host is None:
             app_logger.error('Host document does not exist for property: %s', property_doc.id)
             return None, None
 
-        if host_doc.get('smsOptIn'):
-            host_numbers = host_doc.get('phone_numbers')
+        if host.get('smsOptIn'):
+            host_numbers = host.get('phone_numbers')
         else:
             host_numbers = None
 
-        guest_doc = db.collection('users').document(trip_doc.get('userRef')).get()
-        if not guest_doc.exists:
+        guest = user_cache.get(trip_doc.get('userRef'))
+        if guest is None:
             app_logger.error('Guest document does not exist for trip: %s', trip_doc.id)
             return None, None
 
-        if guest_doc.get('smsOptIn'):
-            guest_number = guest_doc.get('phone_numbers')[0]
+        if guest.get('smsOptIn'):
+            guest_number = guest.get('phone_numbers')[0]
         else:
             guest_number = None
 
@@ -116,16 +118,14 @@ def sendgrid_email(trip_doc, property_doc, template_id: str, time: int = None, t
             'Authorization': f'Bearer {api_key}',
         }
 
-        # Host Doc
-        host_doc = db.collection('users').document(property_doc.get('userRef').id).get()
-
-        # Guest Doc
-        guest_doc = db.collection('users').document(trip_doc.get('userRef')).get()
+        # Host and guest profiles
+        host = user_cache.get(property_doc.get('userRef')) or {}
+        guest = user_cache.get(trip_doc.get('userRef')) or {}
 
         if to_host:
-            to_email = host_doc.get('email')
+            to_email = host.get('email')
         else:
-            to_email = guest_doc.get('email')
+            to_email = guest.get('email')
 
         # Data for the request
         data = {
@@ -134,7 +134,7 @@ def sendgrid_email(trip_doc, property_doc, template_id: str, time: int = None, t
                     'to': [{'email': f'{to_email}'}],
                     'dynamic_template_data': {
                         'office_name': f"{property_doc.get('propertyName')}",
-                        'guest_name': f"{guest_doc.get('display_name')}",
+                        'guest_name': f"{guest.get('display_name')}",
                         'property_image': f"{property_doc.get('mainImage')[0]}",
                         'start_date_time': f"{trip_doc.get('tripBeginDateTime')}",
                         'end_date_time': f"{trip_doc.get('tripEndDateTime')}",
@@ -186,7 +186,7 @@ def auto_complete_and_notify():
     Automatically mark completed trips and send reminders.
     Uses two targeted Firestore queries instead of iterating all properties/trips.
     """
-    with logfire.span('auto_complete_and_notify'):
+    with logfire.span('auto_complete_and_notify'), user_cache.track('auto_complete_and_notify'):
         now = datetime.now(timezone.utc)
         reminder_cutoff = now + timedelta(hours=25)
 
@@ -213,7 +213,7 @@ def auto_complete_and_notify():
                     app_logger.error('Trip %s has no propertyRef', trip.id)
                     continue
 
-                property_doc = property_ref.get()
+                property_doc = property_cache.get(property_ref)
                 if not property_doc.exists:
                     app_logger.error('Property document not found for trip %s', trip.id)
                     continue
@@ -252,7 +252,7 @@ def auto_complete_and_notify():
                     app_logger.error('Trip %s has no propertyRef', trip.id)
                     continue
 
-                property_doc = property_ref.get()
+                property_doc = property_cache.get(property_ref)
                 if not property_doc.exists:
                     app_logger.error('Property document not found for trip %s', trip.id)
                     continue
@@ -8,13 +8,14 @@ from app.auto._utils import app_logger
 from app.firebase_setup import current_time, db
 from app.models import ActorRole, Status, TransactionType
 from app.pay.tasks import calculate_fees
+from app.user_cache import user_cache
 from app.utils import settings
 
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
 
 
 def process_transactions():
-    with logfire.span('process_transactions'):
+    with logfire.span('process_transactions'), user_cache.track('process_transactions'):
         app_logger.info('Starting cron job to process transactions in escrow')
 
         transactions_ref = (
@@ -64,10 +65,13 @@ def process_transactions():
                         len(refund_transactions),
                     )
 
+                    # Hosts usually receive several transactions, so load each of them once
+                    user_cache.prefetch(t.get('receiverRef') for t in host_transactions)
+
                     if not refund_transactions:
                         for host_transaction in host_transactions:
                             receiver_ref = host_transaction.get('receiverRef')
-                            user = db.collection('users').document(receiver_ref.split('/')[1]).get()
+                            user = user_cache.get(receiver_ref) or {}
                             stripe_account_id = user.get('stripeAccountID')
 
                             if stripe_account_id:
@@ -121,7 +125,7 @@ def process_transactions():
                             t.reference.update({'status': Status.merged})
 
                         receiver_ref = new_transaction_data['receiverRef']
-                        user = db.collection('users').document(receiver_ref.split('/')[1]).get()
+                        user = user_cache.get(receiver_ref) or {}
                         stripe_account_id = user.get('stripeAccountID')
 
                         if stripe_account_id:
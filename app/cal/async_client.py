@@ -0,0 +1,136 @@
+import asyncio
+from typing import Any, AsyncIterator
+from urllib.parse import quote
+
+import httplib2
+import httpx
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+
+from app.cal.client import creds, google_api_limiter
+from app.cal.ratelimit import GoogleApiLimiter, is_idempotent
+from app.utils import settings
+
+CALENDAR_API_URL = 'https://www.googleapis.com/calendar/v3'
+
+
+def _query(params: dict) -> dict:
+    # Google expects lowercase booleans and no empty parameters
+    return {
+        key: ('true' if value else 'false') if isinstance(value, bool) else value
+        for key, value in params.items()
+        if value is not None
+    }
+
+
+class AsyncCalendarClient:
+    """
+    Google Calendar client for async code, built on a single httpx.AsyncClient.
+
+    It covers the calls the cal subsystem makes: events list, insert, update, delete and watch, and channels stop.
+    Parameters are passed through under the same names the googleapiclient service takes. Every call goes through
+    the shared Google API limiter, and failed calls raise googleapiclient's HttpError, so callers handle both clients
+    the same way. The access token is refreshed with google-auth, off the event loop, shortly before it expires.
+    The httpx client is created on first use and keeps its connections open until aclose().
+    """
+
+    def __init__(
+        self,
+        credentials,
+        base_url: str = CALENDAR_API_URL,
+        timeout: float = 30,
+        max_connections: int = 100,
+        limiter: GoogleApiLimiter = google_api_limiter,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self._credentials = credentials
+        self.base_url = base_url.rstrip('/')
+        self._timeout = timeout
+        # httpx keeps 20 idle connections; keeping more makes its pool slower, as it checks each one per request
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=20)
+        self._limiter = limiter
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._refresh_lock = asyncio.Lock()
+        self._stats = {'requests': 0, 'errors': 0, 'token_refreshes': 0}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits, transport=self._transport)
+        return self._client
+
+    async def _token(self) -> str:
+        if not self._credentials.valid:
+            async with self._refresh_lock:
+                if not self._credentials.valid:
+                    await asyncio.to_thread(self._credentials.refresh, Request())
+                    self._stats['token_refreshes'] += 1
+        return self._credentials.token
+
+    async def _request(
+        self, method: str, path: str, calendar_id: str | None = None, params: dict | None = None, body: Any = None
+    ) -> dict | None:
+        url = self.base_url + path
+
+        async def send():
+            headers = {'Authorization': f'Bearer {await self._token()}'}
+            self._stats['requests'] += 1
+            try:
+                response = await self._http().request(
+                    method, url, params=_query(params or {}), json=body, headers=headers
+                )
+            except httpx.TimeoutException as e:
+                raise TimeoutError(str(e)) from e
+            except httpx.TransportError as e:
+                raise ConnectionError(str(e)) from e
+            if response.is_error:
+                self._stats['errors'] += 1
+                resp = httplib2.Response(dict(response.headers, status=response.status_code))
+                raise HttpError(resp, response.content, uri=str(response.url))
+            return response.json() if response.content else None
+
+        return await self._limiter.call_async(send, calendar_id=calendar_id, idempotent=is_idempotent(method))
+
+    def _events_path(self, calendar_id: str, event_id: str | None = None) -> str:
+        path = f'/calendars/{quote(calendar_id, safe="")}/events'
+        return f'{path}/{quote(event_id, safe="")}' if event_id else path
+
+    async def events_list(self, calendar_id: str, **params) -> dict:
+        return await self._request('GET', self._events_path(calendar_id), calendar_id, params)
+
+    async def event_pages(self, calendar_id: str, **params) -> AsyncIterator[dict]:
+        """
+        Yield every page of an events list, following nextPageToken.
+        """
+        while True:
+            page = await self.events_list(calendar_id, **params)
+            yield page
+            if not page.get('nextPageToken'):
+                return
+            params['pageToken'] = page['nextPageToken']
+
+    async def events_insert(self, calendar_id: str, body: dict, **params) -> dict:
+        return await self._request('POST', self._events_path(calendar_id), calendar_id, params, body)
+
+    async def events_update(self, calendar_id: str, event_id: str, body: dict, **params) -> dict:
+        return await self._request('PUT', self._events_path(calendar_id, event_id), calendar_id, params, body)
+
+    async def events_delete(self, calendar_id: str, event_id: str, **params) -> None:
+        await self._request('DELETE', self._events_path(calendar_id, event_id), calendar_id, params)
+
+    async def events_watch(self, calendar_id: str, body: dict, **params) -> dict:
+        return await self._request('POST', self._events_path(calendar_id) + '/watch', calendar_id, params, body)
+
+    async def channels_stop(self, body: dict) -> None:
+        await self._request('POST', '/channels/stop', body=body)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+async_calendar_client = AsyncCalendarClient(creds, timeout=settings.g_calendar_http_timeout)
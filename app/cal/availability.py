@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from app.cal._utils import app_logger
+from app.cal.conflicts import _property_id, trip_seconds, upcoming_trips
+from app.firebase_setup import db
+from app.utils import settings
+
+SLOT_SECONDS = 15 * 60
+SLOTS_PER_DAY = 24 * 60 * 60 // SLOT_SECONDS
+
+
+def _slots(start: datetime, end: datetime) -> tuple[int, int]:
+    # Any slot a trip touches is busy, so round the start down and the end up
+    return math.floor(trip_seconds(start) / SLOT_SECONDS), math.ceil(trip_seconds(end) / SLOT_SECONDS)
+
+
+def _day_mask(day: int, start_slot: int, end_slot: int) -> int:
+    low = max(start_slot - day * SLOTS_PER_DAY, 0)
+    high = min(end_slot - day * SLOTS_PER_DAY, SLOTS_PER_DAY)
+    return ((1 << (high - low)) - 1) << low if high > low else 0
+
+
+def _slot_time(slot: int) -> datetime:
+    return datetime.fromtimestamp(slot * SLOT_SECONDS, tz=timezone.utc)
+
+
+class _PropertyAvailability:
+    __slots__ = ('trips', 'days', 'day_trips', 'expires')
+
+    def __init__(self, expires: float):
+        # Each trip's slots, the busy slots of each UTC day as a bitmap and the trips on each day
+        self.trips: dict[str, tuple[int, int]] = {}
+        self.days: dict[int, int] = {}
+        self.day_trips: dict[int, set[str]] = {}
+        self.expires = expires
+
+    def _refresh(self, days: range):
+        for day in days:
+            mask = 0
+            for trip_id in self.day_trips.get(day, ()):
+                mask |= _day_mask(day, *self.trips[trip_id])
+            if mask:
+                self.days[day] = mask
+            else:
+                self.days.pop(day, None)
+                self.day_trips.pop(day, None)
+
+    def put(self, trip_id: str, start_slot: int, end_slot: int):
+        if self.trips.get(trip_id) == (start_slot, end_slot):
+            return
+        self.remove(trip_id)
+        self.trips[trip_id] = (start_slot, end_slot)
+        days = range(start_slot // SLOTS_PER_DAY, (end_slot - 1) // SLOTS_PER_DAY + 1)
+        for day in days:
+            self.day_trips.setdefault(day, set()).add(trip_id)
+        self._refresh(days)
+
+    def remove(self, trip_id: str):
+        slots = self.trips.pop(trip_id, None)
+        if slots is None:
+            return
+        days = range(slots[0] // SLOTS_PER_DAY, (slots[1] - 1) // SLOTS_PER_DAY + 1)
+        for day in days:
+            self.day_trips.get(day, set()).discard(trip_id)
+        self._refresh(days)
+
+    def busy(self, start_slot: int, end_slot: int) -> list[tuple[int, int]]:
+        runs = []
+        for day in range(start_slot // SLOTS_PER_DAY, (end_slot - 1) // SLOTS_PER_DAY + 1):
+            mask = self.days.get(day, 0) & _day_mask(day, start_slot, end_slot)
+            while mask:
+                low = (mask & -mask).bit_length() - 1
+                shifted = mask >> low
+                length = (~shifted & (shifted + 1)).bit_length() - 1
+                mask &= ~(((1 << length) - 1) << low)
+                run_start = day * SLOTS_PER_DAY + low
+                # Join runs that carry on across midnight
+                if runs and runs[-1][1] == run_start:
+                    runs[-1] = (runs[-1][0], run_start + length)
+                else:
+                    runs.append((run_start, run_start + length))
+        return runs
+
+
+class AvailabilityIndex:
+    """
+    Busy 15-minute slots of each property's upcoming trips, kept in memory as one bitmap per UTC day.
+
+    A property is loaded with a single Firestore query the first time it is needed, kept up to date as syncs create,
+    move and cancel its trips, and reloaded after `ttl` seconds so trips written elsewhere are picked up. Only the
+    days a trip touches are recomputed when it changes, and a free/busy lookup reads one bitmap per day asked about.
+    """
+
+    def __init__(self, db, ttl: float, collection: str = 'trips'):
+        self._db = db
+        self.ttl = ttl
+        self.collection = collection
+        self._properties: dict[str, _PropertyAvailability] = {}
+        self._trip_properties: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'lookups': 0, 'updates': 0}
+
+    def _load(self, property_ref: Any) -> list[tuple[str, float, float]]:
+        trips = upcoming_trips(self._db, property_ref, self.collection)
+        app_logger.info('Loaded %s upcoming trips into availability for property: %s', len(trips), property_ref)
+        return trips
+
+    def _property(self, property_ref: Any) -> _PropertyAvailability:
+        property_id = _property_id(property_ref)
+        with self._lock:
+            availability = self._properties.get(property_id)
+            if availability is not None and availability.expires > time.monotonic():
+                return availability
+
+        availability = _PropertyAvailability(time.monotonic() + self.ttl)
+        for trip_id, start, end in self._load(property_ref):
+            availability.put(trip_id, math.floor(start / SLOT_SECONDS), math.ceil(end / SLOT_SECONDS))
+        with self._lock:
+            self._stats['loads'] += 1
+            for trip_id, trip_property_id in list(self._trip_properties.items()):
+                if trip_property_id == property_id:
+                    del self._trip_properties[trip_id]
+            self._trip_properties.update(dict.fromkeys(availability.trips, property_id))
+            self._properties[property_id] = availability
+        return availability
+
+    def put(self, property_ref: Any, trip_id: str, start: datetime, end: datetime):
+        """
+        Mark a trip's slots as busy, freeing the slots it held before if it has moved.
+        """
+        availability = self._property(property_ref)
+        start_slot, end_slot = _slots(start, end)
+        with self._lock:
+            self._forget(trip_id)
+            if end_slot > start_slot:
+                availability.put(trip_id, start_slot, end_slot)
+                self._trip_properties[trip_id] = _property_id(property_ref)
+            self._stats['updates'] += 1
+
+    def _forget(self, trip_id: str):
+        property_id = self._trip_properties.pop(trip_id, None)
+        availability = self._properties.get(property_id)
+        if availability is not None:
+            availability.remove(trip_id)
+
+    def remove(self, trip_id: str):
+        """
+        Free the slots of a trip that was cancelled or deleted.
+        """
+        with self._lock:
+            self._forget(trip_id)
+
+    def invalidate(self, property_ref: Any):
+        with self._lock:
+            self._properties.pop(_property_id(property_ref), None)
+
+    def busy(self, property_ref: Any, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        """
+        The busy periods of a property between `start` and `end`, to the nearest slot; an empty list means free.
+        """
+        availability = self._property(property_ref)
+        start_slot, end_slot = _slots(start, end)
+        with self._lock:
+            self._stats['lookups'] += 1
+            runs = availability.busy(start_slot, end_slot) if end_slot > start_slot else []
+        return [(_slot_time(run_start), _slot_time(run_end)) for run_start, run_end in runs]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                properties=len(self._properties),
+                trips=len(self._trip_properties),
+                days=sum(len(availability.days) for availability in self._properties.values()),
+            )
+
+
+availability_index = AvailabilityIndex(db, ttl=settings.cal_availability_ttl_seconds)
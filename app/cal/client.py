@@ -0,0 +1,111 @@
+import json
+import re
+import threading
+import time
+from urllib.parse import unquote
+
+import httplib2
+from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest
+
+from app.cal._utils import app_logger
+from app.cal.ratelimit import GoogleApiLimiter, is_idempotent
+from app.utils import settings
+
+creds = service_account.Credentials.from_service_account_info(
+    settings.firebase_credentials, scopes=['https://www.googleapis.com/auth/calendar']
+)
+
+google_api_limiter = GoogleApiLimiter(
+    rate=settings.g_calendar_rate_per_second,
+    burst=settings.g_calendar_burst,
+    calendar_share=settings.g_calendar_per_calendar_share,
+    max_retries=settings.g_calendar_max_retries,
+    base_delay=settings.g_calendar_backoff_base_seconds,
+    max_delay=settings.g_calendar_backoff_max_seconds,
+)
+
+CALENDAR_ID_PATTERN = re.compile(r'/calendars/([^/?]+)')
+
+
+def calendar_id_from_uri(uri: str) -> str | None:
+    match = CALENDAR_ID_PATTERN.search(uri or '')
+    return unquote(match.group(1)) if match else None
+
+
+class ThrottledHttpRequest(HttpRequest):
+    """
+    HttpRequest that goes through the shared Google API limiter, so every Calendar call is rate limited and retried.
+    Inserts and other POST requests are only retried when throttled.
+    """
+
+    def execute(self, http=None, num_retries=0):
+        return google_api_limiter.call(
+            lambda: super(ThrottledHttpRequest, self).execute(http=http, num_retries=num_retries),
+            calendar_id=calendar_id_from_uri(self.uri),
+            idempotent=is_idempotent(self.method),
+        )
+
+
+class CalendarClientProvider:
+    """
+    Hands out Google Calendar service objects without calling build() on every request.
+
+    The bundled static discovery document is parsed once per process, the credentials are shared by every
+    thread and each thread keeps its own service built on a persistent httplib2 connection, since httplib2
+    is not thread-safe.
+    """
+
+    def __init__(self, credentials, timeout: int = 30):
+        self._credentials = credentials
+        self._timeout = timeout
+        self._discovery_doc = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'builds': 0, 'build_seconds': 0.0, 'fetches': 0, 'fetch_seconds': 0.0}
+
+    def _get_discovery_doc(self) -> dict:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    self._discovery_doc = json.loads(get_static_doc('calendar', 'v3'))
+        return self._discovery_doc
+
+    def _build(self):
+        start = time.perf_counter()
+        http = AuthorizedHttp(self._credentials, http=httplib2.Http(timeout=self._timeout))
+        service = build_from_document(self._get_discovery_doc(), http=http, requestBuilder=ThrottledHttpRequest)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['builds'] += 1
+            self._stats['build_seconds'] += elapsed
+        app_logger.info('Built Google Calendar client for thread %s in %.3fs', threading.get_ident(), elapsed)
+        return service
+
+    def get(self):
+        """
+        Get the Calendar service for the current thread, building it on first use.
+        """
+        start = time.perf_counter()
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._build()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['fetches'] += 1
+            self._stats['fetch_seconds'] += elapsed
+        return service
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+calendar_clients = CalendarClientProvider(creds, timeout=settings.g_calendar_http_timeout)
+
+
+def get_calendar_service():
+    return calendar_clients.get()
@@ -0,0 +1,274 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from google.cloud.firestore_v1 import FieldFilter
+
+from app.cal._utils import app_logger
+from app.firebase_setup import db
+from app.utils import settings
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'key', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, start: float, end: float, key: str):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.priority = random.random()
+        self.max_end = end
+        self.left: _Node | None = None
+        self.right: _Node | None = None
+
+
+def _update(node: _Node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node: _Node) -> _Node:
+    left = node.left
+    node.left = left.right
+    _update(node)
+    left.right = node
+    _update(left)
+    return left
+
+
+def _rotate_left(node: _Node) -> _Node:
+    right = node.right
+    node.right = right.left
+    _update(node)
+    right.left = node
+    _update(right)
+    return right
+
+
+def _insert(node: _Node | None, new: _Node) -> _Node:
+    if node is None:
+        return new
+    if (new.start, new.key) < (node.start, node.key):
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    _update(node)
+    return node
+
+
+def _merge(left: _Node | None, right: _Node | None) -> _Node | None:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _delete(node: _Node | None, start: float, key: str) -> _Node | None:
+    if node is None:
+        return None
+    if (start, key) < (node.start, node.key):
+        node.left = _delete(node.left, start, key)
+    elif (start, key) > (node.start, node.key):
+        node.right = _delete(node.right, start, key)
+    else:
+        return _merge(node.left, node.right)
+    _update(node)
+    return node
+
+
+class IntervalTree:
+    """
+    Half-open [start, end) intervals, each under a unique key, in a treap ordered by start and augmented with the
+    largest end in every subtree.
+
+    Adding and removing an interval take O(log n) expected time, and finding the k intervals that overlap a range
+    takes O(log n + k), since subtrees that end before the range or start after it are never visited.
+    """
+
+    def __init__(self):
+        self._root: _Node | None = None
+        self._intervals: dict[str, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._intervals
+
+    def keys(self) -> list[str]:
+        return list(self._intervals)
+
+    def add(self, key: str, start: float, end: float):
+        """
+        Add an interval, replacing any interval already held under `key`.
+        """
+        self.remove(key)
+        self._intervals[key] = (start, end)
+        self._root = _insert(self._root, _Node(start, end, key))
+
+    def remove(self, key: str) -> bool:
+        interval = self._intervals.pop(key, None)
+        if interval is None:
+            return False
+        self._root = _delete(self._root, interval[0], key)
+        return True
+
+    def overlapping(self, start: float, end: float) -> list[str]:
+        """
+        Keys of the intervals that overlap [start, end).
+        """
+        keys, stack = [], [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            if node.start < end:
+                if node.end > start:
+                    keys.append(node.key)
+                stack.append(node.right)
+            stack.append(node.left)
+        return keys
+
+
+def trip_seconds(value: datetime) -> float:
+    # Trips written by this service before timezones were stored are naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _property_id(property_ref: Any) -> str:
+    return property_ref.id if hasattr(property_ref, 'id') else str(property_ref).split('/')[-1]
+
+
+def upcoming_trips(db, property_ref: Any, collection: str = 'trips') -> list[tuple[str, float, float]]:
+    """
+    The id, start and end, as POSIX timestamps, of every trip of a property that has not ended or been cancelled.
+    """
+    if isinstance(property_ref, str):
+        property_ref = db.collection('properties').document(_property_id(property_ref))
+    trips = (
+        db.collection(collection)
+        .where(filter=FieldFilter('propertyRef', '==', property_ref))
+        .where(filter=FieldFilter('tripEndDateTime', '>', datetime.now(timezone.utc)))
+        .stream()
+    )
+    upcoming = []
+    for trip in trips:
+        trip_dict = trip.to_dict()
+        if trip_dict.get('cancelTrip') or not trip_dict.get('tripBeginDateTime'):
+            continue
+        upcoming.append(
+            (trip.id, trip_seconds(trip_dict['tripBeginDateTime']), trip_seconds(trip_dict['tripEndDateTime']))
+        )
+    return upcoming
+
+
+class BookingIndex:
+    """
+    In-memory interval trees of each property's upcoming trips, used to find double bookings during sync.
+
+    A property's tree is loaded with a single Firestore query the first time a sync needs it, kept up to date as
+    the sync creates, moves and removes trips, and reloaded after `ttl` seconds so trips written elsewhere are
+    picked up. Two trips conflict when they overlap once `buffer` is added on both sides of the trip being checked.
+    """
+
+    def __init__(self, db, ttl: float, buffer: timedelta, collection: str = 'trips'):
+        self._db = db
+        self.ttl = ttl
+        self.buffer = buffer.total_seconds()
+        self.collection = collection
+        self._trees: dict[str, tuple[IntervalTree, float]] = {}
+        self._trip_properties: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'checks': 0, 'conflicts': 0}
+
+    def _load(self, property_ref: Any) -> IntervalTree:
+        tree = IntervalTree()
+        for trip_id, start, end in upcoming_trips(self._db, property_ref, self.collection):
+            tree.add(trip_id, start, end)
+        app_logger.info('Loaded %s upcoming trips into the booking index for property: %s', len(tree), property_ref)
+        return tree
+
+    def _tree(self, property_ref: Any) -> IntervalTree:
+        property_id = _property_id(property_ref)
+        with self._lock:
+            entry = self._trees.get(property_id)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+
+        tree = self._load(property_ref)
+        with self._lock:
+            self._stats['loads'] += 1
+            for trip_id, trip_property_id in list(self._trip_properties.items()):
+                if trip_property_id == property_id:
+                    del self._trip_properties[trip_id]
+            self._trip_properties.update(dict.fromkeys(tree.keys(), property_id))
+            self._trees[property_id] = (tree, time.monotonic() + self.ttl)
+        return tree
+
+    def put(self, property_ref: Any, trip_id: str, start: datetime, end: datetime) -> list[str]:
+        """
+        Record a trip's dates, returning the ids of the other trips it conflicts with.
+        """
+        tree = self._tree(property_ref)
+        start_seconds, end_seconds = trip_seconds(start), trip_seconds(end)
+        with self._lock:
+            self._forget(trip_id)
+            conflicts = [
+                key
+                for key in tree.overlapping(start_seconds - self.buffer, end_seconds + self.buffer)
+                if key != trip_id
+            ]
+            if end_seconds > time.time():
+                tree.add(trip_id, start_seconds, end_seconds)
+                self._trip_properties[trip_id] = _property_id(property_ref)
+            self._stats['checks'] += 1
+            self._stats['conflicts'] += bool(conflicts)
+        return sorted(conflicts)
+
+    def _forget(self, trip_id: str):
+        property_id = self._trip_properties.pop(trip_id, None)
+        entry = self._trees.get(property_id)
+        if entry is not None:
+            entry[0].remove(trip_id)
+
+    def remove(self, trip_id: str):
+        """
+        Forget a trip that was cancelled or deleted.
+        """
+        with self._lock:
+            self._forget(trip_id)
+
+    def invalidate(self, property_ref: Any):
+        with self._lock:
+            self._trees.pop(_property_id(property_ref), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                properties=len(self._trees),
+                trips=sum(len(tree) for tree, _ in self._trees.values()),
+            )
+
+
+booking_index = BookingIndex(
+    db, ttl=settings.cal_booking_index_ttl_seconds, buffer=timedelta(minutes=settings.buffer_time)
+)
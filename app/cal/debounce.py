@@ -0,0 +1,96 @@
+import threading
+from typing import Callable
+
+from app.cal._utils import app_logger
+from app.cal.workers import SyncScheduler
+
+
+class _KeyState:
+    __slots__ = ('timer', 'running', 'follow_up')
+
+    def __init__(self):
+        self.timer: threading.Timer | None = None
+        self.running = False
+        self.follow_up = False
+
+
+class SyncCoalescer:
+    """
+    Collapses bursts of sync requests for the same key into a single run.
+
+    The first request for a key schedules a run after `window` seconds and any request arriving before it
+    fires is folded into it, including while the run waits in the scheduler's queue. A request that arrives
+    while the run is in progress schedules exactly one follow-up run, so changes made during a sync are never
+    missed. Runs are queued at `priority` on the scheduler, or happen on the timer thread without one.
+    """
+
+    def __init__(self, window: float, scheduler: SyncScheduler | None = None, priority: str = 'webhook'):
+        self.window = window
+        self.scheduler = scheduler
+        self.priority = priority
+        self._states: dict[str, _KeyState] = {}
+        self._lock = threading.Condition()
+        self._stats = {'received': 0, 'coalesced': 0, 'executed': 0, 'failed': 0}
+
+    def submit(self, key: str, fn: Callable[[], None]) -> bool:
+        """
+        Request a run of `fn` for `key`, returning False if the request was folded into an existing one.
+        """
+        with self._lock:
+            self._stats['received'] += 1
+            state = self._states.setdefault(key, _KeyState())
+            if state.timer is not None or (state.running and state.follow_up):
+                self._stats['coalesced'] += 1
+                return False
+            if state.running:
+                state.follow_up = True
+                return True
+            self._schedule(key, state, fn)
+            return True
+
+    def _schedule(self, key: str, state: _KeyState, fn: Callable[[], None]):
+        state.timer = threading.Timer(self.window, self._dispatch, args=(key, fn))
+        state.timer.daemon = True
+        state.timer.start()
+
+    def _dispatch(self, key: str, fn: Callable[[], None]):
+        if self.scheduler is None:
+            self._run(key, fn)
+        elif self.scheduler.submit(key, lambda: self._run(key, fn), self.priority) is None:
+            # The queue is full, so try again after another window
+            with self._lock:
+                self._schedule(key, self._states[key], fn)
+
+    def _run(self, key: str, fn: Callable[[], None]):
+        with self._lock:
+            state = self._states[key]
+            state.timer = None
+            state.running = True
+            self._stats['executed'] += 1
+
+        try:
+            fn()
+        except Exception as e:
+            app_logger.error('Coalesced sync failed for %s: %s', key, e)
+            with self._lock:
+                self._stats['failed'] += 1
+        finally:
+            with self._lock:
+                state.running = False
+                if state.follow_up:
+                    state.follow_up = False
+                    self._schedule(key, state, fn)
+                else:
+                    del self._states[key]
+                self._lock.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """
+        Block until no run is scheduled or in progress.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._states, timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pending=len(self._states))
@@ -0,0 +1,134 @@
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import transactional
+
+from app.cal._utils import app_logger
+
+MessageKey = tuple[str, str]
+
+
+class MessageStore(ABC):
+    """
+    Remembers which webhook messages have been processed, keyed by (channel id, message number).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @abstractmethod
+    def _check_and_add(self, key: MessageKey) -> bool:
+        """
+        Record the message, returning whether it had already been recorded.
+        """
+
+    def seen(self, key: MessageKey) -> bool:
+        """
+        Record the message and return whether it had already been recorded.
+        """
+        seen = self._check_and_add(key)
+        with self._lock:
+            self._stats['hits' if seen else 'misses'] += 1
+        return seen
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        return stats
+
+
+class MemoryMessageStore(MessageStore):
+    """
+    In-process store with a sliding TTL and a size cap, evicting the least recently seen message first.
+
+    Every entry expires `ttl` seconds after it was last seen, so the LRU order is also the expiry order and
+    both kinds of eviction only ever look at the front of the dict.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[MessageKey, float] = OrderedDict()
+        self._stats.update(expired=0, evicted=0)
+
+    def _check_and_add(self, key: MessageKey) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._entries:
+                oldest_key, expires_at = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                del self._entries[oldest_key]
+                self._stats['expired'] += 1
+
+            seen = key in self._entries
+            self._entries[key] = now + self.ttl
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+            return seen
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            entries = list(self._entries)
+            stats['size'] = len(entries)
+            stats['approx_bytes'] = sys.getsizeof(self._entries) + sum(
+                sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key) for key in entries
+            )
+        return stats
+
+
+@transactional
+def _replace_expired(transaction, reference, data: dict, now: datetime) -> bool:
+    snapshot = next(iter(transaction.get(reference)))
+    expire_at = snapshot.to_dict().get('expireAt') if snapshot.exists else None
+    if snapshot.exists and not (expire_at and expire_at <= now):
+        return False
+    transaction.set(reference, data)
+    return True
+
+
+class FirestoreMessageStore(MessageStore):
+    """
+    Store shared by every worker, using Firestore's create-if-absent to record each message exactly once.
+
+    Documents carry an `expireAt` timestamp for a Firestore TTL policy; documents that have expired but not
+    yet been removed by the policy are treated as unseen.
+    """
+
+    def __init__(self, db, ttl: float, collection: str = 'webhookMessages'):
+        super().__init__()
+        self._db = db
+        self.ttl = ttl
+        self.collection = collection
+
+    def _check_and_add(self, key: MessageKey) -> bool:
+        now = datetime.now(timezone.utc)
+        doc_ref = self._db.collection(self.collection).document(':'.join(key))
+        data = {'channelId': key[0], 'messageNumber': key[1], 'expireAt': now + timedelta(seconds=self.ttl)}
+        try:
+            doc_ref.create(data)
+            return False
+        except AlreadyExists:
+            # Replace an expired entry in a transaction, so only one of several workers sees the message as new
+            return not _replace_expired(self._db.transaction(), doc_ref, data, now)
+
+
+def build_message_store(backend: str, db, max_size: int, ttl: float) -> MessageStore:
+    if backend == 'firestore':
+        return FirestoreMessageStore(db, ttl)
+    if backend != 'memory':
+        app_logger.error('Unknown webhook message store backend: %s, using memory', backend)
+    return MemoryMessageStore(max_size, ttl)
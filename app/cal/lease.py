@@ -0,0 +1,208 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from google.cloud.firestore_v1 import transactional
+
+from app.cal._utils import app_logger
+
+
+def _get_snapshot(transaction, reference):
+    return next(iter(transaction.get(reference)))
+
+
+@transactional
+def _acquire(transaction, reference, owner: str, ttl: float) -> bool:
+    now = datetime.now(timezone.utc)
+    snapshot = _get_snapshot(transaction, reference)
+    lease = snapshot.to_dict() if snapshot.exists else {}
+    if lease and lease.get('owner') != owner and lease.get('expiresAt') and lease['expiresAt'] > now:
+        return False
+    transaction.set(
+        reference,
+        {
+            'owner': owner,
+            'expiresAt': now + timedelta(seconds=ttl),
+            'followUp': lease.get('followUp', False) if lease.get('owner') == owner else False,
+        },
+    )
+    return True
+
+
+@transactional
+def _request_follow_up(transaction, reference, owner: str) -> bool:
+    snapshot = _get_snapshot(transaction, reference)
+    if not snapshot.exists or snapshot.get('owner') == owner:
+        return False
+    transaction.update(reference, {'followUp': True})
+    return True
+
+
+@transactional
+def _release(transaction, reference, owner: str) -> bool:
+    snapshot = _get_snapshot(transaction, reference)
+    if not snapshot.exists or snapshot.get('owner') != owner:
+        return False
+    follow_up = bool(snapshot.to_dict().get('followUp'))
+    if follow_up:
+        transaction.update(reference, {'followUp': False})
+    else:
+        transaction.delete(reference)
+    return follow_up
+
+
+class SyncLease:
+    """
+    Firestore lease that lets one process at a time sync a property.
+
+    A lease document holds its owner and an expiry, so a lease left behind by a crashed worker frees itself after
+    `ttl` seconds. Other processes that find the lease taken can ask the owner for one follow-up run.
+    """
+
+    def __init__(self, db, ttl: float, owner: str | None = None, collection: str = 'calendarSyncLeases'):
+        self._db = db
+        self.ttl = ttl
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.collection = collection
+
+    def _reference(self, key: str):
+        return self._db.collection(self.collection).document(key)
+
+    def acquire(self, key: str) -> bool:
+        """
+        Take or extend the lease, returning False if another owner holds an unexpired lease.
+        """
+        return _acquire(self._db.transaction(), self._reference(key), self.owner, self.ttl)
+
+    def request_follow_up(self, key: str) -> bool:
+        """
+        Ask the current owner to run once more when it finishes, returning False if there is no other owner.
+        """
+        return _request_follow_up(self._db.transaction(), self._reference(key), self.owner)
+
+    def release(self, key: str) -> bool:
+        """
+        Give up the lease, or keep it and return True if another process asked for a follow-up run.
+        """
+        return _release(self._db.transaction(), self._reference(key), self.owner)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'follow_up')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.follow_up = False
+
+
+class SyncSingleFlight:
+    """
+    Runs at most one sync per key at a time, within this process and, through the lease, across processes.
+
+    A caller that finds a sync running either joins it and gets its result (`wait=True`) or returns straight away
+    having queued exactly one follow-up run (`wait=False`). When another process holds the lease, the caller asks
+    that process for the follow-up instead, and a sync that loses its lease midway asks the new owner for one.
+    """
+
+    def __init__(self, lease: SyncLease | None = None):
+        self.lease = lease
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'joined': 0, 'follow_ups': 0, 'remote': 0, 'lost_leases': 0}
+
+    def run(self, key: str, fn: Callable[[], Any], wait: bool = True) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['started'] += 1
+            elif not wait:
+                flight.follow_up = True
+                self._stats['follow_ups'] += 1
+                return None
+            else:
+                self._stats['joined'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            self._lead(key, fn, flight)
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _lead(self, key: str, fn: Callable[[], Any], flight: _Flight):
+        first_run = True
+        while True:
+            if self.lease is not None and not self.lease.acquire(key):
+                queued = self.lease.request_follow_up(key)
+                app_logger.info('Sync for %s is running in another process, follow-up queued: %s', key, queued)
+                with self._lock:
+                    self._stats['remote'] += 1
+                    # Try again if the lease was freed meanwhile or a local follow-up came in after the request
+                    if queued and not flight.follow_up:
+                        del self._flights[key]
+                        return
+                    flight.follow_up = False
+                continue
+
+            stop_heartbeat = threading.Event()
+            if self.lease is not None:
+                threading.Thread(target=self._heartbeat, args=(key, stop_heartbeat), daemon=True).start()
+            try:
+                result = fn()
+                if first_run:
+                    flight.result = result
+            except Exception as e:
+                if first_run:
+                    flight.error = e
+                else:
+                    app_logger.error('Follow-up sync failed for %s: %s', key, e)
+            finally:
+                stop_heartbeat.set()
+
+            # Another process may have asked for a follow-up while the lease was held
+            follow_up = self.lease.release(key) if self.lease is not None else False
+            with self._lock:
+                if not (follow_up or flight.follow_up):
+                    del self._flights[key]
+                    return
+                flight.follow_up = False
+            first_run = False
+            app_logger.info('Running follow-up sync for %s', key)
+
+    def _heartbeat(self, key: str, stop: threading.Event):
+        while not stop.wait(self.lease.ttl / 3):
+            try:
+                if self.lease.acquire(key):
+                    continue
+                # The lease expired and another process took it, so its sync may overlap this one; have it run
+                # again once both are done
+                queued = self.lease.request_follow_up(key)
+            except Exception as e:
+                app_logger.error('Failed to extend sync lease for %s: %s', key, e)
+                continue
+            with self._lock:
+                self._stats['lost_leases'] += 1
+            app_logger.error('Lost the sync lease for %s to another process, follow-up queued: %s', key, queued)
+            return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, running=len(self._flights))
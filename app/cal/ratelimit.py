@@ -0,0 +1,292 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable
+
+from googleapiclient.errors import HttpError
+
+from app.cal._utils import app_logger
+
+# 403 reasons Google uses for rate limits, as opposed to permission errors or an exhausted daily quota
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second up to `capacity`.
+
+    A request for more tokens than the bucket holds waits for a full bucket and leaves it in debt, so large
+    requests are slowed down rather than refused.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Take `tokens` if available, returning 0, or return how many seconds to wait before trying again.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            needed = min(tokens, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= tokens
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Block until `tokens` are available and take them, returning the seconds spent waiting.
+        """
+        waited = 0.0
+        while (wait := self.try_acquire(tokens)) > 0:
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """
+        Like acquire(), but sleeps without blocking the event loop.
+        """
+        waited = 0.0
+        while (wait := self.try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+
+def _error_reason(error: HttpError) -> str | None:
+    try:
+        return json.loads(error.content)['error']['errors'][0].get('reason')
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def is_throttled(error: Exception) -> bool:
+    """
+    Whether Google rejected the call for going over a rate limit.
+    """
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status == 429 or (error.resp.status == 403 and _error_reason(error) in RATE_LIMIT_REASONS)
+
+
+def is_idempotent(method: str) -> bool:
+    """
+    Whether sending an HTTP request twice has the same effect as sending it once. Calendar creates events and
+    watch channels with POST, so a POST that timed out or got a 5xx may still have gone through.
+    """
+    return method.upper() != 'POST'
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Whether a failed Google API call is worth retrying: rate limits, and for idempotent calls also server errors
+    and dropped connections.
+    """
+    if is_throttled(error):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def retry_after_seconds(error: Exception) -> float:
+    """
+    Seconds the server asked us to wait through Retry-After, given either as seconds or an HTTP date.
+    """
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class GoogleApiLimiter:
+    """
+    Throttle and retry policy shared by every Google Calendar call.
+
+    Each call takes a token from a global bucket sized to the project's quota and, when it targets a calendar,
+    first from that calendar's own bucket holding `calendar_share` of the quota, so one busy calendar cannot use
+    it all up. Throttled responses are retried with jittered exponential backoff, waiting at least as long as any
+    Retry-After header asks, as are 5xx responses and dropped connections of idempotent calls. Throttling also
+    halves the global rate, which recovers gradually as calls succeed.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        calendar_share: float = 0.25,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 32.0,
+    ):
+        self.rate = rate
+        self.min_rate = rate / 8
+        self.calendar_rate = rate * calendar_share
+        self.calendar_burst = max(1.0, burst * calendar_share)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(rate, burst)
+        self._calendars: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'throttled': 0,
+            'server_errors': 0,
+            'retries': 0,
+            'failures': 0,
+            'wait_seconds': 0.0,
+            'backoff_seconds': 0.0,
+        }
+
+    def _calendar_bucket(self, calendar_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._calendars.get(calendar_id)
+            if bucket is None:
+                bucket = self._calendars[calendar_id] = TokenBucket(self.calendar_rate, self.calendar_burst)
+            return bucket
+
+    def acquire(self, calendar_id: str | None = None, cost: float = 1) -> float:
+        """
+        Block until the call may go out, returning the seconds spent waiting.
+        """
+        waited = self._calendar_bucket(calendar_id).acquire(cost) if calendar_id else 0.0
+        waited += self.bucket.acquire(cost)
+        with self._lock:
+            self._stats['wait_seconds'] += waited
+        return waited
+
+    async def acquire_async(self, calendar_id: str | None = None, cost: float = 1) -> float:
+        """
+        Like acquire(), but sleeps without blocking the event loop.
+        """
+        waited = await self._calendar_bucket(calendar_id).acquire_async(cost) if calendar_id else 0.0
+        waited += await self.bucket.acquire_async(cost)
+        with self._lock:
+            self._stats['wait_seconds'] += waited
+        return waited
+
+    def record_error(self, error: Exception, idempotent: bool = True) -> bool:
+        """
+        Count a failed call, slowing down if it was throttled, and return whether it should be retried.
+        """
+        throttled = is_throttled(error)
+        with self._lock:
+            if throttled:
+                self._stats['throttled'] += 1
+                self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+            elif isinstance(error, HttpError) and error.resp.status >= 500:
+                self._stats['server_errors'] += 1
+        return is_retryable(error, idempotent)
+
+    def record_success(self):
+        with self._lock:
+            if self.bucket.rate < self.rate:
+                self.bucket.rate = min(self.rate, self.bucket.rate + self.rate / 20)
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+
+    def _backoff_delay(self, attempt: int, retry_after: float) -> float:
+        delay = max(random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt)), retry_after)
+        with self._lock:
+            self._stats['retries'] += 1
+            self._stats['backoff_seconds'] += delay
+        return delay
+
+    def backoff(self, attempt: int, retry_after: float = 0) -> float:
+        """
+        Sleep before retry number `attempt + 1`, returning the delay.
+        """
+        delay = self._backoff_delay(attempt, retry_after)
+        time.sleep(delay)
+        return delay
+
+    def _should_retry(self, error: Exception, attempt: int, idempotent: bool) -> bool:
+        if not self.record_error(error, idempotent):
+            return False
+        if attempt >= self.max_retries:
+            self.record_failure()
+            app_logger.error('Google API call failed after %s retries: %s', attempt, error)
+            return False
+        return True
+
+    def call(
+        self, fn: Callable[[], Any], calendar_id: str | None = None, cost: float = 1, idempotent: bool = True
+    ) -> Any:
+        """
+        Run a Google API call under the rate limit, retrying it while it fails with a retryable error.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+        attempt = 0
+        while True:
+            self.acquire(calendar_id, cost)
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt, idempotent):
+                    raise
+                delay = self.backoff(attempt, retry_after_seconds(e))
+                app_logger.warning('Google API call failed, retrying in %.2fs: %s', delay, e)
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        calendar_id: str | None = None,
+        cost: float = 1,
+        idempotent: bool = True,
+    ) -> Any:
+        """
+        Like call(), for a coroutine function, waiting and backing off without blocking the event loop.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+        attempt = 0
+        while True:
+            await self.acquire_async(calendar_id, cost)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt, idempotent):
+                    raise
+                delay = self._backoff_delay(attempt, retry_after_seconds(e))
+                app_logger.warning('Google API call failed, retrying in %.2fs: %s', delay, e)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, current_rate=self.bucket.rate, calendars=len(self._calendars))
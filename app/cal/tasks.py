@@ -1,28 +1,75 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Any, Union
+from datetime import datetime, timedelta, timezone as dt_timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Callable, Union
 
 import logfire
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from google.cloud.firestore_v1 import FieldFilter
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google.cloud.firestore_v1.field_path import FieldPath
 from googleapiclient.errors import HttpError
-from pydantic import ValidationError
-from pytz import timezone
+from pydantic import TypeAdapter, ValidationError
+from pytz import UnknownTimeZoneError, timezone
 
 from app.cal._utils import app_logger
+from app.cal.async_client import async_calendar_client
+from app.cal.availability import availability_index
+from app.cal.client import calendar_id_from_uri, get_calendar_service, google_api_limiter
+from app.cal.conflicts import booking_index
+from app.cal.lease import SyncLease, SyncSingleFlight
+from app.cal.ratelimit import is_idempotent, retry_after_seconds
 from app.firebase_setup import current_time, db
-from app.models import CancelledGCalEvent, Date, GCalEvent, TripData
+from app.models import CancelledGCalEvent, Date, EventFromTrip, GCalEvent, SyncEvent, TripData
+from app.property_cache import property_cache
+from app.user_cache import user_cache
 from app.utils import settings
 
-creds = service_account.Credentials.from_service_account_info(
-    settings.firebase_credentials, scopes=['https://www.googleapis.com/auth/calendar']
-)
+# Firestore caps `in` filters at 30 values and write batches at 500 operations
+FIRESTORE_IN_LIMIT = 30
+FIRESTORE_BATCH_LIMIT = 500
+# The Calendar batch endpoint accepts at most 50 requests per HTTP call
+CALENDAR_BATCH_LIMIT = 50
+
+# Sync only downloads the event fields it uses, in the largest pages Google allows
+SYNC_EVENT_FIELDS = 'nextPageToken,nextSyncToken,items(id,status,summary,start,end)'
+SYNC_PAGE_SIZE = 2500
+
+event_page_adapter = TypeAdapter(list[SyncEvent])
+
+# Only one sync per property runs at a time, in this process and across workers
+sync_flights = SyncSingleFlight(SyncLease(db, ttl=settings.cal_sync_lease_seconds))
+
+# Maps event ids to trips whose document id is not the event id
+EVENT_INDEX_COLLECTION = 'eventTrips'
+
+# Trip fields derived from a calendar event, compared when reconciling a calendar with its trips
+TRIP_EVENT_FIELDS = ('isExternal', 'tripBeginDateTime', 'tripEndDateTime', 'eventId', 'eventSummary')
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> tzinfo:
+    """
+    Resolve a timezone name once per process rather than once per event.
+    """
+    return timezone(name)
+
+
+def get_property_timezone(property_data: dict) -> tzinfo | None:
+    try:
+        return get_timezone(property_data.get('timezone', 'UTC'))
+    except (UnknownTimeZoneError, AttributeError) as e:
+        app_logger.error('Invalid timezone for property: %s', e)
+        return None
 
 
 def renew_notification_channel(calendar_id, channel_id, channel_type, channel_address):
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_calendar_service()
 
     # Log the input parameters
     app_logger.info(
@@ -58,17 +105,27 @@ def renew_notification_channel(calendar_id, channel_id, channel_type, channel_ad
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def sync_calendar_events(property_doc_ref: Any, retry_count: int = 0):
-    with logfire.span('sync_calendar_events'):
-        if isinstance(property_doc_ref, str):
-            try:
-                property_doc_ref = db.document(property_doc_ref)
-            except ValueError:
-                app_logger.error('Invalid property document reference: %s', property_doc_ref)
-                raise HTTPException(status_code=400, detail='Invalid property document reference')
+def sync_calendar_events(property_doc_ref: Any, wait: bool = True):
+    """
+    Sync a property's trips with its external calendar, running at most one sync per property at a time.
 
+    If the property is already syncing, `wait=True` joins that sync and `wait=False` queues one follow-up sync and
+    returns straight away. A sync that ran returns the trips it found overlapping other trips of the property.
+    """
+    if isinstance(property_doc_ref, str):
         try:
-            property_doc = property_doc_ref.get()
+            property_doc_ref = db.document(property_doc_ref)
+        except ValueError:
+            app_logger.error('Invalid property document reference: %s', property_doc_ref)
+            raise HTTPException(status_code=400, detail='Invalid property document reference')
+
+    return sync_flights.run(property_doc_ref.id, lambda: _sync_calendar_events(property_doc_ref), wait=wait)
+
+
+def _sync_calendar_events(property_doc_ref: Any):
+    with logfire.span('sync_calendar_events'):
+        try:
+            property_doc = property_cache.get(property_doc_ref)
         except ValueError:
             app_logger.error('Invalid property document reference: %s', property_doc_ref)
             raise HTTPException(status_code=400, detail='Invalid property document reference')
@@ -81,69 +138,264 @@ def sync_calendar_events(property_doc_ref: Any, retry_count: int = 0):
 
         property_doc_dict = property_doc.to_dict()
         calendar_id = property_doc_dict.get('externalCalendar')
-        if retry_count == 0:
-            next_sync_token = property_doc_dict.get('nextSyncToken', '')
-        else:
-            next_sync_token = ''
-
-        # Call the Google Calendar API to fetch the events
-        service = build('calendar', 'v3', credentials=creds)
-        page_token = None
-
+        property_tz = get_property_timezone(property_doc_dict)
+        # The cache can be minutes behind a sync another worker just completed, so read the token from Firestore
+        sync_token = (property_doc_ref.get().to_dict() or {}).get('nextSyncToken', '')
+
+        # Resume an interrupted sync from the page after the last one it processed, unless the checkpoint is stale
+        checkpoint = sync_checkpoint_ref(property_doc_ref).get()
+        checkpoint_dict = checkpoint.to_dict() if checkpoint.exists else {}
+        page_token, pages_completed = None, 0
+        if checkpoint_dict.get('syncToken') == sync_token and checkpoint_is_fresh(checkpoint_dict):
+            page_token = checkpoint_dict.get('pageToken')
+            pages_completed = checkpoint_dict.get('pagesCompleted')
+            app_logger.info('Resuming sync for property: %s after page %s', property_doc_ref.id, pages_completed)
+
+        conflicts = []
         with logfire.span('syncing calendar events with Google Calendar'):
             try:
-                while True:
-                    events_result = (
-                        service.events()
-                        .list(calendarId=calendar_id, syncToken=next_sync_token, pageToken=page_token)
-                        .execute()
-                    )
-
-                    events = events_result.get('items', [])
-                    app_logger.info('%s events found in calendar: %s', len(events), calendar_id)
-                    for event in events:
-                        try:
-                            # Validate the event data with the appropriate model
-                            if event['status'] == 'cancelled':
-                                app_logger.info('Cancelled event: %s', event['id'])
-                                validated_event = CancelledGCalEvent.parse_obj(event)
-                            else:
-                                app_logger.info('Valid event: %s', event['id'])
-                                validated_event = GCalEvent.parse_obj(event)
-                        except ValidationError as ve:
-                            app_logger.error('Event validation error: %s, Event: %s', ve, event)
-                            continue
-
-                        # Process each event
-                        try:
-                            process_event(validated_event, property_doc_ref)
-                        except Exception as e:
-                            app_logger.error('Error processing event %s: %s', event.get('id', 'unknown'), e)
-                            continue
-
-                    next_sync_token = events_result.get('nextSyncToken')
-                    property_doc_ref.update({'nextSyncToken': next_sync_token})
-
-                    page_token = events_result.get('nextPageToken')
-                    if not page_token:
-                        break
+                conflicts = sync_event_pages(
+                    property_doc_ref, calendar_id, property_tz, sync_token, page_token, pages_completed
+                )
             except HttpError as e:
-                if e.resp.status == 410:
-                    if retry_count < 2:
-                        app_logger.info('Invalid sync token, clearing event store and re-syncing.')
-                        clear_event_store(property_doc_ref.path)
-                        # Reset the sync token
-                        next_sync_token = ''
-                        sync_calendar_events(property_doc_ref, retry_count + 1)
-                    else:
-                        app_logger.error('Error syncing calendar: %s. Maximum retry attempts exceeded.', e)
-                        raise HTTPException(status_code=500, detail=str(e))
-                else:
+                if e.resp.status != 410:
                     app_logger.error('Error syncing calendar: %s', e)
                     raise HTTPException(status_code=500, detail=str(e))
 
+                app_logger.info('Invalid sync token, reconciling event store with the full calendar.')
+                try:
+                    next_sync_token, conflicts = reconcile_calendar_events(property_doc_ref, calendar_id, property_tz)
+                except HttpError as e:
+                    app_logger.error('Error reconciling calendar: %s', e)
+                    raise HTTPException(status_code=500, detail=str(e))
+                complete_sync(property_doc_ref, next_sync_token)
+
+        if conflicts:
+            app_logger.warning(
+                'Sync found %s conflicting trips for property: %s: %s', len(conflicts), property_doc_ref.id, conflicts
+            )
+        return {'propertyId': property_doc_ref.id, 'conflicts': conflicts}
+
+
+def sync_checkpoint_ref(property_doc_ref: Any) -> Any:
+    """
+    The checkpoint of a property's in-progress sync: the sync token it started from, the page token to continue
+    from and how many pages have been processed.
+    """
+    return db.collection('calendarSyncCheckpoints').document(property_doc_ref.id)
+
+
+def checkpoint_is_fresh(checkpoint: dict) -> bool:
+    """
+    Whether a sync checkpoint was written recently enough for its page token to still be worth resuming from.
+    """
+    updated_at = checkpoint.get('updatedAt')
+    max_age = timedelta(seconds=settings.cal_sync_checkpoint_ttl_seconds)
+    return bool(updated_at) and datetime.now(dt_timezone.utc) - updated_at < max_age
+
+
+def sync_event_pages(
+    property_doc_ref: Any,
+    calendar_id: str,
+    property_tz: tzinfo | None,
+    sync_token: str,
+    page_token: str | None = None,
+    pages_completed: int = 0,
+) -> list[dict]:
+    """
+    Process a calendar's event pages from `page_token`, checkpointing after each page and completing the sync
+    after the last, returning the trips found to overlap other trips.
+
+    If the page token of a resumed sync is rejected, its checkpoint is dropped and the sync restarts from
+    `sync_token`; an expired sync token (410) is left for the caller to handle.
+    """
+    pages = iter_event_pages(calendar_id, sync_token, page_token)
+    try:
+        first_page = next(pages)
+    except HttpError as e:
+        if not page_token or e.resp.status == 410:
+            raise
+        app_logger.warning(
+            'Could not resume sync for property: %s after page %s, restarting: %s',
+            property_doc_ref.id,
+            pages_completed,
+            e,
+        )
+        sync_checkpoint_ref(property_doc_ref).delete()
+        return sync_event_pages(property_doc_ref, calendar_id, property_tz, sync_token)
+
+    conflicts = []
+    for events_result in itertools.chain([first_page], pages):
+        events = events_result.get('items', [])
+        app_logger.info('%s events found in calendar: %s', len(events), calendar_id)
+        validated_events = validate_event_page(events)
+
+        # Process the whole page with batched lookups and writes
+        conflicts.extend(process_events(validated_events, property_doc_ref, property_tz))
+
+        pages_completed += 1
+        if events_result.get('nextPageToken'):
+            sync_checkpoint_ref(property_doc_ref).set(
+                {
+                    'syncToken': sync_token,
+                    'pageToken': events_result['nextPageToken'],
+                    'pagesCompleted': pages_completed,
+                    'updatedAt': datetime.now(dt_timezone.utc),
+                }
+            )
+        else:
+            complete_sync(property_doc_ref, events_result.get('nextSyncToken'))
+    return conflicts
+
+
+def complete_sync(property_doc_ref: Any, next_sync_token: str | None):
+    """
+    Store the sync token of a completed sync and drop its checkpoint in a single atomic write.
+    """
+    batch = db.batch()
+    batch.update(property_doc_ref, {'nextSyncToken': next_sync_token})
+    batch.delete(sync_checkpoint_ref(property_doc_ref))
+    batch.commit()
+
+
+def iter_event_pages(calendar_id: str, sync_token: str = '', page_token: str | None = None):
+    """
+    Yield every page of events().list for a calendar, incrementally from `sync_token` when one is given and
+    starting at `page_token` when resuming.
+    """
+    service = get_calendar_service()
+    while True:
+        events_result = (
+            service.events()
+            .list(
+                calendarId=calendar_id,
+                syncToken=sync_token,
+                pageToken=page_token,
+                maxResults=SYNC_PAGE_SIZE,
+                fields=SYNC_EVENT_FIELDS,
+            )
+            .execute()
+        )
+        yield events_result
+
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return
 
-def convert_event_to_trip_data(event: GCalEvent, property_doc_ref: Any) -> TripData | None:
+
+def trip_content_hash(trip_data: dict) -> str:
+    """
+    Hash the trip fields that come from a calendar event, normalising datetimes to UTC so a trip read back from
+    Firestore hashes the same as the trip data it was written from.
+    """
+    values = []
+    for field in TRIP_EVENT_FIELDS:
+        value = trip_data.get(field)
+        if isinstance(value, datetime):
+            value = value.astimezone(dt_timezone.utc).isoformat()
+        values.append(value)
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
+def stored_trip_hash(trip_dict: dict) -> str:
+    """
+    The content hash of a stored trip, computed from its fields for trips written before eventHash was stored.
+    """
+    return trip_dict.get('eventHash') or trip_content_hash(trip_dict)
+
+
+def reconcile_calendar_events(
+    property_doc_ref: Any, calendar_id: str, property_tz: tzinfo | None = None
+) -> tuple[str, list[dict]]:
+    """
+    Bring the property's trips in line with a full listing of its calendar, returning the new sync token and the
+    trips found to overlap other trips.
+
+    Used when the sync token has expired. Rather than clearing the event store and recreating every trip, only
+    events whose trip is missing or has different content are written, and future external trips whose event is no
+    longer in the calendar are deleted.
+    """
+    with logfire.span('reconcile_calendar_events'):
+        events, next_sync_token = [], None
+        for events_result in iter_event_pages(calendar_id):
+            events.extend(validate_event_page(events_result.get('items', [])))
+            next_sync_token = events_result.get('nextSyncToken')
+
+        current_events = {event.id: event for event in events if event.status != 'cancelled'}
+        existing_trips_by_event_id = find_trips_by_event_ids(list(current_events))
+
+        writes = TripWrites()
+        for event in current_events.values():
+            existing_trips = existing_trips_by_event_id[event.id]
+            try:
+                trip_data = convert_event_to_trip_data(event, property_doc_ref, property_tz)
+                if not trip_data:
+                    continue
+                write_trip_data(event, trip_data, existing_trips, writes)
+            except Exception as e:
+                app_logger.error('Error processing event %s: %s', event.id, e)
+
+        removed = 0
+        for trip in future_trips(property_doc_ref, external=True):
+            event_id = trip.to_dict().get('eventId')
+            if event_id not in current_events:
+                booking_index.remove(trip.id)
+                availability_index.remove(trip.id)
+                writes.delete(
+                    event_id or trip.id,
+                    trip.reference,
+                    'Deleted trip %s for event no longer in calendar: %s',
+                    trip.id,
+                    event_id,
+                )
+                removed += 1
+
+        if writes.commit():
+            booking_index.invalidate(property_doc_ref)
+            availability_index.invalidate(property_doc_ref)
+        app_logger.info(
+            'Reconciled %s events for calendar %s: %s unchanged, %s trips removed, %s conflicting',
+            len(current_events),
+            calendar_id,
+            writes.counts['skipped'],
+            removed,
+            writes.counts['conflicts'],
+        )
+        return next_sync_token, writes.conflicts
+
+
+def validate_event_page(events: list[dict]) -> list[Union[GCalEvent, CancelledGCalEvent]]:
+    """
+    Validate a whole page of events in one call, dropping and reporting the events that fail validation.
+    """
+    try:
+        return event_page_adapter.validate_python(events)
+    except ValidationError as ve:
+        errors_by_index = {}
+        for error in ve.errors(include_url=False):
+            errors_by_index.setdefault(error['loc'][0], []).append(
+                f"{'.'.join(map(str, error['loc'][1:]))}: {error['msg']}"
+            )
+
+    app_logger.error(
+        'Event validation errors for %s of %s events: %s',
+        len(errors_by_index),
+        len(events),
+        {events[index].get('id', index): errors for index, errors in errors_by_index.items()},
+    )
+    valid_events = [event for index, event in enumerate(events) if index not in errors_by_index]
+    return event_page_adapter.validate_python(valid_events)
+
+
+def convert_event_to_trip_data(
+    event: GCalEvent, property_doc_ref: Any, property_tz: tzinfo | None = None
+) -> TripData | None:
+    """
+    Convert a Google Calendar event to trip data.
+
+    All-day events are localised to the property's timezone. Syncs pass the timezone they already resolved;
+    other callers fall back to reading it from the property document.
+    """
     with logfire.span('convert_event_to_trip_data'):
         summary = event.summary or ''
         if 'Buffer Time' in summary:
@@ -151,22 +403,23 @@ def convert_event_to_trip_data(event: GCalEvent, property_doc_ref: Any) -> TripD
             app_logger.info('Skipping event with Buffer Time in summary: %s', summary)
             return None
         if isinstance(event.start, Date):
-            # Fetch the property document
-            property_doc = property_doc_ref.get()
-            if not property_doc.exists:
-                raise ValueError('Property document does not exist')
+            if property_tz is None:
+                # Fetch the property document
+                property_doc = property_cache.get(property_doc_ref)
+                if not property_doc.exists:
+                    raise ValueError('Property document does not exist')
 
-            # Get the timezone from the property document
-            property_timezone = timezone(property_doc.to_dict().get('timezone', 'UTC'))
+                # Get the timezone from the property document
+                property_tz = get_timezone(property_doc.to_dict().get('timezone', 'UTC'))
 
             if isinstance(event.start, Date):
                 # Parse the date and set the time to 00:00:00 in the property's timezone
                 start_date = datetime.fromisoformat(event.start.date)
-                start_datetime = property_timezone.localize(start_date.replace(hour=0, minute=0, second=0))
+                start_datetime = property_tz.localize(start_date.replace(hour=0, minute=0, second=0))
 
                 # Parse the date and set the time to 00:00:00 on the next day in the property's timezone
                 end_date = datetime.fromisoformat(event.end.date)
-                end_datetime = property_timezone.localize(end_date.replace(hour=0, minute=0, second=0))
+                end_datetime = property_tz.localize(end_date.replace(hour=0, minute=0, second=0))
         else:
             start_datetime_str = event.start.dateTime
             end_datetime_str = event.end.dateTime
@@ -199,82 +452,467 @@ def convert_event_to_trip_data(event: GCalEvent, property_doc_ref: Any) -> TripD
             eventId=event.id,
             eventSummary=summary,
         )
+        trip_data.eventHash = trip_content_hash(trip_data.dict())
 
         return trip_data
 
 
-def process_event(event: Union[GCalEvent, CancelledGCalEvent], property_doc_ref: Any):
+def event_index_ref(event_id: str) -> Any:
+    return db.collection(EVENT_INDEX_COLLECTION).document(event_id)
+
+
+def index_event_trip(event_id: str, trip_reference: Any, batch: Any = None):
+    """
+    Record which trip an event belongs to when the trip's document id is not the event id.
+    """
+    if trip_reference.id == event_id:
+        return
+    data = {'tripRef': trip_reference}
+    if batch is not None:
+        batch.set(event_index_ref(event_id), data)
+    else:
+        event_index_ref(event_id).set(data)
+
+
+def find_trips_by_event_ids(event_ids: list[str]) -> dict[str, list]:
+    """
+    Find the trips for a set of event ids by key rather than by querying the trips collection.
+
+    Trips created from calendar events use the event id as their document id and are read directly. Trips whose
+    event was created from the trip, such as Teamworks bookings, are found through the event index. While
+    `cal_event_index_fallback` is on, events found neither way are also looked up with `in` queries on eventId,
+    for trips from before the index that scripts/backfill_event_index.py has not reached yet.
+    """
+    trips_by_event_id = {event_id: [] for event_id in event_ids}
+    if not trips_by_event_id:
+        return trips_by_event_id
+
+    trips = db.collection('trips')
+    for trip in db.get_all([trips.document(event_id) for event_id in trips_by_event_id]):
+        if trip.exists and trip.to_dict().get('eventId') == trip.id:
+            trips_by_event_id[trip.id].append(trip)
+
+    missing = [event_id for event_id, found in trips_by_event_id.items() if not found]
+    indexed_trips = {}
+    if missing:
+        for entry in db.get_all([event_index_ref(event_id) for event_id in missing]):
+            trip_ref = entry.to_dict().get('tripRef') if entry.exists else None
+            if trip_ref is not None:
+                indexed_trips[trip_ref.id] = (entry.id, trip_ref)
+    if indexed_trips:
+        for trip in db.get_all([trip_ref for _, trip_ref in indexed_trips.values()]):
+            event_id = indexed_trips[trip.id][0]
+            # Index entries go stale when a trip is cancelled or moved to another event
+            if trip.exists and trip.to_dict().get('eventId') == event_id:
+                trips_by_event_id[event_id].append(trip)
+
+    if settings.cal_event_index_fallback:
+        missing = [event_id for event_id, found in trips_by_event_id.items() if not found]
+        for start in range(0, len(missing), FIRESTORE_IN_LIMIT):
+            chunk = missing[start : start + FIRESTORE_IN_LIMIT]
+            for trip in trips.where(filter=FieldFilter('eventId', 'in', chunk)).stream():
+                trips_by_event_id[trip.get('eventId')].append(trip)
+    return trips_by_event_id
+
+
+class TripWrites:
+    """
+    Collects the trip writes for a page of events and commits them with Firestore write batches.
+
+    Writes are grouped by event so one event's writes never straddle two batches, and each write is only
+    logged and counted once its batch has committed. Counts are kept per instance and for the whole process.
+    """
+
+    _totals = {'created': 0, 'updated': 0, 'deleted': 0, 'skipped': 0, 'conflicts': 0}
+    _totals_lock = threading.Lock()
+
+    def __init__(self):
+        self._writes_by_event: dict[str, list] = {}
+        self.counts = dict.fromkeys(self._totals, 0)
+        self.conflicts: list[dict] = []
+
+    def _add(self, event_id: str, action: str, reference: Any, data: dict | None, message: str, *args):
+        self._writes_by_event.setdefault(event_id, []).append((action, reference, data, message, args))
+
+    def create(self, event_id: str, reference: Any, data: dict, message: str, *args):
+        self._add(event_id, 'create', reference, data, message, *args)
+
+    def update(self, event_id: str, reference: Any, data: dict, message: str, *args):
+        self._add(event_id, 'update', reference, data, message, *args)
+
+    def delete(self, event_id: str, reference: Any, message: str, *args):
+        self._add(event_id, 'delete', reference, None, message, *args)
+
+    def skip(self):
+        """
+        Count a trip left alone because its event has not changed.
+        """
+        self._count('skipped')
+
+    def conflict(self, event_id: str, trip_id: str, conflicting_trip_ids: list[str]):
+        """
+        Report a trip that overlaps other trips of its property.
+        """
+        self.conflicts.append({'eventId': event_id, 'tripId': trip_id, 'conflictingTripIds': conflicting_trip_ids})
+        self._count('conflicts')
+
+    def _count(self, key: str, amount: int = 1):
+        self.counts[key] += amount
+        with self._totals_lock:
+            self._totals[key] += amount
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._totals_lock:
+            return dict(cls._totals)
+
+    def _batches(self):
+        batch, size = [], 0
+        for event_id, writes in self._writes_by_event.items():
+            if batch and size + len(writes) > FIRESTORE_BATCH_LIMIT:
+                yield batch
+                batch, size = [], 0
+            batch.append((event_id, writes))
+            size += len(writes)
+        if batch:
+            yield batch
+
+    def commit(self) -> set[str]:
+        """
+        Commit every collected write, returning the ids of the events whose batch failed.
+        """
+        failed_event_ids = set()
+        for events in self._batches():
+            batch = db.batch()
+            for _, writes in events:
+                for action, reference, data, _, _ in writes:
+                    if action == 'create':
+                        batch.set(reference, data)
+                    elif action == 'update':
+                        batch.update(reference, data)
+                    else:
+                        batch.delete(reference)
+            try:
+                batch.commit()
+            except Exception as e:
+                for event_id, _ in events:
+                    app_logger.error('Error processing event %s: %s', event_id, e)
+                    failed_event_ids.add(event_id)
+                continue
+
+            for _, writes in events:
+                for action, _, _, message, args in writes:
+                    self._count({'create': 'created', 'update': 'updated', 'delete': 'deleted'}[action])
+                    app_logger.info(message, *args)
+        self._writes_by_event = {}
+        return failed_event_ids
+
+
+def process_events(
+    events: list[Union[GCalEvent, CancelledGCalEvent]], property_doc_ref: Any, property_tz: tzinfo | None = None
+) -> list[dict]:
+    """
+    Process a page of events, resolving their trips in bulk and committing the resulting writes in batches.
+
+    Returns the trips found to overlap other trips of the property.
+    """
+    with logfire.span('process_events'):
+        existing_trips_by_event_id = find_trips_by_event_ids([event.id for event in events])
+        writes = TripWrites()
+        for event in events:
+            try:
+                process_event(event, property_doc_ref, existing_trips_by_event_id[event.id], writes, property_tz)
+            except Exception as e:
+                app_logger.error('Error processing event %s: %s', event.id, e)
+                continue
+        if writes.commit():
+            # The in-memory indexes already hold the failed writes, so reload them from Firestore next time
+            booking_index.invalidate(property_doc_ref)
+            availability_index.invalidate(property_doc_ref)
+        app_logger.info(
+            'Processed %s events: %s trips created, %s updated, %s unchanged, %s conflicting',
+            len(events),
+            writes.counts['created'],
+            writes.counts['updated'],
+            writes.counts['skipped'],
+            writes.counts['conflicts'],
+        )
+        return writes.conflicts
+
+
+def process_event(
+    event: Union[GCalEvent, CancelledGCalEvent],
+    property_doc_ref: Any,
+    existing_trips: list,
+    writes: TripWrites,
+    property_tz: tzinfo | None = None,
+):
     if event.status == 'cancelled':
-        handle_cancelled_event(event)
+        handle_cancelled_event(event, existing_trips, writes)
     else:
-        handle_validated_event(event, property_doc_ref)
+        handle_validated_event(event, property_doc_ref, existing_trips, writes, property_tz)
 
 
-def handle_cancelled_event(event: CancelledGCalEvent):
-    existing_trips = db.collection('trips').where(filter=FieldFilter('eventId', '==', event.id)).get()
+def handle_cancelled_event(event: CancelledGCalEvent, existing_trips: list, writes: TripWrites):
     for trip in existing_trips:
-        trip.reference.update({'cancelTrip': True, 'eventId': ''})
-        app_logger.info('Marked trip %s as cancelled for cancelled event: %s', trip.id, event.id)
+        booking_index.remove(trip.id)
+        availability_index.remove(trip.id)
+        writes.update(
+            event.id,
+            trip.reference,
+            {'cancelTrip': True, 'eventId': ''},
+            'Marked trip %s as cancelled for cancelled event: %s',
+            trip.id,
+            event.id,
+        )
 
 
-def handle_validated_event(event: GCalEvent, property_doc_ref: Any):
-    trip_data = convert_event_to_trip_data(event, property_doc_ref)
+def handle_validated_event(
+    event: GCalEvent,
+    property_doc_ref: Any,
+    existing_trips: list,
+    writes: TripWrites,
+    property_tz: tzinfo | None = None,
+):
+    trip_data = convert_event_to_trip_data(event, property_doc_ref, property_tz)
     if not trip_data:
         app_logger.info('Trip data is None, skipping event: %s', event.id)
         return
-    existing_trips = db.collection('trips').where(filter=FieldFilter('eventId', '==', event.id)).get()
+    write_trip_data(event, trip_data, existing_trips, writes)
+
+
+def write_trip_data(event: GCalEvent, trip_data: TripData, existing_trips: list, writes: TripWrites):
+    """
+    Update the event's trip, removing any duplicates, or create one if the event has no trip yet.
+
+    The trip is checked against the property's other upcoming trips, with the buffer time around it, and flagged
+    if it overlaps any of them.
+    """
+    trip_id = existing_trips[0].id if existing_trips else event.id
+    conflicts = booking_index.put(
+        trip_data.propertyRef, trip_id, trip_data.tripBeginDateTime, trip_data.tripEndDateTime
+    )
+    if conflicts:
+        app_logger.warning('Trip %s for event %s overlaps trips: %s', trip_id, event.id, conflicts)
+        writes.conflict(event.id, trip_id, conflicts)
+
     if existing_trips:
-        update_existing_trip(existing_trips[0], trip_data, event)
+        update_existing_trip(existing_trips[0], trip_data, event, writes, conflicts)
         # Clean up duplicates
         for dup in existing_trips[1:]:
-            dup.reference.delete()
-            app_logger.info('Deleted duplicate trip %s for event: %s', dup.id, event.id)
+            booking_index.remove(dup.id)
+            availability_index.remove(dup.id)
+            writes.delete(event.id, dup.reference, 'Deleted duplicate trip %s for event: %s', dup.id, event.id)
     else:
-        create_new_trip(trip_data, event)
+        create_new_trip(trip_data, event, writes, conflicts)
+
+
+def _field_changed(old: Any, new: Any) -> bool:
+    # References read back from Firestore are new objects, so compare them by id
+    if hasattr(old, 'id') and hasattr(new, 'id'):
+        return old.id != new.id
+    return old != new
 
 
-def update_existing_trip(trip_ref, trip_data: TripData, event: GCalEvent):
+def conflict_fields(conflicting_trip_ids: list[str]) -> dict:
+    """
+    The fields that flag a trip as overlapping other trips; a trip without them has no conflicts.
+    """
+    return {
+        'bookingConflict': bool(conflicting_trip_ids),
+        'conflictingTripRefs': [db.collection('trips').document(trip_id) for trip_id in conflicting_trip_ids],
+    }
+
+
+def _conflicts_changed(existing: dict, conflicting_trip_ids: list[str]) -> bool:
+    stored_ids = [ref.id for ref in existing.get('conflictingTripRefs') or []]
+    return existing.get('bookingConflict', False) != bool(conflicting_trip_ids) or stored_ids != conflicting_trip_ids
+
+
+def update_existing_trip(
+    trip_ref, trip_data: TripData, event: GCalEvent, writes: TripWrites, conflicts: list[str] | None = None
+):
     """
     Update an existing trip in the Firestore database from the Google Calendar event,
+    writing only the fields that changed and nothing at all if neither the event's content hash nor the trip's
+    conflicts have changed.
     """
-    trip_ref.reference.update(trip_data.dict())
-    app_logger.info('Updated trip for event: %s, trip ref: %s', event.id, trip_ref.id)
+    availability_index.put(trip_data.propertyRef, trip_ref.id, trip_data.tripBeginDateTime, trip_data.tripEndDateTime)
+    existing = trip_ref.to_dict()
+    flags = conflict_fields(conflicts) if conflicts is not None and _conflicts_changed(existing, conflicts) else {}
+    if stored_trip_hash(existing) == trip_data.eventHash and not flags:
+        writes.skip()
+        return
+
+    # Keep the trip's original creation time
+    changes = {
+        field: value
+        for field, value in trip_data.dict(exclude={'tripCreated'}).items()
+        if field not in existing or _field_changed(existing[field], value)
+    }
+    changes.update(flags)
+    writes.update(
+        event.id,
+        trip_ref.reference,
+        changes,
+        'Updated %s on trip for event: %s, trip ref: %s',
+        sorted(changes),
+        event.id,
+        trip_ref.id,
+    )
 
 
-def create_new_trip(trip_data: TripData, event: GCalEvent):
+def create_new_trip(trip_data: TripData, event: GCalEvent, writes: TripWrites, conflicts: list[str] | None = None):
     # Use eventId as document ID so concurrent creates are idempotent
     doc_ref = db.collection('trips').document(event.id)
-    doc_ref.set(trip_data.dict())
-    app_logger.info('Created new trip for event: %s, trip ref: %s', event.id, doc_ref.id)
+    availability_index.put(trip_data.propertyRef, doc_ref.id, trip_data.tripBeginDateTime, trip_data.tripEndDateTime)
+    data = trip_data.dict()
+    if conflicts:
+        data.update(conflict_fields(conflicts))
+    writes.create(event.id, doc_ref, data, 'Created new trip for event: %s, trip ref: %s', event.id, doc_ref.id)
+
+
+def delete_documents(references: list) -> int:
+    """
+    Delete documents in write batches of FIRESTORE_BATCH_LIMIT, returning how many were deleted.
+    """
+    for start in range(0, len(references), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for reference in references[start : start + FIRESTORE_BATCH_LIMIT]:
+            batch.delete(reference)
+        batch.commit()
+    return len(references)
+
+
+def delete_query_in_batches(
+    query: Any,
+    order_field: str,
+    page_size: int = FIRESTORE_BATCH_LIMIT,
+    start_after: dict | None = None,
+    max_pages: int | None = None,
+    select: Callable[[list], list] | None = None,
+) -> dict:
+    """
+    Delete the documents matched by `query` a page at a time, committing each page as one write batch.
+
+    Pages are ordered by `order_field`, which must be the field of the query's range filter if it has one, then
+    by document id. `cursor` in the result holds both for the last document scanned, so a run stopped by
+    `max_pages` or an error can be resumed by passing it back as `start_after`. When `select` is given, only the
+    documents of a page that it returns are deleted.
+    """
+    start = time.monotonic()
+    result = {'deleted': 0, 'scanned': 0, 'pages': 0, 'cursor': start_after, 'complete': False}
+    while max_pages is None or result['pages'] < max_pages:
+        page_query = query.order_by(order_field).order_by(FieldPath.document_id()).limit(page_size)
+        if result['cursor']:
+            page_query = page_query.start_after(result['cursor'])
+        page = list(page_query.stream())
+        if not page:
+            result['complete'] = True
+            break
+
+        result['deleted'] += delete_documents([doc.reference for doc in (select(page) if select else page)])
+        result['scanned'] += len(page)
+        result['pages'] += 1
+        result['cursor'] = {order_field: page[-1].get(order_field), FieldPath.document_id(): page[-1].id}
+        app_logger.info(
+            'Deleted %s of %s documents scanned, cursor: %s', result['deleted'], result['scanned'], result['cursor']
+        )
+        if len(page) < page_size:
+            result['complete'] = True
+            break
+
+    result['seconds'] = round(time.monotonic() - start, 3)
+    return result
+
 
+def clear_event_store(
+    property_ref: Any,
+    start_after: dict | None = None,
+    max_pages: int | None = None,
+    page_size: int = FIRESTORE_BATCH_LIMIT,
+) -> dict:
+    """
+    Delete the property's future external trips in pages of batched deletes, returning the counts, duration and
+    a cursor to resume from if the run did not complete.
+    """
+    with logfire.span('clear_event_store'):
+        if isinstance(property_ref, str):
+            property_ref = db.document(property_ref)
+        result = delete_query_in_batches(
+            future_trips_query(property_ref, external=True),
+            'tripBeginDateTime',
+            page_size=page_size,
+            start_after=start_after,
+            max_pages=max_pages,
+        )
+        booking_index.invalidate(property_ref)
+        availability_index.invalidate(property_ref)
 
-def clear_event_store(property_ref: str):
-    # Get a reference to the 'trips' collection
-    trips_ref = db.collection('trips')
+        if result['complete']:
+            app_logger.info(
+                'Event store successfully cleared: %s trips deleted in %ss.', result['deleted'], result['seconds']
+            )
+        else:
+            app_logger.info(
+                'Event store partially cleared: %s trips deleted, resume after %s.', result['deleted'], result['cursor']
+            )
+        return result
 
-    # Get the current time
-    now = datetime.utcnow()
 
-    # Query for all documents where 'propertyRef' matches the given property_ref, 'isExternal' is True,
-    # and 'tripBeginDateTime' is in the future
-    trips = (
-        trips_ref.where(filter=FieldFilter('propertyRef', '==', property_ref))
-        .where(filter=FieldFilter('isExternal', '==', True))
-        .where(filter=FieldFilter('tripBeginDateTime', '>', now))
-        .stream()
+def select_duplicate_trips(trips: list) -> list:
+    """
+    Pick the external trips that duplicate the trip keyed by their event id, which sync keeps.
+    """
+    event_ids = {trip.id: trip.to_dict().get('eventId') for trip in trips}
+    candidates = [trip for trip in trips if event_ids[trip.id] and event_ids[trip.id] != trip.id]
+    if not candidates:
+        return []
+    trips_collection = db.collection('trips')
+    event_trips = db.get_all(
+        [trips_collection.document(event_id) for event_id in {event_ids[trip.id] for trip in candidates}]
     )
+    kept = {trip.id for trip in event_trips if trip.exists and trip.to_dict().get('eventId') == trip.id}
+    return [trip for trip in candidates if event_ids[trip.id] in kept]
 
-    # Delete each document
-    for trip in trips:
-        trip.reference.delete()
 
-    app_logger.info('Event store successfully cleared.')
+def delete_duplicate_trips(
+    property_ref: Any,
+    start_after: dict | None = None,
+    max_pages: int | None = None,
+    page_size: int = FIRESTORE_BATCH_LIMIT,
+) -> dict:
+    """
+    Delete the property's future external trips that duplicate another trip for the same event, in pages of
+    batched deletes, returning the counts, duration and a cursor to resume from if the run did not complete.
+    """
+    with logfire.span('delete_duplicate_trips'):
+        if isinstance(property_ref, str):
+            property_ref = db.document(property_ref)
+        result = delete_query_in_batches(
+            future_trips_query(property_ref, external=True),
+            'tripBeginDateTime',
+            page_size=page_size,
+            start_after=start_after,
+            max_pages=max_pages,
+            select=select_duplicate_trips,
+        )
+        if result['deleted']:
+            booking_index.invalidate(property_ref)
+            availability_index.invalidate(property_ref)
+        app_logger.info(
+            'Deleted %s duplicate trips of %s scanned for property: %s',
+            result['deleted'],
+            result['scanned'],
+            property_ref.id,
+        )
+        return result
 
 
 def delete_calendar_watch_channel(id: str, resource_id: str):
     app_logger.info('Deleting calendar watch channel: %s', id)
     # Call the Google Calendar API to delete the channel
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_calendar_service()
     try:
         service.channels().stop(body={'id': id, 'resourceId': resource_id}).execute()
         app_logger.info('Calendar watch channel successfully deleted.')
@@ -283,6 +921,19 @@ def delete_calendar_watch_channel(id: str, resource_id: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+async def delete_calendar_watch_channel_async(id: str, resource_id: str):
+    """
+    Like delete_calendar_watch_channel, awaiting the async Calendar client instead of blocking a thread.
+    """
+    app_logger.info('Deleting calendar watch channel: %s', id)
+    try:
+        await async_calendar_client.channels_stop({'id': id, 'resourceId': resource_id})
+        app_logger.info('Calendar watch channel successfully deleted.')
+    except HttpError as e:
+        app_logger.error('Error deleting calendar watch channel: %s', e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 def initialize_trips_from_cal(property_ref: str, calendar_id: str):
     with logfire.span('initialize_trips_from_cal'):
         app_logger.info('Initialising trips from calendar: %s , property: %s', calendar_id, property_ref)
@@ -293,9 +944,10 @@ def initialize_trips_from_cal(property_ref: str, calendar_id: str):
 
         # Update the externalCalendar field with the provided calendar_id
         property_doc.update({'externalCalendar': calendar_id})
+        property_cache.invalidate(property_doc)
 
         # Call the Google Calendar API to fetch the future events
-        service = build('calendar', 'v3', credentials=creds)
+        service = get_calendar_service()
 
         # test calendar list
         calendars = service.calendarList().list().execute()
@@ -311,48 +963,198 @@ def initialize_trips_from_cal(property_ref: str, calendar_id: str):
 
             # Update the property document with the new channel id and expiration time
             property_doc.update({'channelId': new_channel['id'], 'channelExpiration': expiration})
+            property_cache.invalidate(property_doc)
 
-        sync_calendar_events(property_doc)
+        # A sync already running may have read the old calendar, so queue a follow-up rather than joining it
+        sync_calendar_events(property_doc, wait=False)
         create_events_for_future_trips(property_doc.id)
 
 
+def build_trip_event_body(trip_id: str, trip_data: dict, property_id: str, property_name: str, guest_name: str) -> dict:
+    """
+    Build the Google Calendar event body for a Teamworks trip.
+    """
+    # Construct the booking link
+    booking_link = f'{settings.app_url}/bookingDetails?tripPassed={trip_id}&property={property_id}'
+
+    # Set the event summary based on whether the trip is blocked or not
+    if trip_data.get('isBlocked'):
+        summary = 'Blocked | Teamworks'
+        app_logger.info('Blocked event summary: %s', summary)
+    else:
+        summary = f'Office Booking for {guest_name} | Teamworks'
+
+    # Get the booking start and end times
+    main_start = trip_data['tripBeginDateTime']
+    main_end = trip_data['tripEndDateTime']
+
+    return {
+        'summary': summary,
+        'description': f'Property: {property_name}\nTrip Ref: trips/{trip_id}\nBooking Link: {booking_link}',
+        'start': {'dateTime': main_start.isoformat(), 'timeZone': 'UTC'},
+        'end': {'dateTime': main_end.isoformat(), 'timeZone': 'UTC'},
+    }
+
+
+def execute_calendar_batch(requests: dict[str, Any]) -> tuple[dict[str, dict], dict[str, Exception]]:
+    """
+    Execute Calendar API requests through the batch endpoint, at most CALENDAR_BATCH_LIMIT per HTTP request.
+
+    Requests that fail with a retryable error are batched again after a backoff; inserts only when throttled, as an
+    insert that got a 5xx may still have created its event. A batch that fails as a whole, once the limiter has
+    given up on it, records its error for each of its requests, so the responses of the other batches are still
+    returned. Returns the responses and the errors, both keyed like `requests`.
+    """
+    responses, errors = {}, {}
+    failed_batches = set()
+    idempotent = {key: is_idempotent(request.method) for key, request in requests.items()}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            responses[request_id] = response
+
+    service = get_calendar_service()
+    pending, attempt = list(requests), 0
+    while pending:
+        for start in range(0, len(pending), CALENDAR_BATCH_LIMIT):
+            keys = pending[start : start + CALENDAR_BATCH_LIMIT]
+            batch = service.new_batch_http_request(callback=callback)
+            for key in keys:
+                batch.add(requests[key], request_id=key)
+            try:
+                # Each request in a batch counts against the quota on its own
+                google_api_limiter.call(
+                    batch.execute,
+                    calendar_id=calendar_id_from_uri(requests[keys[0]].uri),
+                    cost=len(keys),
+                    idempotent=all(idempotent[key] for key in keys),
+                )
+            except Exception as e:
+                app_logger.error('Calendar batch of %s requests failed: %s', len(keys), e)
+                for key in keys:
+                    if key not in responses:
+                        errors[key] = e
+                        failed_batches.add(key)
+
+        # The limiter has already retried the batches that failed as a whole
+        retry = [
+            key
+            for key in pending
+            if key in errors
+            and key not in failed_batches
+            and google_api_limiter.record_error(errors[key], idempotent[key])
+        ]
+        if not retry:
+            break
+        if attempt >= google_api_limiter.max_retries:
+            for _ in retry:
+                google_api_limiter.record_failure()
+            break
+        google_api_limiter.backoff(attempt, max(retry_after_seconds(errors[key]) for key in retry))
+        for key in retry:
+            del errors[key]
+        pending, attempt = retry, attempt + 1
+    return responses, errors
+
+
+def write_back_event_ids(created: list[tuple[Any, str]]) -> set[str]:
+    """
+    Store the ids of newly created events on their trips, with their event index entries, returning the ids of the
+    trips whose write failed.
+
+    A failed batch is logged and the rest are still committed, since a trip left without its event id gets a second
+    event the next time its events are created.
+    """
+    failed_trip_ids = set()
+    # Two writes per trip: the eventId and its event index entry
+    for start in range(0, len(created), FIRESTORE_BATCH_LIMIT // 2):
+        chunk = created[start : start + FIRESTORE_BATCH_LIMIT // 2]
+        batch = db.batch()
+        for trip_ref, event_id in chunk:
+            batch.update(trip_ref, {'eventId': event_id})
+            index_event_trip(event_id, trip_ref, batch)
+        try:
+            batch.commit()
+        except Exception as e:
+            for trip_ref, event_id in chunk:
+                app_logger.error('Error storing event %s on trip %s: %s', event_id, trip_ref.id, e)
+                failed_trip_ids.add(trip_ref.id)
+            continue
+        for trip_ref, event_id in chunk:
+            app_logger.info('Created main event: %s for trip: %s', event_id, trip_ref.id)
+    return failed_trip_ids
+
+
+def future_trips_query(property_ref: Any, external: bool) -> Any:
+    """
+    Query the property's trips that begin in the future, either those from its external calendar or Teamworks ones.
+    """
+    return (
+        db.collection('trips')
+        .where(filter=FieldFilter('propertyRef', '==', property_ref))
+        .where(filter=FieldFilter('isExternal', '==', external))
+        .where(filter=FieldFilter('tripBeginDateTime', '>', datetime.utcnow()))
+    )
+
+
+def future_trips(property_ref: Any, external: bool):
+    return future_trips_query(property_ref, external).stream()
+
+
 def create_events_for_future_trips(property_doc_id: str):
     with logfire.span(f'create_events_for_future_trips for property: {property_doc_id}'):
-        # Get the current time
-        now = datetime.utcnow()
-
         # Fetch the specific property document
-        property_doc = db.collection('properties').document(property_doc_id).get()
+        property_doc = property_cache.get(property_doc_id)
         if not property_doc.exists:
             app_logger.error('Property document does not exist for: %s', property_doc_id)
             raise HTTPException(status_code=404, detail='Property not found')
 
-        # Query for all documents where 'propertyRef' matches the given property_ref, 'isExternal' is False,
-        # 'eventId' does not exist, and 'tripBeginDateTime' is in the future
-        future_trips = (
-            db.collection('trips')
-            .where(filter=FieldFilter('propertyRef', '==', property_doc.reference))
-            .where(filter=FieldFilter('isExternal', '==', False))
-            .where(filter=FieldFilter('tripBeginDateTime', '>', now))
-            .stream()
-        )
+        property_data = property_doc.to_dict()
+        calendar_id = property_data.get('externalCalendar')
+        if not calendar_id:
+            app_logger.error('No external calendar set for property: %s', property_doc_id)
+            raise HTTPException(status_code=400, detail='No external calendar set for property')
+
+        # Teamworks trips in the future that have no 'eventId' yet
+        trips_without_event = []
+        for trip in future_trips(property_doc.reference, external=False):
+            app_logger.info('Trip data: %s', trip)
+            if 'eventId' in trip.to_dict():
+                app_logger.info('Event already exists for trip: %s', trip.reference)
+            else:
+                trips_without_event.append(trip)
 
-        if not future_trips:
-            app_logger.info('No future trips found for property: %s', property_doc_id)
+        if not trips_without_event:
+            app_logger.info('No future trips without events found for property: %s', property_doc_id)
             return
 
-        # For each future trip, create an event and call create_or_update_event_from_trip
-        for trip in future_trips:
+        # Fetch every guest in one round trip
+        user_cache.prefetch(trip.to_dict().get('userRef') for trip in trips_without_event)
+
+        service = get_calendar_service()
+        requests = {}
+        for trip in trips_without_event:
             trip_data = trip.to_dict()
-            app_logger.info('Trip data: %s', trip)
-            if 'eventId' not in trip_data:
-                # Call create_or_update_event_from_trip to create the event
-                app_logger.info('Creating event for trip: %s', trip.reference)
-                document_ref_str = 'properties/' + property_doc_id
-                trip_ref_str = 'trips/' + trip.id
-                create_or_update_event_from_trip(document_ref_str, trip_ref_str)
-            else:
-                app_logger.info('Event already exists for trip: %s', trip.reference)
+            user_ref = trip_data.get('userRef')
+            user = user_cache.get(user_ref) if user_ref else None
+            if user is None:
+                app_logger.error('User document does not exist for: %s', user_ref)
+                continue
+            guest_name = user.get('display_name') or 'Guest'
+            body = build_trip_event_body(trip.id, trip_data, property_doc_id, property_data['propertyName'], guest_name)
+            app_logger.info('Creating event for trip: %s', trip.reference)
+            requests[trip.id] = service.events().insert(calendarId=calendar_id, body=body)
+
+        with logfire.span(f'inserting {len(requests)} events in batches'):
+            created, errors = execute_calendar_batch(requests)
+        for trip_id, error in errors.items():
+            app_logger.error('Error creating event for trip %s: %s', trip_id, error)
+
+        # Write every new event id back in as few Firestore batches as possible
+        trips_by_id = {trip.id: trip for trip in trips_without_event}
+        write_back_event_ids([(trips_by_id[trip_id].reference, event['id']) for trip_id, event in created.items()])
 
 
 def create_or_update_event_from_trip(property_ref, trip_ref):
@@ -361,8 +1163,8 @@ def create_or_update_event_from_trip(property_ref, trip_ref):
     """
     with logfire.span('create_or_update_event_from_trip'):
         # Fetch the specific property document
-        property_collection_id, property_document_id = property_ref.split('/')
-        property_doc = db.collection(property_collection_id).document(property_document_id).get()
+        property_document_id = property_ref.split('/')[1]
+        property_doc = property_cache.get(property_document_id)
 
         if property_doc.exists:
             app_logger.info('Property document exists for trip: %s', property_ref)
@@ -383,39 +1185,20 @@ def create_or_update_event_from_trip(property_ref, trip_ref):
             if trip_doc.exists:
                 trip_data = trip_doc.to_dict()
 
-                # Fetch the specific user document
+                # Fetch the specific user's profile
                 app_logger.info('UserRef: %s', trip_data['userRef'].path)
-                collection_id, document_id = trip_data['userRef'].path.split('/')
-                user_doc = db.collection(collection_id).document(document_id).get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    guest_name = user_data.get('display_name') or 'Guest'
+                user = user_cache.get(trip_data['userRef'])
+                if user is not None:
+                    guest_name = user.get('display_name') or 'Guest'
                     app_logger.info('Guest name: %s', guest_name)
 
-                    # Construct the booking link
-                    booking_link = f'{settings.app_url}/bookingDetails?tripPassed={trip_document_id}&property={property_document_id}'
-
-                    # Set the event summary based on whether the trip is blocked or not
-                    if trip_doc.get('isBlocked'):
-                        summary = 'Blocked | Teamworks'
-                        app_logger.info('Blocked event summary: %s', summary)
-                    else:
-                        summary = f'Office Booking for {guest_name} | Teamworks'
-
-                    # Get the booking start and end times
-                    main_start = trip_data['tripBeginDateTime']
-                    main_end = trip_data['tripEndDateTime']
-
                     # Create the main event data
-                    main_event_data = {
-                        'summary': summary,
-                        'description': f'Property: {property_name}\nTrip Ref: {trip_ref}\nBooking Link: {booking_link}',
-                        'start': {'dateTime': main_start.isoformat(), 'timeZone': 'UTC'},
-                        'end': {'dateTime': main_end.isoformat(), 'timeZone': 'UTC'},
-                    }
+                    main_event_data = build_trip_event_body(
+                        trip_document_id, trip_data, property_document_id, property_name, guest_name
+                    )
 
                     # Call the Google Calendar API to update or create the main event
-                    service = build('calendar', 'v3', credentials=creds)
+                    service = get_calendar_service()
 
                     # Handle the main event
                     if 'eventId' in trip_data:
@@ -428,6 +1211,7 @@ def create_or_update_event_from_trip(property_ref, trip_ref):
                         event = service.events().insert(calendarId=calendar_id, body=main_event_data).execute()
                         app_logger.info('Created main event: %s', event['id'])
                         trip_doc.reference.update({'eventId': event['id']})
+                        index_event_trip(event['id'], trip_doc.reference)
 
                 else:
                     app_logger.error('User document does not exist for: %s', trip_data['userRef'])
@@ -440,36 +1224,149 @@ def create_or_update_event_from_trip(property_ref, trip_ref):
             raise HttpError
 
 
+def create_or_update_events_from_trips(items: list[EventFromTrip]) -> list[dict]:
+    """
+    Create or update the Google Calendar events for many trips at once, returning a result per item. Each trip
+    must appear only once.
+
+    Properties come from the property cache, trips and guests are read with get_all, the events are sent through
+    the Calendar batch endpoint one calendar at a time and new event ids are written back in Firestore batches.
+    """
+    with logfire.span(f'create_or_update_events_from_trips: {len(items)} items'):
+        results = {item.trip_ref: {'tripRef': item.trip_ref, 'propertyRef': item.property_ref} for item in items}
+
+        def fail(trip_ref: str, message: str):
+            app_logger.error('%s: %s', message, trip_ref)
+            results[trip_ref].update(status='error', message=message)
+
+        trip_ids = {trip_ref: trip_ref.split('/')[-1] for trip_ref in results}
+        trips_collection = db.collection('trips')
+        trips = {
+            trip.id: trip
+            for trip in db.get_all([trips_collection.document(trip_id) for trip_id in trip_ids.values() if trip_id])
+        }
+        user_cache.prefetch(trip.to_dict().get('userRef') for trip in trips.values() if trip.exists)
+
+        service = get_calendar_service()
+        requests_by_calendar: dict[str, dict[str, Any]] = {}
+        trip_docs = {}
+        for trip_ref, result in results.items():
+            try:
+                property_doc = property_cache.get(result['propertyRef']) if result['propertyRef'] else None
+            except ValueError:
+                property_doc = None
+            if property_doc is None:
+                fail(trip_ref, 'Invalid property document reference')
+                continue
+            if not property_doc.exists:
+                fail(trip_ref, 'Property document does not exist')
+                continue
+            property_data = property_doc.to_dict()
+            calendar_id = property_data.get('externalCalendar')
+            if not calendar_id:
+                fail(trip_ref, 'No external calendar set for property')
+                continue
+
+            trip_doc = trips.get(trip_ids[trip_ref])
+            if trip_doc is None or not trip_doc.exists:
+                fail(trip_ref, 'Trip document does not exist')
+                continue
+            trip_data = trip_doc.to_dict()
+            user = user_cache.get(trip_data['userRef']) if trip_data.get('userRef') else None
+            if user is None:
+                fail(trip_ref, 'User document does not exist')
+                continue
+
+            body = build_trip_event_body(
+                trip_doc.id,
+                trip_data,
+                property_doc.id,
+                property_data['propertyName'],
+                user.get('display_name') or 'Guest',
+            )
+            if 'eventId' in trip_data:
+                body['id'] = trip_data['eventId']
+                request = service.events().update(calendarId=calendar_id, eventId=trip_data['eventId'], body=body)
+            else:
+                request = service.events().insert(calendarId=calendar_id, body=body)
+            requests_by_calendar.setdefault(calendar_id, {})[trip_ref] = request
+            trip_docs[trip_ref] = trip_doc
+
+        created = []
+        for calendar_id, requests in requests_by_calendar.items():
+            with logfire.span(f'sending {len(requests)} events to calendar {calendar_id}'):
+                responses, errors = execute_calendar_batch(requests)
+            for trip_ref, error in errors.items():
+                fail(trip_ref, f'Error sending event: {error}')
+            for trip_ref, event in responses.items():
+                if 'eventId' in trip_docs[trip_ref].to_dict():
+                    results[trip_ref].update(status='updated', eventId=event['id'])
+                else:
+                    results[trip_ref].update(status='created', eventId=event['id'])
+                    created.append((trip_ref, event['id']))
+
+        failed_trip_ids = write_back_event_ids(
+            [(trip_docs[trip_ref].reference, event_id) for trip_ref, event_id in created]
+        )
+        for trip_ref, event_id in created:
+            if trip_docs[trip_ref].id in failed_trip_ids:
+                fail(trip_ref, f'Event {event_id} was created but could not be stored on the trip')
+
+        app_logger.info(
+            'Sent events for %s trips: %s created, %s failed',
+            len(results),
+            len(created),
+            sum(result.get('status') == 'error' for result in results.values()),
+        )
+        return [results[item.trip_ref] for item in items]
+
+
+def trip_event_to_delete(property_ref, trip_ref) -> tuple[str, str]:
+    """
+    Find the calendar id and event id of a trip's event
+    """
+    # Fetch the specific property document
+    property_doc = property_cache.get(property_ref)
+
+    if property_doc.exists:
+        app_logger.info('Property document exists for trip: %s', property_ref)
+        property_data = property_doc.to_dict()
+        calendar_id = property_data['externalCalendar']
+
+        # Fetch the specific trip document
+        collection_id, document_id = trip_ref.split('/')
+        trip_doc = db.collection(collection_id).document(document_id).get()
+        if trip_doc.exists:
+            return calendar_id, trip_doc.to_dict()['eventId']
+        else:
+            app_logger.error('Trip document does not exist for: %s', trip_ref)
+            raise HttpError
+    else:
+        app_logger.error('Property document does not exist for: %s', property_ref)
+        raise HttpError
+
+
 def delete_event_from_trip(property_ref, trip_ref):
     """
     Delete an event from the Google Calendar associated with the property
     """
     with logfire.span('delete_event_from_trip'):
         app_logger.info('Deleting event from trip: %s , property: %s', trip_ref, property_ref)
-        # Fetch the specific property document
-        collection_id, document_id = property_ref.split('/')
-        property_doc = db.collection(collection_id).document(document_id).get()
+        calendar_id, event_id = trip_event_to_delete(property_ref, trip_ref)
 
-        if property_doc.exists:
-            app_logger.info('Property document exists for trip: %s', property_ref)
-            property_data = property_doc.to_dict()
-            calendar_id = property_data['externalCalendar']
+        # Call the Google Calendar API to delete the event
+        service = get_calendar_service()
+        service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
 
-            # Fetch the specific trip document
-            collection_id, document_id = trip_ref.split('/')
-            trip_doc = db.collection(collection_id).document(document_id).get()
-            if trip_doc.exists:
-                trip_data = trip_doc.to_dict()
 
-                # Call the Google Calendar API to delete the event
-                service = build('calendar', 'v3', credentials=creds)
-                service.events().delete(calendarId=calendar_id, eventId=trip_data['eventId']).execute()
-            else:
-                app_logger.error('Trip document does not exist for: %s', trip_ref)
-                raise HttpError
-        else:
-            app_logger.error('Property document does not exist for: %s', property_ref)
-            raise HttpError
+async def delete_event_from_trip_async(property_ref, trip_ref):
+    """
+    Like delete_event_from_trip, reading Firestore on the threadpool and awaiting the async Calendar client
+    """
+    with logfire.span('delete_event_from_trip'):
+        app_logger.info('Deleting event from trip: %s , property: %s', trip_ref, property_ref)
+        calendar_id, event_id = await run_in_threadpool(trip_event_to_delete, property_ref, trip_ref)
+        await async_calendar_client.events_delete(calendar_id, event_id)
 
 
 def delete_trip_from_event(property_ref, event_id):
@@ -479,19 +1376,23 @@ def delete_trip_from_event(property_ref, event_id):
     with logfire.span('delete_trip_from_event'):
         app_logger.info('Deleting trip associated with event: %s , property: %s', event_id, property_ref)
         # Fetch the specific property document
-        collection_id, document_id = property_ref.split('/')
-        property_doc = db.collection(collection_id).document(document_id).get()
+        property_doc = property_cache.get(property_ref)
 
         if property_doc.exists:
             app_logger.info('Property document exists for event: %s', property_ref)
 
             # Fetch the specific trip document associated with the event id
-            trip_ref = db.collection('trips').where(filter=FieldFilter('eventId', '==', event_id)).get()
-
-            if trip_ref:
-                # Delete the trip document from Firestore
-                trip_ref[0].reference.delete()
-                app_logger.info('Trip document successfully deleted: %s', trip_ref[0].id)
+            trips = find_trips_by_event_ids([event_id])[event_id]
+
+            if trips:
+                # Delete the trip document and its event index entry from Firestore
+                batch = db.batch()
+                batch.delete(trips[0].reference)
+                batch.delete(event_index_ref(event_id))
+                batch.commit()
+                booking_index.remove(trips[0].id)
+                availability_index.remove(trips[0].id)
+                app_logger.info('Trip document successfully deleted: %s', trips[0].id)
             else:
                 app_logger.error('Trip document does not exist for event: %s', event_id)
                 raise HttpError
@@ -6,14 +6,18 @@ from googleapiclient.errors import HttpError
 
 from app.auth.views import get_token
 from app.cal._utils import app_logger
+from app.cal.availability import availability_index
+from app.cal.conflicts import trip_seconds
 from app.cal.tasks import (
     create_or_update_event_from_trip,
+    create_or_update_events_from_trips,
     delete_calendar_watch_channel,
-    delete_event_from_trip,
+    delete_event_from_trip_async,
     initialize_trips_from_cal,
 )
+from app.cal.workers import sync_scheduler
 from app.firebase_setup import db
-from app.models import EventFromTrip, PropertyCal, PropertyRef
+from app.models import AvailabilityRequest, EventFromTrip, EventFromTripBatch, PropertyCal, PropertyRef
 from app.utils import settings
 
 cal_router = APIRouter()
@@ -23,8 +27,16 @@ cal_router = APIRouter()
 @cal_router.post('/set_google_calendar_id')
 def set_google_calendar_id(data: PropertyCal, token: str = Depends(get_token)):
     app_logger.info('Setting Google Calendar ID for property: %s', data.property_ref)
+    property_id = data.property_ref.split('/')[-1]
+
+    def initialize():
+        # Queued at manual priority, behind webhook syncs but ahead of any bulk resync
+        sync_scheduler.run(
+            property_id, lambda: initialize_trips_from_cal(data.property_ref, data.cal_id), priority='manual'
+        )
+
     try:
-        initialize_trips_from_cal(data.property_ref, data.cal_id)
+        initialize()
         app_logger.info('Google Calendar ID successfully set.')
         return {'propertyRef': data.property_ref, 'message': 'Google Calendar ID successfully set'}
     except HttpError as e:
@@ -36,7 +48,7 @@ def set_google_calendar_id(data: PropertyCal, token: str = Depends(get_token)):
                 delete_calendar_watch_channel(data.property_ref, settings.g_calendar_resource_id)
                 app_logger.info('Channel successfully deleted.')
                 app_logger.info('Retrying to set Google Calendar ID...')
-                initialize_trips_from_cal(data.property_ref, data.cal_id)
+                initialize()
                 app_logger.info('Google Calendar ID successfully set.')
         raise HTTPException(status_code=400, detail=error_message)
 
@@ -56,13 +68,60 @@ def process_create_or_update_event_from_trip(data: EventFromTrip, token: str = D
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@cal_router.post('/event_from_trip/batch')
+def process_create_or_update_events_from_trips(data: EventFromTripBatch, token: str = Depends(get_token)):
+    if len(data.items) > settings.cal_event_batch_max_items:
+        raise HTTPException(
+            status_code=400, detail=f'At most {settings.cal_event_batch_max_items} trips can be sent in one request'
+        )
+    if len({item.trip_ref for item in data.items}) < len(data.items):
+        raise HTTPException(status_code=400, detail='Each trip can only be sent once per request')
+    app_logger.info('Creating or updating events for %s trips', len(data.items))
+    results = create_or_update_events_from_trips(data.items)
+    return {
+        'results': results,
+        'created': sum(result.get('status') == 'created' for result in results),
+        'updated': sum(result.get('status') == 'updated' for result in results),
+        'failed': sum(result.get('status') == 'error' for result in results),
+    }
+
+
+@cal_router.post('/availability')
+def process_availability(data: AvailabilityRequest, token: str = Depends(get_token)):
+    """
+    Answer whether each property is free over each range, with its busy periods to the nearest 15 minutes.
+
+    Answered from memory, so only upcoming trips are known; times without a timezone are taken as UTC.
+    """
+    if len(data.ranges) > settings.cal_availability_max_ranges:
+        raise HTTPException(
+            status_code=400, detail=f'At most {settings.cal_availability_max_ranges} ranges can be sent in one request'
+        )
+    results = []
+    for item in data.ranges:
+        # Compare as UTC timestamps, since one bound may carry a timezone and the other not
+        if trip_seconds(item.end) <= trip_seconds(item.start):
+            raise HTTPException(status_code=400, detail='Range end must be after its start')
+        busy = availability_index.busy(item.property_ref, item.start, item.end)
+        results.append(
+            {
+                'propertyRef': item.property_ref,
+                'start': item.start,
+                'end': item.end,
+                'free': not busy,
+                'busy': [{'start': start, 'end': end} for start, end in busy],
+            }
+        )
+    return {'results': results}
+
+
 # Delete Event from Trip
 @cal_router.post('/delete_event_from_trip')
-def process_delete_event_from_trip(data: EventFromTrip, token: str = Depends(get_token)):
+async def process_delete_event_from_trip(data: EventFromTrip, token: str = Depends(get_token)):
     app_logger.info('Process deleting event for trip: %s, with property_ref: %s', data.trip_ref, data.property_ref)
     # Call the create_or_update_event_from_trip function
     try:
-        delete_event_from_trip(data.property_ref, data.trip_ref)
+        await delete_event_from_trip_async(data.property_ref, data.trip_ref)
         return {'tripRef': data.trip_ref, 'propertyRef': data.property_ref, 'message': 'Event successfully deleted'}
     except Exception as e:
         app_logger.error('Error deleting event from trip: %s', e)
@@ -92,7 +151,12 @@ def process_resync_property_calendar_events(data: PropertyRef, token: str = Depe
             property_ref = 'properties/' + data.property_ref
             property_cal = PropertyCal(property_ref=property_ref, cal_id=external_calendar)
 
-            initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
+            # Queued at manual priority, behind webhook syncs but ahead of any bulk resync
+            sync_scheduler.run(
+                data.property_ref,
+                lambda: initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id),
+                priority='manual',
+            )
             app_logger.info('Google Calendar ID successfully set.')
 
         except HttpError as e:
@@ -101,7 +165,11 @@ def process_resync_property_calendar_events(data: PropertyRef, token: str = Depe
             if 'not unique' in error_message:
                 with logfire.span('Channel id not unique'):
                     delete_calendar_watch_channel(property_cal.property_ref, settings.g_calendar_resource_id)
-                    initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id)
+                    sync_scheduler.run(
+                        data.property_ref,
+                        lambda: initialize_trips_from_cal(property_cal.property_ref, property_cal.cal_id),
+                        priority='manual',
+                    )
             else:
                 raise HTTPException(status_code=400, detail=error_message)
 
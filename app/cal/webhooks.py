@@ -1,19 +1,42 @@
 import logfire
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from googleapiclient.errors import HttpError
 
 from app.auth.views import get_token
 from app.cal._utils import app_logger
+from app.cal.async_client import async_calendar_client
+from app.cal.availability import availability_index
+from app.cal.client import calendar_clients, google_api_limiter
+from app.cal.conflicts import booking_index
+from app.cal.debounce import SyncCoalescer
+from app.cal.dedupe import build_message_store
 from app.cal.tasks import (
-    delete_calendar_watch_channel,
+    TripWrites,
+    delete_calendar_watch_channel_async,
     sync_calendar_events,
+    sync_flights,
 )
+from app.cal.workers import sync_scheduler
+from app.firebase_setup import db
 from app.models import DeleteWebhookChannel
+from app.property_cache import property_cache
+from app.user_cache import user_cache
+from app.utils import settings
 
 cal_webhook_router = APIRouter()
 
-# Dictionary for processed message numbers
-processed_message_numbers = {}
+# Processed (channel id, message number) pairs; message numbers restart for every channel
+processed_messages = build_message_store(
+    settings.cal_webhook_dedupe_backend,
+    db,
+    max_size=settings.cal_webhook_dedupe_max_size,
+    ttl=settings.cal_webhook_dedupe_ttl_seconds,
+)
+
+# Collapses bursts of pushes for the same property into a single sync, run off the request path at webhook
+# priority so the webhook can be acknowledged straight away
+sync_coalescer = SyncCoalescer(window=settings.cal_webhook_debounce_seconds, scheduler=sync_scheduler)
 
 
 @cal_webhook_router.post('/cal_webhook')
@@ -25,24 +48,24 @@ async def receive_webhook(request: Request, calendar_id: str):
         headers = request.headers
 
         # Extract the data from the headers
+        channel_id = headers.get('X-Goog-Channel-ID')
         message_number = headers.get('X-Goog-Message-Number')
 
-        # Check if the message number is in the dictionary
-        if message_number in processed_message_numbers:
-            processed_message_numbers[message_number] += 1
-            app_logger.info(
-                'Webhook message: %s received %s times', message_number, processed_message_numbers[message_number]
-            )
+        # Check if this channel's message has already been processed, off the event loop as it may read Firestore
+        if (
+            channel_id
+            and message_number
+            and await run_in_threadpool(processed_messages.seen, (channel_id, message_number))
+        ):
+            app_logger.info('Webhook message: %s on channel: %s already processed', message_number, channel_id)
             return
 
         # Extract the data from the headers
-        channel_id = headers.get('X-Goog-Channel-ID')
         channel_token = headers.get('X-Goog-Channel-Token')
         channel_expiration = headers.get('X-Goog-Channel-Expiration')
         resource_id = headers.get('X-Goog-Resource-ID')
         resource_uri = headers.get('X-Goog-Resource-URI')
         resource_state = headers.get('X-Goog-Resource-State')
-        message_number = headers.get('X-Goog-Message-Number')
 
         # Log the extracted data
         app_logger.info('Received channel_id: %s', channel_id)
@@ -54,31 +77,44 @@ async def receive_webhook(request: Request, calendar_id: str):
         app_logger.info('Received message_number: %s', message_number)
 
         if resource_id:
-            try:
-                if '-' in calendar_id:
-                    property_ref = calendar_id.split('-')[0]
-                else:
-                    property_ref = calendar_id
-
-                sync_calendar_events(property_ref)
-            except HttpError as e:
-                app_logger.error('Error syncing calendar: %s', e)
-                raise HTTPException(status_code=400, detail=str(e))
+            if '-' in calendar_id:
+                property_ref = calendar_id.split('-')[0]
+            else:
+                property_ref = calendar_id
 
-        # Add the message number to the dictionary with a count of 1
-        processed_message_numbers[message_number] = 1
+            # Only queue the sync here; the sync scheduler runs it after the webhook has been acknowledged
+            if not sync_coalescer.submit(property_ref, lambda: sync_calendar_events(property_ref, wait=False)):
+                app_logger.info('Coalesced webhook for property: %s into pending sync', property_ref)
 
 
 @cal_webhook_router.post('/delete_webhook_channel')
-def delete_webhook_channel(data: DeleteWebhookChannel, token: str = Depends(get_token)):
+async def delete_webhook_channel(data: DeleteWebhookChannel, token: str = Depends(get_token)):
     with logfire.span('delete_webhook_channel'):
         app_logger.info('Deleting webhook channel...')
         try:
             app_logger.info('Deleting channel: %s', data.id)
             # Delete the channel
-            delete_calendar_watch_channel(data.id, data.resourceId)
+            await delete_calendar_watch_channel_async(data.id, data.resourceId)
             app_logger.info('Webhook channel successfully deleted.')
             return {'message': 'Webhook channel successfully deleted'}
         except HttpError as e:
             app_logger.error('Error deleting webhook channel: %s', e)
             raise HTTPException(status_code=400, detail=str(e))
+
+
+@cal_webhook_router.get('/cal_webhook_stats')
+def cal_webhook_stats(token: str = Depends(get_token)):
+    return {
+        'coalescer': sync_coalescer.stats(),
+        'scheduler': sync_scheduler.stats(),
+        'dedupe': processed_messages.stats(),
+        'single_flight': sync_flights.stats(),
+        'google_api': google_api_limiter.stats(),
+        'calendar_clients': calendar_clients.stats(),
+        'async_calendar_client': async_calendar_client.stats(),
+        'property_cache': property_cache.stats(),
+        'user_cache': user_cache.stats(),
+        'trip_writes': TripWrites.stats(),
+        'booking_index': booking_index.stats(),
+        'availability': availability_index.stats(),
+    }
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from app.cal._utils import app_logger
+from app.utils import settings
+
+# Sync priority classes, highest first
+SYNC_PRIORITIES = ('webhook', 'manual', 'bulk')
+
+
+class SyncScheduler:
+    """
+    Runs sync jobs on a fixed number of worker threads, webhook syncs first, then manual ones, then bulk work.
+
+    Each priority class has its own concurrency limit, so bulk resyncs can never take every worker away from a
+    host's webhook syncs. A waiting job moves up one class for every `aging_seconds` it has waited, so a steady
+    stream of webhooks cannot starve bulk work either. At most `max_queue` jobs of each class wait at a time, so a
+    full bulk queue never turns webhooks away; submit() either returns None or, with `block=True`, waits for room in
+    its class. Workers are started on the first submit.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        limits: dict[str, int] | None = None,
+        aging_seconds: float = 60.0,
+        name: str = 'sync-worker',
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.limits = {priority: (limits or {}).get(priority, workers) for priority in SYNC_PRIORITIES}
+        self.aging_seconds = aging_seconds
+        self.name = name
+        self._queues: dict[str, deque] = {priority: deque() for priority in SYNC_PRIORITIES}
+        self._running = dict.fromkeys(SYNC_PRIORITIES, 0)
+        self._lock = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._max_depth = 0
+        self._stats = {
+            priority: {
+                'submitted': 0,
+                'rejected': 0,
+                'completed': 0,
+                'failed': 0,
+                'wait_seconds': 0.0,
+                'max_wait_seconds': 0.0,
+                'processing_seconds': 0.0,
+                'max_processing_seconds': 0.0,
+            }
+            for priority in SYNC_PRIORITIES
+        }
+
+    def _depth(self) -> int:
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def _ensure_started(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'{self.name}-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, key: str, fn: Callable[[], Any], priority: str = 'webhook', block: bool = False) -> Future | None:
+        """
+        Queue `fn` in a priority class, returning a future for its result or None if that class's queue is full.
+        """
+        self._ensure_started()
+        with self._lock:
+            jobs = self._queues[priority]
+            if len(jobs) >= self.max_queue:
+                if not block:
+                    self._stats[priority]['rejected'] += 1
+                    app_logger.error('Sync queue is full, rejected %s job for %s', priority, key)
+                    return None
+                self._lock.wait_for(lambda: len(jobs) < self.max_queue)
+            future = Future()
+            jobs.append((key, fn, time.monotonic(), future))
+            self._stats[priority]['submitted'] += 1
+            self._max_depth = max(self._max_depth, self._depth())
+            self._lock.notify_all()
+        return future
+
+    def run(self, key: str, fn: Callable[[], Any], priority: str = 'manual') -> Any:
+        """
+        Queue `fn` and wait for its result, raising a 503 if the queue is full.
+        """
+        future = self.submit(key, fn, priority)
+        if future is None:
+            raise HTTPException(status_code=503, detail='Sync queue is full, try again later')
+        return future.result()
+
+    def _next_priority(self) -> str | None:
+        now = time.monotonic()
+        best, best_score = None, None
+        for rank, priority in enumerate(SYNC_PRIORITIES):
+            jobs = self._queues[priority]
+            if not jobs or self._running[priority] >= self.limits[priority]:
+                continue
+            # Jobs within a class run in order, so only the oldest one can be the best
+            score = rank - (now - jobs[0][2]) / self.aging_seconds
+            if best_score is None or score < best_score:
+                best, best_score = priority, score
+        return best
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._next_priority() is not None)
+                priority = self._next_priority()
+                key, fn, enqueued_at, future = self._queues[priority].popleft()
+                self._running[priority] += 1
+                started_at = time.monotonic()
+                stats = self._stats[priority]
+                stats['wait_seconds'] += started_at - enqueued_at
+                stats['max_wait_seconds'] = max(stats['max_wait_seconds'], started_at - enqueued_at)
+                self._lock.notify_all()
+
+            failed = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn())
+                except Exception as e:
+                    failed = True
+                    app_logger.error('%s sync job failed for %s: %s', priority.capitalize(), key, e)
+                    future.set_exception(e)
+
+            elapsed = time.monotonic() - started_at
+            with self._lock:
+                self._running[priority] -= 1
+                stats['completed'] += 1
+                stats['failed'] += failed
+                stats['processing_seconds'] += elapsed
+                stats['max_processing_seconds'] = max(stats['max_processing_seconds'], elapsed)
+                self._lock.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """
+        Block until no job is queued or running.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._depth() and not any(self._running.values()), timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            classes = {
+                priority: dict(
+                    self._stats[priority],
+                    depth=len(self._queues[priority]),
+                    running=self._running[priority],
+                    limit=self.limits[priority],
+                )
+                for priority in SYNC_PRIORITIES
+            }
+            stats = {
+                'depth': self._depth(),
+                'max_depth': self._max_depth,
+                'active': sum(self._running.values()),
+                'workers': len(self._threads),
+            }
+        for class_stats in classes.values():
+            completed = class_stats['completed']
+            class_stats['avg_wait_seconds'] = class_stats['wait_seconds'] / completed if completed else 0.0
+            class_stats['avg_processing_seconds'] = class_stats['processing_seconds'] / completed if completed else 0.0
+        for field in ('submitted', 'rejected', 'completed', 'failed'):
+            stats[field] = sum(class_stats[field] for class_stats in classes.values())
+        stats['classes'] = classes
+        return stats
+
+
+sync_scheduler = SyncScheduler(
+    workers=settings.cal_sync_workers,
+    max_queue=settings.cal_sync_queue_size,
+    limits={
+        'webhook': settings.cal_sync_webhook_concurrency,
+        'manual': settings.cal_sync_manual_concurrency,
+        'bulk': settings.cal_sync_bulk_concurrency,
+    },
+    aging_seconds=settings.cal_sync_aging_seconds,
+)
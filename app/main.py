@@ -12,10 +12,12 @@ from app.auto.payout_task import process_platform_payout
 from app.auto.tasks import auto_complete_and_notify
 from app.auto.transaction_tasks import process_transactions
 from app.auto.version_tasks import auto_update_cloud_version
+from app.cal.async_client import async_calendar_client
 from app.cal.views import cal_router
 from app.cal.webhooks import cal_webhook_router
 from app.logging import config
 from app.pay.views import stripe_router
+from app.property_cache import property_cache
 from app.utils import app_logger, settings
 
 
@@ -23,6 +25,8 @@ from app.utils import app_logger, settings
 async def lifespan(app: FastAPI):
     app_logger.info('startup')
 
+    property_cache.start()
+
     auto_complete_and_notify()
     auto_check_and_renew_channels(force_renew=False)
     process_transactions()
@@ -41,6 +45,9 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    property_cache.stop()
+    await async_calendar_client.aclose()
+
 
 app = FastAPI(lifespan=lifespan)
 
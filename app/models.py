@@ -1,8 +1,9 @@
 from datetime import datetime
 from enum import Enum
-from typing import Any, List, Optional, Union
+from typing import Annotated, Any, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Discriminator, Field, Tag
+from pydantic.dataclasses import dataclass
 
 
 class Name(BaseModel):
@@ -65,6 +66,7 @@ class TripData(BaseModel):
     tripEndDateTime: datetime
     eventId: str
     eventSummary: str
+    eventHash: Optional[str] = None
 
 
 class EventFromTrip(BaseModel):
@@ -72,6 +74,20 @@ class EventFromTrip(BaseModel):
     property_ref: str
 
 
+class EventFromTripBatch(BaseModel):
+    items: list[EventFromTrip]
+
+
+class AvailabilityRange(BaseModel):
+    property_ref: str
+    start: datetime
+    end: datetime
+
+
+class AvailabilityRequest(BaseModel):
+    ranges: list[AvailabilityRange]
+
+
 class PropertyRef(BaseModel):
     property_ref: str
 
@@ -85,55 +101,46 @@ class UnauthorizedMessage(BaseModel):
     detail: str = 'Bearer token missing or unknown'
 
 
-class Creator(BaseModel):
-    email: str
-
-
-class Organizer(BaseModel):
-    email: str
-    displayName: str
-    self: bool
-
-
-class DateTime(BaseModel):
+# Calendar sync only asks Google for the fields below (SYNC_EVENT_FIELDS in app/cal/tasks.py), so events are
+# parsed into slotted dataclasses holding just those fields rather than full models of the event resource.
+@dataclass(slots=True)
+class DateTime:
     dateTime: str
-    timeZone: str
+    timeZone: Optional[str] = None
 
 
-class Date(BaseModel):
+@dataclass(slots=True)
+class Date:
     date: str
 
 
-class Reminders(BaseModel):
-    useDefault: bool
-
-
-class GCalEvent(BaseModel):
-    kind: str
-    etag: str
+@dataclass(slots=True)
+class GCalEvent:
     id: str
     status: str
-    htmlLink: str
-    created: str
-    updated: str
-    summary: Optional[str]
-    creator: Creator
-    organizer: Organizer
     start: Union[DateTime, Date]
     end: Union[DateTime, Date]
-    iCalUID: str
-    sequence: int
-    reminders: Reminders
-    eventType: str
+    summary: Optional[str] = None
 
 
-class CancelledGCalEvent(BaseModel):
-    kind: str
-    etag: str
+@dataclass(slots=True)
+class CancelledGCalEvent:
     id: str
     status: str
 
 
+def _sync_event_kind(event: Any) -> str:
+    status = event.get('status') if isinstance(event, dict) else getattr(event, 'status', None)
+    return 'cancelled' if status == 'cancelled' else 'event'
+
+
+# An item of an events().list page, picking the model from the event status
+SyncEvent = Annotated[
+    Union[Annotated[GCalEvent, Tag('event')], Annotated[CancelledGCalEvent, Tag('cancelled')]],
+    Discriminator(_sync_event_kind),
+]
+
+
 class ActorRole(str, Enum):
     platform = 'platform'
     client = 'client'
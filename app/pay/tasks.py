@@ -7,6 +7,7 @@ from google.cloud.firestore_v1 import FieldFilter
 from app.firebase_setup import current_time, db
 from app.models import ActorRole, Status, Transaction, TransactionType
 from app.pay._utils import app_logger
+from app.property_cache import property_cache
 from app.utils import settings
 
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
@@ -371,7 +372,7 @@ def process_cancel_refund(trip_ref, full_refund=False, actor_ref=None):
         return {'status': 404, 'message': 'Trip document not found.'}
 
     property_ref = trip.get('propertyRef')
-    property = get_document_from_ref(f'properties/{property_ref.id}')
+    property = property_cache.get(property_ref)
 
     if not property.exists:
         app_logger.error('Property document not found.')
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Any
+
+from app.firebase_setup import db
+from app.utils import app_logger, settings
+
+
+def _property_id(property_ref: Any) -> str:
+    return property_ref.id if hasattr(property_ref, 'id') else str(property_ref).split('/')[-1]
+
+
+class PropertyCache:
+    """
+    Process-wide cache of property documents, handing out the same snapshots a Firestore read would.
+
+    start() subscribes to the collection with on_snapshot, whose first callback loads every property and whose
+    later callbacks keep them current. While no listener is active, for instance if it could not be started or
+    has failed, entries are re-read once they are older than `ttl` seconds.
+    """
+
+    def __init__(self, db, ttl: float, collection: str = 'properties'):
+        self._db = db
+        self.ttl = ttl
+        self.collection = collection
+        self._entries: dict[str, tuple[Any, float]] = {}
+        self._watch = None
+        self._synced = False
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'listener_updates': 0}
+
+    def start(self):
+        """
+        Subscribe to the collection, falling back to TTL expiry if the listener cannot be started.
+        """
+        try:
+            self._watch = self._db.collection(self.collection).on_snapshot(self._on_snapshot)
+            app_logger.info('Listening for changes to %s', self.collection)
+        except Exception as e:
+            app_logger.error('Could not listen for changes to %s, using a %ss TTL: %s', self.collection, self.ttl, e)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._synced = False
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        now = time.monotonic()
+        with self._lock:
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self._entries.pop(change.document.id, None)
+                else:
+                    self._entries[change.document.id] = (change.document, now)
+            self._stats['listener_updates'] += len(changes)
+            self._synced = True
+
+    @property
+    def listening(self) -> bool:
+        return self._synced and self._watch is not None and self._watch.is_active
+
+    def get(self, property_ref: Any) -> Any:
+        """
+        Get the snapshot of a property from its reference, its path or its id.
+        """
+        property_id = _property_id(property_ref)
+        listening = self.listening
+        with self._lock:
+            entry = self._entries.get(property_id)
+            if entry is not None and (listening or time.monotonic() - entry[1] < self.ttl):
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        snapshot = self._db.collection(self.collection).document(property_id).get()
+        if snapshot.exists:
+            with self._lock:
+                self._entries[property_id] = (snapshot, time.monotonic())
+        return snapshot
+
+    def invalidate(self, property_ref: Any):
+        """
+        Drop a property after this process has written to it, so the next get() reads the new version.
+        """
+        with self._lock:
+            self._entries.pop(_property_id(property_ref), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        stats['listening'] = self.listening
+        return stats
+
+
+property_cache = PropertyCache(db, ttl=settings.property_cache_ttl_seconds)
@@ -28,6 +28,57 @@ class Settings(BaseSettings):
     g_client_x509_cert_url: str = 'https://www.googleapis.com/robot/v1/metadata/x509/firebase-adminsdk-2xapk%40teamworks-3b262.iam.gserviceaccount.com'
 
     g_calendar_resource_id: str = 'zaI1vco_ZDFf7n_oBTclPGvx6Zk'
+    g_calendar_http_timeout: int = 30
+    # Shared Calendar API quota, with each calendar limited to a share of it
+    g_calendar_rate_per_second: float = 10.0
+    g_calendar_burst: int = 20
+    g_calendar_per_calendar_share: float = 0.25
+    g_calendar_max_retries: int = 5
+    g_calendar_backoff_base_seconds: float = 1.0
+    g_calendar_backoff_max_seconds: float = 32.0
+
+    # Channel renewals started per second, and how many may start at once after a pause
+    cal_renew_rate_per_second: float = 2.0
+    cal_renew_burst: int = 8
+
+    # Calendar sync
+    cal_sync_lease_seconds: int = 600
+    # Interrupted syncs resume from their checkpoint only if it was written within this many seconds
+    cal_sync_checkpoint_ttl_seconds: int = 60 * 60
+    # Also query trips by eventId when the event index has no entry; turn off once the index is backfilled
+    cal_event_index_fallback: bool = True
+    # Most trips /event_from_trip/batch accepts in one request
+    cal_event_batch_max_items: int = 200
+
+    # Upcoming trips are kept in memory per property to find double bookings, and reloaded after this TTL
+    cal_booking_index_ttl_seconds: int = 300
+    # Busy slots of upcoming trips are kept in memory per property for /availability, and reloaded after this TTL
+    cal_availability_ttl_seconds: int = 300
+    # Most property and date ranges /availability answers in one request
+    cal_availability_max_ranges: int = 500
+
+    # Property documents are cached in memory and kept fresh by a Firestore listener, or re-read after this TTL
+    property_cache_ttl_seconds: int = 300
+
+    # User profiles are cached in memory for this long, up to this many at a time
+    user_cache_ttl_seconds: int = 300
+    user_cache_max_size: int = 5_000
+
+    # Calendar webhooks
+    cal_webhook_debounce_seconds: float = 2.0
+    # Worker threads that run webhook, manual and bulk syncs, and how many syncs of each class may wait for one
+    cal_sync_workers: int = 8
+    cal_sync_queue_size: int = 1_000
+    # Most workers each priority class may hold at once; bulk stays below cal_sync_workers to leave room for webhooks
+    cal_sync_webhook_concurrency: int = 8
+    cal_sync_manual_concurrency: int = 4
+    cal_sync_bulk_concurrency: int = 4
+    # A waiting sync moves up one priority class for every this many seconds it has waited
+    cal_sync_aging_seconds: float = 30.0
+    # 'memory' keeps processed messages per worker, 'firestore' shares them between workers
+    cal_webhook_dedupe_backend: str = 'memory'
+    cal_webhook_dedupe_max_size: int = 10_000
+    cal_webhook_dedupe_ttl_seconds: int = 24 * 60 * 60
 
     # Firebase Remote Config
     host_fee: float = 0.15
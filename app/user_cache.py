@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable
+
+from app.firebase_setup import db
+from app.utils import app_logger, settings
+
+# The user fields jobs read; only these are kept in memory
+USER_PROFILE_FIELDS = ('display_name', 'email', 'phone_numbers', 'smsOptIn', 'stripeAccountID')
+
+
+def _user_id(user_ref: Any) -> str:
+    return user_ref.id if hasattr(user_ref, 'id') else str(user_ref).split('/')[-1]
+
+
+class UserProfileCache:
+    """
+    Bounded cache of the user profile fields that emails, SMS, calendar events and payouts need.
+
+    Profiles, including a None for users that do not exist, are kept for `ttl` seconds after they were read, and
+    the least recently used profile is evicted once `max_size` are held. Jobs that know which users they will
+    need can load them all with one get_all call through prefetch().
+    """
+
+    def __init__(self, db, max_size: int, ttl: float, collection: str = 'users'):
+        self._db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.collection = collection
+        self._entries: OrderedDict[str, tuple[dict | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'reads': 0, 'evicted': 0}
+        self._jobs: dict[str, dict] = {}
+
+    def _profile(self, snapshot) -> dict | None:
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        return {field: data.get(field) for field in USER_PROFILE_FIELDS}
+
+    def _store(self, user_id: str, profile: dict | None):
+        self._entries[user_id] = (profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evicted'] += 1
+
+    def _lookup(self, user_id: str) -> tuple[bool, dict | None]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False, None
+        if entry[1] <= time.monotonic():
+            del self._entries[user_id]
+            return False, None
+        self._entries.move_to_end(user_id)
+        return True, entry[0]
+
+    def get(self, user_ref: Any) -> dict | None:
+        """
+        Get a user's profile from their reference, path or id, or None if the user does not exist.
+        """
+        user_id = _user_id(user_ref)
+        with self._lock:
+            found, profile = self._lookup(user_id)
+            self._stats['hits' if found else 'misses'] += 1
+            if found:
+                return profile
+
+        profile = self._profile(self._db.collection(self.collection).document(user_id).get())
+        with self._lock:
+            self._stats['reads'] += 1
+            self._store(user_id, profile)
+        return profile
+
+    def prefetch(self, user_refs: Iterable[Any]):
+        """
+        Load every user that is not already cached with a single get_all call.
+        """
+        user_ids = {_user_id(user_ref) for user_ref in user_refs if user_ref}
+        with self._lock:
+            missing = [user_id for user_id in user_ids if not self._lookup(user_id)[0]]
+        if not missing:
+            return
+
+        users = self._db.collection(self.collection)
+        snapshots = list(self._db.get_all([users.document(user_id) for user_id in missing]))
+        with self._lock:
+            self._stats['reads'] += len(snapshots)
+            for snapshot in snapshots:
+                self._store(snapshot.id, self._profile(snapshot))
+
+    @contextmanager
+    def track(self, job: str):
+        """
+        Log, and keep for stats(), how many Firestore reads the cache saved during a job.
+        """
+        with self._lock:
+            start = dict(self._stats)
+        try:
+            yield
+        finally:
+            with self._lock:
+                hits = self._stats['hits'] - start['hits']
+                reads = self._stats['reads'] - start['reads']
+                self._jobs[job] = {'reads_saved': hits, 'reads': reads}
+            app_logger.info('User cache saved %s Firestore reads during %s (%s reads made)', hits, job, reads)
+
+    def invalidate(self, user_ref: Any):
+        with self._lock:
+            self._entries.pop(_user_id(user_ref), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), jobs={job: dict(s) for job, s in self._jobs.items()})
+        stats['reads_saved'] = stats['hits']
+        return stats
+
+
+user_cache = UserProfileCache(db, max_size=settings.user_cache_max_size, ttl=settings.user_cache_ttl_seconds)
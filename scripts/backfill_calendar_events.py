@@ -19,6 +19,7 @@ from googleapiclient.errors import HttpError
 
 # Add parent dir so we can import app modules
 sys.path.insert(0, '.')
+from app.cal.tasks import index_event_trip
 from app.firebase_setup import db
 from app.utils import settings
 
@@ -107,6 +108,7 @@ def backfill_all_properties():
             try:
                 event = service.events().insert(calendarId=calendar_id, body=event_body).execute()
                 trip.reference.update({'eventId': event['id']})
+                index_event_trip(event['id'], trip.reference)
                 print(f' -> created {event["id"]}')
                 total_created += 1
             except HttpError as e:
@@ -0,0 +1,61 @@
+"""
+One-off script to backfill the event index for trips whose document id is not their eventId.
+
+Trips created from calendar events use the event id as their document id and need no entry. Every other trip
+with an eventId, such as a Teamworks booking pushed to a calendar, gets an eventTrips/<eventId> entry pointing
+at it. Once this has run, set CAL_EVENT_INDEX_FALLBACK=false to stop querying trips by eventId.
+
+Usage:
+    cd /path/to/plutus
+    python scripts/backfill_event_index.py [--dry-run]
+"""
+
+import sys
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, '.')
+from app.cal.tasks import FIRESTORE_BATCH_LIMIT, index_event_trip
+from app.firebase_setup import db
+
+DRY_RUN = '--dry-run' in sys.argv
+
+
+def backfill_event_index():
+    scanned = indexed = 0
+    last = None
+
+    while True:
+        query = db.collection('trips').order_by(FieldPath.document_id()).limit(FIRESTORE_BATCH_LIMIT)
+        if last is not None:
+            query = query.start_after(last)
+        trips = list(query.stream())
+        if not trips:
+            break
+        last = trips[-1]
+        scanned += len(trips)
+
+        batch = db.batch()
+        page_indexed = 0
+        for trip in trips:
+            event_id = trip.to_dict().get('eventId')
+            if not event_id or event_id == trip.id:
+                continue
+            print(f'  {event_id} -> trips/{trip.id}')
+            if not DRY_RUN:
+                index_event_trip(event_id, trip.reference, batch)
+            page_indexed += 1
+        if page_indexed and not DRY_RUN:
+            batch.commit()
+        indexed += page_indexed
+
+    print('\n--- Summary ---')
+    print(f'Trips scanned: {scanned}')
+    print(f'Index entries written: {indexed}')
+    if DRY_RUN:
+        print('(DRY RUN — no actual changes made)')
+
+
+if __name__ == '__main__':
+    backfill_event_index()
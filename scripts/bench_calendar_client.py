@@ -0,0 +1,151 @@
+"""
+Benchmark concurrent Google Calendar calls through the threadpool and googleapiclient against the async client.
+
+Both paths list and insert events on a local fake Calendar server, run in its own process, that answers every
+request after `--latency` seconds, so the numbers show how many calls each path keeps in flight rather than Google's
+speed. The threadpool path gives each worker thread its own googleapiclient service, like CalendarClientProvider;
+the async path shares one AsyncCalendarClient. Both run with the same concurrency and a rate limit high enough
+never to apply.
+
+Usage:
+    cd /path/to/plutus
+    python scripts/bench_calendar_client.py [--requests 500] [--concurrency 8,32,128] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, '.')
+from app.cal.async_client import AsyncCalendarClient
+from app.cal.ratelimit import GoogleApiLimiter
+
+EVENT = {
+    'id': 'event',
+    'status': 'confirmed',
+    'summary': 'Office Booking for Guest | Teamworks',
+    'start': {'dateTime': '2030-01-01T09:00:00Z', 'timeZone': 'UTC'},
+    'end': {'dateTime': '2030-01-01T17:00:00Z', 'timeZone': 'UTC'},
+}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.05
+
+    def _reply(self, body: dict):
+        time.sleep(self.latency)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._reply({'items': [EVENT] * 10, 'nextSyncToken': 'sync'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(EVENT)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(latency: float, ports: multiprocessing.Queue):
+    FakeCalendarHandler.latency = latency
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCalendarHandler)
+    server.daemon_threads = True
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def start_server(latency: float) -> tuple[multiprocessing.Process, int]:
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(latency, ports), daemon=True)
+    process.start()
+    return process, ports.get(timeout=10)
+
+
+def unlimited() -> GoogleApiLimiter:
+    return GoogleApiLimiter(rate=1_000_000, burst=1_000_000)
+
+
+def bench_threadpool(base_url: str, requests: int, concurrency: int) -> float:
+    discovery_doc = json.loads(get_static_doc('calendar', 'v3'))
+    local = threading.local()
+
+    def service():
+        if getattr(local, 'service', None) is None:
+            local.service = build_from_document(
+                discovery_doc, http=httplib2.Http(timeout=30), client_options={'api_endpoint': base_url + '/'}
+            )
+        return local.service
+
+    def call(i: int):
+        events = service().events()
+        if i % 2:
+            return events.insert(calendarId='cal', body=EVENT).execute()
+        return events.list(calendarId='cal', showDeleted=True).execute()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(requests)))
+    return time.perf_counter() - start
+
+
+async def bench_async(base_url: str, requests: int, concurrency: int) -> float:
+    client = AsyncCalendarClient(
+        Credentials(token='bench'), base_url=base_url, max_connections=concurrency, limiter=unlimited()
+    )
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(i: int):
+        async with slots:
+            if i % 2:
+                return await client.events_insert('cal', EVENT)
+            return await client.events_list('cal', showDeleted=True)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(call(i) for i in range(requests)))
+    finally:
+        await client.aclose()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', default='8,32,128')
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, port = start_server(args.latency)
+    base_url = f'http://127.0.0.1:{port}/calendar/v3'
+
+    print(f'{args.requests} calls, {args.latency * 1000:.0f} ms server latency')
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        threadpool = bench_threadpool(base_url, args.requests, concurrency)
+        async_client = asyncio.run(bench_async(base_url, args.requests, concurrency))
+        print(f'  concurrency {concurrency}:')
+        print(f'    threadpool:   {threadpool:8.2f} s  ({args.requests / threadpool:8.0f} calls/s)')
+        print(f'    async client: {async_client:8.2f} s  ({args.requests / async_client:8.0f} calls/s)')
+        print(f'    speedup:      {threadpool / async_client:8.2f}x')
+
+    server.terminate()
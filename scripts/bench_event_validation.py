@@ -0,0 +1,103 @@
+"""
+Benchmark validating a page of Google Calendar events one at a time against validating the whole page at once.
+
+The per-event loop mirrors what sync_calendar_events did before validate_event_page: pick a model from the status,
+validate inside a try/except and log each event twice.
+
+Usage:
+    cd /path/to/plutus
+    python scripts/bench_event_validation.py [--events 2500] [--rounds 20]
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from pydantic import TypeAdapter, ValidationError
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, '.')
+from app.cal._utils import app_logger
+from app.cal.tasks import validate_event_page
+from app.models import CancelledGCalEvent, GCalEvent
+
+
+def synthetic_page(size: int) -> list[dict]:
+    events = []
+    for i in range(size):
+        if i % 10 == 0:
+            events.append({'id': f'event{i}', 'status': 'cancelled'})
+        elif i % 2:
+            events.append(
+                {
+                    'id': f'event{i}',
+                    'status': 'confirmed',
+                    'summary': 'Airbnb (Not available)',
+                    'start': {'date': '2030-01-01'},
+                    'end': {'date': '2030-01-03'},
+                }
+            )
+        else:
+            events.append(
+                {
+                    'id': f'event{i}',
+                    'status': 'confirmed',
+                    'summary': 'Office Booking for Guest | Teamworks',
+                    'start': {'dateTime': '2030-01-01T09:00:00Z', 'timeZone': 'UTC'},
+                    'end': {'dateTime': '2030-01-01T17:00:00Z', 'timeZone': 'UTC'},
+                }
+            )
+    return events
+
+
+gcal_event_adapter = TypeAdapter(GCalEvent)
+cancelled_gcal_event_adapter = TypeAdapter(CancelledGCalEvent)
+
+
+def validate_per_event(events: list[dict]) -> list:
+    validated_events = []
+    for event in events:
+        try:
+            if event['status'] == 'cancelled':
+                app_logger.info('Cancelled event: %s', event['id'])
+                validated_events.append(cancelled_gcal_event_adapter.validate_python(event))
+            else:
+                app_logger.info('Valid event: %s', event['id'])
+                validated_events.append(gcal_event_adapter.validate_python(event))
+        except ValidationError as ve:
+            app_logger.error('Event validation error: %s, Event: %s', ve, event)
+            continue
+    return validated_events
+
+
+def bench(fn, events: list[dict], rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(events)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=2500)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    # Log at INFO like production, but to a handler that discards the records
+    app_logger.handlers = [logging.NullHandler()]
+    app_logger.propagate = False
+    app_logger.setLevel(logging.INFO)
+
+    page = synthetic_page(args.events)
+    assert len(validate_per_event(page)) == len(validate_event_page(page)) == args.events
+
+    per_event = bench(validate_per_event, page, args.rounds)
+    whole_page = bench(validate_event_page, page, args.rounds)
+
+    print(f'{args.events} events, best of {args.rounds} rounds')
+    print(f'  per-event loop: {per_event * 1000:8.2f} ms  ({args.events / per_event:10.0f} events/s)')
+    print(f'  whole page:     {whole_page * 1000:8.2f} ms  ({args.events / whole_page:10.0f} events/s)')
+    print(f'  speedup:        {per_event / whole_page:8.2f}x')
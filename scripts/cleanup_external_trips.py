@@ -0,0 +1,54 @@
+"""
+One-off script to delete a property's future external trips, or only those duplicating another trip for the
+same calendar event.
+
+Deletes run a page at a time, one write batch per page. A run stopped by --max-pages prints the cursor to resume
+from; pass it back with --start-after.
+
+Usage:
+    cd /path/to/plutus
+    python scripts/cleanup_external_trips.py clear <property_id> [--max-pages N] [--start-after BEGIN,TRIP_ID]
+    python scripts/cleanup_external_trips.py duplicates <property_id> [--max-pages N] [--start-after BEGIN,TRIP_ID]
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+# Add parent dir so we can import app modules
+sys.path.insert(0, '.')
+from app.cal.tasks import clear_event_store, delete_duplicate_trips
+from app.firebase_setup import db
+
+
+def parse_cursor(value: str) -> dict:
+    begin, trip_id = value.split(',', 1)
+    return {'tripBeginDateTime': datetime.fromisoformat(begin), '__name__': trip_id}
+
+
+def cleanup_external_trips():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['clear', 'duplicates'])
+    parser.add_argument('property_id')
+    parser.add_argument('--max-pages', type=int)
+    parser.add_argument('--start-after', type=parse_cursor)
+    args = parser.parse_args()
+
+    cleanup = clear_event_store if args.mode == 'clear' else delete_duplicate_trips
+    result = cleanup(
+        db.collection('properties').document(args.property_id), start_after=args.start_after, max_pages=args.max_pages
+    )
+
+    print('\n--- Summary ---')
+    print(f'Trips scanned: {result["scanned"]}')
+    print(f'Trips deleted: {result["deleted"]}')
+    print(f'Pages: {result["pages"]} in {result["seconds"]}s')
+    if not result['complete']:
+        cursor = result['cursor']
+        print(
+            f'Stopped early, resume with: --start-after {cursor["tripBeginDateTime"].isoformat()},{cursor["__name__"]}'
+        )
+
+
+if __name__ == '__main__':
+    cleanup_external_trips()
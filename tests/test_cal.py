@@ -0,0 +1,1552 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+from unittest.mock import patch
+
+import httplib2
+import httpx
+from fastapi import HTTPException
+from google.api_core.exceptions import AlreadyExists
+from googleapiclient.errors import HttpError
+from mockfirestore.document import DocumentReference
+
+from app.auto.cal_tasks import auto_check_and_renew_channels, resync_all_calendar_events
+from app.cal.async_client import AsyncCalendarClient
+from app.cal.availability import AvailabilityIndex
+from app.cal.client import CalendarClientProvider, ThrottledHttpRequest, calendar_id_from_uri, creds
+from app.cal.conflicts import BookingIndex, IntervalTree
+from app.cal.debounce import SyncCoalescer
+from app.cal.dedupe import FirestoreMessageStore, MemoryMessageStore, MessageStore
+from app.cal.lease import SyncLease, SyncSingleFlight
+from app.cal.ratelimit import GoogleApiLimiter, TokenBucket, is_retryable, retry_after_seconds
+from app.cal.tasks import (
+    TripWrites,
+    _sync_calendar_events,
+    build_trip_event_body,
+    clear_event_store,
+    convert_event_to_trip_data,
+    create_events_for_future_trips,
+    create_or_update_events_from_trips,
+    delete_duplicate_trips,
+    delete_trip_from_event,
+    execute_calendar_batch,
+    find_trips_by_event_ids,
+    get_timezone,
+    index_event_trip,
+    process_events,
+    reconcile_calendar_events,
+    sync_checkpoint_ref,
+    trip_content_hash,
+    update_existing_trip,
+    validate_event_page,
+    write_trip_data,
+)
+from app.cal.views import process_availability, process_create_or_update_events_from_trips, set_google_calendar_id
+from app.cal.webhooks import cal_webhook_stats
+from app.cal.workers import SyncScheduler
+from app.firebase_setup import MOCK_DB
+from app.models import (
+    AvailabilityRequest,
+    CancelledGCalEvent,
+    Date,
+    EventFromTrip,
+    EventFromTripBatch,
+    GCalEvent,
+    PropertyCal,
+)
+from app.property_cache import PropertyCache
+from app.user_cache import UserProfileCache
+from app.utils import settings
+
+
+class CalendarClientProviderTest(TestCase):
+    def test_reuses_service_within_thread(self):
+        provider = CalendarClientProvider(creds)
+        service = provider.get()
+
+        self.assertIs(provider.get(), service)
+        stats = provider.stats()
+        self.assertEqual(stats['builds'], 1)
+        self.assertEqual(stats['fetches'], 2)
+
+    def test_separate_service_per_thread(self):
+        provider = CalendarClientProvider(creds)
+        services = []
+
+        thread = threading.Thread(target=lambda: services.append(provider.get()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(provider.get(), services[0])
+        self.assertEqual(provider.stats()['builds'], 2)
+
+    def test_stats_are_reported_with_the_webhook_stats(self):
+        self.assertEqual(
+            set(cal_webhook_stats(token='token')['calendar_clients']),
+            {'builds', 'build_seconds', 'fetches', 'fetch_seconds'},
+        )
+
+
+class ConvertEventToTripDataTest(TestCase):
+    def test_all_day_event_uses_passed_timezone(self):
+        event = GCalEvent(
+            id='all_day_event',
+            status='confirmed',
+            summary='Airbnb (Not available)',
+            start=Date(date='2030-01-01'),
+            end=Date(date='2030-01-03'),
+        )
+        # The property document is never read when the timezone is passed in
+        property_doc_ref = MOCK_DB.collection('properties').document('missing_property')
+
+        trip_data = convert_event_to_trip_data(event, property_doc_ref, get_timezone('America/New_York'))
+
+        self.assertEqual(trip_data.tripBeginDateTime.isoformat(), '2030-01-01T00:00:00-05:00')
+        self.assertEqual(trip_data.tripEndDateTime.isoformat(), '2030-01-03T00:00:00-05:00')
+        self.assertIs(get_timezone('America/New_York'), get_timezone('America/New_York'))
+
+
+class SyncCoalescerTest(TestCase):
+    def test_burst_collapses_into_one_sync(self):
+        coalescer = SyncCoalescer(window=0.05)
+        calls = []
+
+        for _ in range(5):
+            coalescer.submit('properties/a', lambda: calls.append('a'))
+        coalescer.submit('properties/b', lambda: calls.append('b'))
+
+        self.assertTrue(coalescer.wait_idle(timeout=2))
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(coalescer.stats(), {'received': 6, 'coalesced': 4, 'executed': 2, 'failed': 0, 'pending': 0})
+
+    def test_push_during_sync_schedules_one_follow_up(self):
+        coalescer = SyncCoalescer(window=0.01)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def sync():
+            calls.append(len(calls))
+            started.set()
+            release.wait(timeout=2)
+
+        coalescer.submit('properties/a', sync)
+        self.assertTrue(started.wait(timeout=2))
+        for _ in range(3):
+            coalescer.submit('properties/a', sync)
+        release.set()
+
+        self.assertTrue(coalescer.wait_idle(timeout=2))
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(coalescer.stats()['coalesced'], 2)
+
+
+class MemoryMessageStoreTest(TestCase):
+    def test_keys_include_channel(self):
+        store = MemoryMessageStore(max_size=10, ttl=60)
+
+        self.assertFalse(store.seen(('channel_a', '1')))
+        self.assertFalse(store.seen(('channel_b', '1')))
+        self.assertTrue(store.seen(('channel_a', '1')))
+
+        stats = store.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 2, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+    def test_evicts_least_recently_seen_when_full(self):
+        store = MemoryMessageStore(max_size=2, ttl=60)
+        store.seen(('channel', '1'))
+        store.seen(('channel', '2'))
+        store.seen(('channel', '1'))
+        store.seen(('channel', '3'))
+
+        self.assertTrue(store.seen(('channel', '1')))
+        self.assertFalse(store.seen(('channel', '2')))
+        self.assertEqual(store.stats()['evicted'], 2)
+
+    def test_expires_after_ttl(self):
+        store = MemoryMessageStore(max_size=10, ttl=0.01)
+        store.seen(('channel', '1'))
+        time.sleep(0.02)
+
+        self.assertFalse(store.seen(('channel', '1')))
+        self.assertEqual(store.stats()['expired'], 1)
+
+
+def create_document(reference: DocumentReference, data: dict):
+    # MockFirestore has no create-if-absent
+    if reference.get().exists:
+        raise AlreadyExists('Document already exists')
+    reference.set(data)
+
+
+class FirestoreMessageStoreTest(TestCase):
+    def test_records_once_and_replaces_expired_entries(self):
+        store = FirestoreMessageStore(MOCK_DB, ttl=60, collection='testWebhookMessages')
+        reference = MOCK_DB.collection('testWebhookMessages').document('channel_a:1')
+
+        with patch.object(DocumentReference, 'create', create_document, create=True):
+            self.assertFalse(store.seen(('channel_a', '1')))
+            self.assertTrue(store.seen(('channel_a', '1')))
+
+            reference.update({'expireAt': datetime.now(timezone.utc) - timedelta(seconds=1)})
+            self.assertFalse(store.seen(('channel_a', '1')))
+            self.assertTrue(store.seen(('channel_a', '1')))
+
+        self.assertGreater(reference.get().to_dict()['expireAt'], datetime.now(timezone.utc))
+        self.assertEqual((store.stats()['hits'], store.stats()['misses']), (2, 2))
+
+    def test_message_store_is_abstract(self):
+        with self.assertRaises(TypeError):
+            MessageStore()
+
+
+class TokenBucketTest(TestCase):
+    def test_burst_then_waits_for_refill(self):
+        bucket = TokenBucket(rate=100, capacity=2)
+
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.acquire(), 0)
+
+
+class ResyncAllCalendarEventsTest(TestCase):
+    def test_failed_properties_are_recorded_for_retry(self):
+        summary = resync_all_calendar_events(property_ids=['missing_property_a', 'missing_property_b'])
+
+        self.assertEqual(summary['total'], 2)
+        self.assertEqual(summary['failed'], 2)
+        self.assertEqual(sorted(summary['failedProperties']), ['missing_property_a', 'missing_property_b'])
+        recorded = [doc.to_dict() for doc in MOCK_DB.collection('calendarResyncs').stream()]
+        self.assertIn(sorted(summary['failedProperties']), [sorted(r['failedProperties']) for r in recorded])
+
+
+class AutoCheckAndRenewChannelsTest(TestCase):
+    def test_renewals_queued_behind_other_work_start_at_the_renewal_rate(self):
+        expiration = str(int((datetime.utcnow() + timedelta(hours=1)).timestamp() * 1000))
+        prop_ids = ['renew_property_0', 'renew_property_1', 'renew_property_2']
+        for prop_id in prop_ids:
+            MOCK_DB.collection('properties').document(prop_id).set(
+                {'channelExpiration': expiration, 'externalCalendar': f'{prop_id}@example.com'}
+            )
+        scheduler = SyncScheduler(workers=1, max_queue=10)
+        release, started = threading.Event(), {}
+        scheduler.submit('renew_blocker', lambda: release.wait(2), 'bulk')
+
+        def renew_property_channel(prop_id, external_calendar):
+            started[prop_id] = time.monotonic()
+
+        with (
+            patch('app.auto.cal_tasks.sync_scheduler', scheduler),
+            patch('app.auto.cal_tasks.renew_property_channel', renew_property_channel),
+            patch.object(settings, 'cal_renew_rate_per_second', 20.0),
+            patch.object(settings, 'cal_renew_burst', 1),
+        ):
+            renewals = threading.Thread(target=auto_check_and_renew_channels)
+            renewals.start()
+            # Hold the worker long enough to refill the bucket many times over
+            time.sleep(0.3)
+            release.set()
+            renewals.join(5)
+
+        starts = sorted(started[prop_id] for prop_id in prop_ids)
+        self.assertGreaterEqual(min(b - a for a, b in zip(starts, starts[1:])), 0.04)
+
+
+class BuildTripEventBodyTest(TestCase):
+    def test_booking_and_blocked_summaries(self):
+        trip_data = {
+            'tripBeginDateTime': datetime(2030, 1, 1, 9, tzinfo=timezone.utc),
+            'tripEndDateTime': datetime(2030, 1, 1, 17, tzinfo=timezone.utc),
+        }
+
+        body = build_trip_event_body('trip_a', trip_data, 'property_a', 'Suite 1', 'Ada')
+        blocked = build_trip_event_body('trip_a', dict(trip_data, isBlocked=True), 'property_a', 'Suite 1', 'Ada')
+
+        self.assertEqual(body['summary'], 'Office Booking for Ada | Teamworks')
+        self.assertIn('Trip Ref: trips/trip_a', body['description'])
+        self.assertEqual(body['start'], {'dateTime': '2030-01-01T09:00:00+00:00', 'timeZone': 'UTC'})
+        self.assertEqual(blocked['summary'], 'Blocked | Teamworks')
+
+
+class ValidateEventPageTest(TestCase):
+    def test_page_is_validated_and_invalid_events_dropped(self):
+        events = [
+            {'id': 'a', 'status': 'confirmed', 'start': {'date': '2030-01-01'}, 'end': {'date': '2030-01-02'}},
+            {'id': 'b', 'status': 'cancelled'},
+            {'id': 'c', 'status': 'confirmed', 'start': {'date': '2030-01-01'}},
+        ]
+
+        with self.assertLogs('plutus.cal', level='ERROR') as logs:
+            validated = validate_event_page(events)
+
+        self.assertEqual([type(event) for event in validated], [GCalEvent, CancelledGCalEvent])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("'c'", logs.output[0])
+
+
+class TripContentHashTest(TestCase):
+    def test_same_instant_hashes_equal_across_timezones(self):
+        new_york = get_timezone('America/New_York')
+        stored = {
+            'isExternal': True,
+            'tripBeginDateTime': datetime(2030, 1, 1, 5, tzinfo=timezone.utc),
+            'tripEndDateTime': datetime(2030, 1, 2, 5, tzinfo=timezone.utc),
+            'eventId': 'event_a',
+            'eventSummary': 'Reserved',
+            'tripCreated': datetime(2029, 1, 1, tzinfo=timezone.utc),
+        }
+        converted = dict(
+            stored,
+            tripBeginDateTime=new_york.localize(datetime(2030, 1, 1)),
+            tripEndDateTime=new_york.localize(datetime(2030, 1, 2)),
+            tripCreated=datetime.now(timezone.utc),
+        )
+
+        self.assertEqual(trip_content_hash(stored), trip_content_hash(converted))
+        self.assertNotEqual(trip_content_hash(stored), trip_content_hash(dict(stored, eventSummary='Blocked')))
+
+
+class SyncLeaseTest(TestCase):
+    def test_second_owner_queues_follow_up(self):
+        first = SyncLease(MOCK_DB, ttl=60, owner='first', collection='testSyncLeases')
+        second = SyncLease(MOCK_DB, ttl=60, owner='second', collection='testSyncLeases')
+
+        self.assertTrue(first.acquire('property_a'))
+        self.assertTrue(first.acquire('property_a'))
+        self.assertFalse(second.acquire('property_a'))
+        self.assertTrue(second.request_follow_up('property_a'))
+
+        self.assertTrue(first.release('property_a'))
+        self.assertFalse(first.release('property_a'))
+        self.assertTrue(second.acquire('property_a'))
+        self.assertFalse(second.release('property_a'))
+
+
+class SyncSingleFlightTest(TestCase):
+    def test_joiners_share_result_and_follow_up_runs_once(self):
+        flights = SyncSingleFlight(SyncLease(MOCK_DB, ttl=60, collection='testSyncLeases'))
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def sync():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                started.set()
+                release.wait(5)
+            return len(runs)
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.run('property_b', sync)))
+        leader.start()
+        started.wait(5)
+        joiner = threading.Thread(target=lambda: results.append(flights.run('property_b', sync)))
+        joiner.start()
+        for _ in range(3):
+            self.assertIsNone(flights.run('property_b', sync, wait=False))
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        joiner.join(5)
+
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(len(runs), 2)
+        stats = flights.stats()
+        self.assertEqual((stats['started'], stats['joined'], stats['follow_ups']), (1, 1, 3))
+        self.assertEqual(stats['running'], 0)
+
+    def test_local_follow_up_is_passed_on_to_remote_owner(self):
+        other = SyncLease(MOCK_DB, ttl=60, owner='other', collection='testSyncLeases')
+        self.assertTrue(other.acquire('property_c'))
+        requests = []
+
+        class Lease(SyncLease):
+            def request_follow_up(self, key):
+                requests.append(key)
+                queued = super().request_follow_up(key)
+                if len(requests) == 1:
+                    # Other process starts its follow-up run, then a local push comes in
+                    other.release(key)
+                    flights.run(key, lambda: None, wait=False)
+                return queued
+
+        flights = SyncSingleFlight(Lease(MOCK_DB, ttl=60, owner='local', collection='testSyncLeases'))
+        self.assertIsNone(flights.run('property_c', lambda: 'ran here'))
+
+        self.assertEqual(requests, ['property_c', 'property_c'])
+        self.assertEqual((flights.stats()['remote'], flights.stats()['running']), (2, 0))
+        self.assertTrue(other.release('property_c'))
+
+    def test_lost_lease_asks_new_owner_for_follow_up(self):
+        lease = SyncLease(MOCK_DB, ttl=0.15, owner='slow', collection='testSyncLeases')
+        flights = SyncSingleFlight(lease)
+        reference = MOCK_DB.collection('testSyncLeases').document('property_d')
+
+        def sync():
+            # The lease expires while this sync is stuck and another process takes it
+            reference.set({'owner': 'other', 'expiresAt': datetime.now(timezone.utc) + timedelta(seconds=60)})
+            time.sleep(0.3)
+            return 'done'
+
+        self.assertEqual(flights.run('property_d', sync), 'done')
+        self.assertEqual(flights.stats()['lost_leases'], 1)
+        self.assertEqual(reference.get().to_dict()['followUp'], True)
+
+
+def http_error(status: int, reason: str = '', retry_after: str = '') -> HttpError:
+    headers = {'status': status}
+    if retry_after:
+        headers['retry-after'] = retry_after
+    content = f'{{"error": {{"errors": [{{"reason": "{reason}"}}]}}}}'.encode()
+    return HttpError(httplib2.Response(headers), content)
+
+
+class GoogleApiLimiterTest(TestCase):
+    def test_classifies_errors(self):
+        self.assertTrue(is_retryable(http_error(429)))
+        self.assertTrue(is_retryable(http_error(403, 'rateLimitExceeded')))
+        self.assertTrue(is_retryable(http_error(503)))
+        self.assertFalse(is_retryable(http_error(403, 'forbidden')))
+        self.assertFalse(is_retryable(http_error(404)))
+        self.assertTrue(is_retryable(http_error(429), idempotent=False))
+        self.assertFalse(is_retryable(http_error(503), idempotent=False))
+        self.assertFalse(is_retryable(TimeoutError(), idempotent=False))
+        self.assertEqual(retry_after_seconds(http_error(429, retry_after='3')), 3)
+        self.assertEqual(retry_after_seconds(http_error(429)), 0)
+
+    def test_retries_throttled_calls_and_slows_down(self):
+        limiter = GoogleApiLimiter(rate=1000, burst=10, base_delay=0.001, max_delay=0.01)
+        errors = [http_error(429), http_error(403, 'userRateLimitExceeded')]
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+
+        self.assertEqual(limiter.call(call, calendar_id='a'), 'ok')
+        stats = limiter.stats()
+        self.assertEqual((stats['calls'], stats['throttled'], stats['retries'], stats['failures']), (1, 2, 2, 0))
+        self.assertLess(stats['current_rate'], 1000)
+
+    def test_does_not_retry_client_errors(self):
+        limiter = GoogleApiLimiter(rate=1000, burst=10, base_delay=0.001)
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise http_error(404)
+
+        with self.assertRaises(HttpError):
+            limiter.call(call)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(limiter.stats()['retries'], 0)
+
+    def test_busy_calendar_does_not_block_others(self):
+        limiter = GoogleApiLimiter(rate=100, burst=10, calendar_share=0.1)
+
+        self.assertEqual(limiter.acquire('busy'), 0)
+        self.assertGreater(limiter.acquire('busy'), 0)
+        self.assertEqual(limiter.acquire('quiet'), 0)
+
+    def test_calendar_id_from_uri(self):
+        uri = 'https://www.googleapis.com/calendar/v3/calendars/abc%40group.calendar.google.com/events?alt=json'
+        self.assertEqual(calendar_id_from_uri(uri), 'abc@group.calendar.google.com')
+        self.assertIsNone(calendar_id_from_uri('https://www.googleapis.com/calendar/v3/channels/stop'))
+
+    def test_service_requests_go_through_limiter(self):
+        service = CalendarClientProvider(creds).get()
+        self.assertIsInstance(service.events().list(calendarId='a'), ThrottledHttpRequest)
+
+
+class RefreshingCredentials:
+    def __init__(self):
+        self.token = None
+        self.refreshes = 0
+
+    @property
+    def valid(self):
+        return self.token is not None
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f'token-{self.refreshes}'
+
+
+class AsyncCalendarClientTest(TestCase):
+    def client(self, handler, credentials=None):
+        return AsyncCalendarClient(
+            credentials or RefreshingCredentials(),
+            base_url='https://calendar.test/calendar/v3',
+            limiter=GoogleApiLimiter(rate=1000, burst=10, base_delay=0.001, max_delay=0.01),
+            transport=httpx.MockTransport(handler),
+        )
+
+    def test_lists_every_page_with_a_refreshed_token(self):
+        requests = []
+
+        def handler(request: httpx.Request):
+            requests.append(request)
+            if 'pageToken' in request.url.params:
+                return httpx.Response(200, json={'items': [{'id': 'b'}], 'nextSyncToken': 'sync'})
+            return httpx.Response(200, json={'items': [{'id': 'a'}], 'nextPageToken': 'page2'})
+
+        credentials = RefreshingCredentials()
+        client = self.client(handler, credentials)
+
+        async def list_pages():
+            try:
+                return [page async for page in client.event_pages('cal@group.calendar.google.com', showDeleted=True)]
+            finally:
+                await client.aclose()
+
+        pages = asyncio.run(list_pages())
+        self.assertEqual([item['id'] for page in pages for item in page['items']], ['a', 'b'])
+        self.assertEqual(pages[-1]['nextSyncToken'], 'sync')
+        self.assertEqual(credentials.refreshes, 1)
+        self.assertTrue(
+            requests[0].url.raw_path.startswith(b'/calendar/v3/calendars/cal%40group.calendar.google.com/events?')
+        )
+        self.assertEqual(requests[0].url.params['showDeleted'], 'true')
+        self.assertEqual(requests[1].url.params['pageToken'], 'page2')
+        self.assertTrue(all(r.headers['Authorization'] == 'Bearer token-1' for r in requests))
+
+    def test_retries_throttled_calls_and_raises_http_errors(self):
+        responses = [httpx.Response(429, headers={'Retry-After': '0'}), httpx.Response(200, json={'id': 'e1'})]
+        client = self.client(lambda request: responses.pop(0) if responses else httpx.Response(404))
+
+        async def calls():
+            event = await client.events_insert('cal', {'summary': 'Trip'})
+            with self.assertRaises(HttpError) as cm:
+                await client.events_delete('cal', 'missing')
+            return event, cm.exception
+
+        event, error = asyncio.run(calls())
+        self.assertEqual(event, {'id': 'e1'})
+        self.assertEqual(error.resp.status, 404)
+        self.assertEqual(client.stats(), {'requests': 3, 'errors': 2, 'token_refreshes': 1})
+
+    def test_stops_channels(self):
+        bodies = []
+
+        def handler(request: httpx.Request):
+            bodies.append((request.url.path, json.loads(request.content)))
+            return httpx.Response(204)
+
+        client = self.client(handler)
+        self.assertIsNone(asyncio.run(client.channels_stop({'id': 'channel', 'resourceId': 'resource'})))
+        self.assertEqual(bodies, [('/calendar/v3/channels/stop', {'id': 'channel', 'resourceId': 'resource'})])
+
+
+class FindTripsByEventIdsTest(TestCase):
+    def test_resolves_by_key_and_through_index(self):
+        trips = MOCK_DB.collection('trips')
+        trips.document('index_event_a').set({'eventId': 'index_event_a'})
+        booking_ref = trips.document('index_booking')
+        booking_ref.set({'eventId': 'index_event_b'})
+        index_event_trip('index_event_b', booking_ref)
+        cancelled_ref = trips.document('index_cancelled')
+        cancelled_ref.set({'eventId': ''})
+        index_event_trip('index_event_c', cancelled_ref)
+
+        with patch.object(settings, 'cal_event_index_fallback', False):
+            found = find_trips_by_event_ids(['index_event_a', 'index_event_b', 'index_event_c'])
+
+        self.assertEqual([trip.id for trip in found['index_event_a']], ['index_event_a'])
+        self.assertEqual([trip.id for trip in found['index_event_b']], ['index_booking'])
+        self.assertEqual(found['index_event_c'], [])
+        self.assertFalse(MOCK_DB.collection('eventTrips').document('index_event_a').get().exists)
+
+    def test_deleting_trip_for_event_removes_index_entry(self):
+        MOCK_DB.collection('properties').document('index_property').set({'propertyName': 'Office'})
+        booking_ref = MOCK_DB.collection('trips').document('index_deleted_booking')
+        booking_ref.set({'eventId': 'index_event_d'})
+        index_event_trip('index_event_d', booking_ref)
+
+        batches, batch_patch = mock_batches()
+        with batch_patch, patch.object(settings, 'cal_event_index_fallback', False):
+            delete_trip_from_event('properties/index_property', 'index_event_d')
+
+        # The trip is deleted through the reference saved in the index, which MockFirestore hands back as a copy
+        [batch] = batches
+        self.assertEqual(
+            [(action, reference.id) for action, reference, _ in batch.writes],
+            [('delete', 'index_deleted_booking'), ('delete', 'index_event_d')],
+        )
+        self.assertFalse(MOCK_DB.collection('eventTrips').document('index_event_d').get().exists)
+
+
+class MockWriteBatch:
+    """
+    Stands in for a Firestore write batch, which MockFirestore lacks, applying its writes to MOCK_DB on commit.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append(('set', reference, data))
+
+    def update(self, reference, data):
+        self.writes.append(('update', reference, data))
+
+    def delete(self, reference):
+        self.writes.append(('delete', reference, None))
+
+    def commit(self):
+        if self.fail:
+            raise RuntimeError('Batch commit failed')
+        for action, reference, data in self.writes:
+            if action == 'delete':
+                reference.delete()
+            else:
+                getattr(reference, action)(data)
+
+
+def mock_batches(fail: set[int] = frozenset()):
+    """
+    Patch MOCK_DB.batch, returning the batches handed out and the patch; the batches numbered in `fail` raise.
+    """
+    batches = []
+
+    def batch():
+        batches.append(MockWriteBatch(fail=len(batches) in fail))
+        return batches[-1]
+
+    return batches, patch.object(MOCK_DB, 'batch', batch, create=True)
+
+
+class SyncCheckpointTest(TestCase):
+    def test_resumes_from_checkpoint_and_clears_it(self):
+        property_ref = MOCK_DB.collection('properties').document('checkpoint_property')
+        property_ref.set({'externalCalendar': 'checkpoint@example.com', 'timezone': 'UTC', 'nextSyncToken': 'old'})
+        pages = {
+            None: {'items': [], 'nextPageToken': 'page_2'},
+            'page_2': {'items': [], 'nextPageToken': 'page_3'},
+            'page_3': {'items': [], 'nextSyncToken': 'new'},
+        }
+        requested, failing = [], {'page_3'}
+
+        def iter_event_pages(calendar_id, sync_token='', page_token=None):
+            while True:
+                requested.append((sync_token, page_token))
+                if page_token in failing:
+                    raise http_error(500)
+                yield pages[page_token]
+                page_token = pages[page_token].get('nextPageToken')
+                if not page_token:
+                    return
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.iter_event_pages', iter_event_pages),
+            patch('app.cal.tasks.process_events', return_value=[]) as process_events,
+        ):
+            with self.assertRaises(HTTPException):
+                _sync_calendar_events(property_ref)
+            checkpoint = sync_checkpoint_ref(property_ref).get().to_dict()
+            self.assertEqual((checkpoint['syncToken'], checkpoint['pageToken']), ('old', 'page_3'))
+            self.assertEqual(checkpoint['pagesCompleted'], 2)
+
+            failing.clear()
+            self.assertEqual(_sync_calendar_events(property_ref)['conflicts'], [])
+
+        self.assertEqual(requested[-1], ('old', 'page_3'))
+        self.assertEqual(process_events.call_count, 3)
+        self.assertEqual(property_ref.get().to_dict()['nextSyncToken'], 'new')
+        self.assertFalse(sync_checkpoint_ref(property_ref).get().exists)
+
+    def test_reads_the_sync_token_past_the_property_cache(self):
+        property_ref = MOCK_DB.collection('properties').document('cached_token_property')
+        property_ref.set({'externalCalendar': 'cached@example.com', 'timezone': 'UTC', 'nextSyncToken': 'stale'})
+        cache = PropertyCache(MOCK_DB, ttl=300)
+        cache.get(property_ref)
+        # Another worker completes a sync after this one cached the property
+        property_ref.update({'nextSyncToken': 'current'})
+        requested = []
+
+        def iter_event_pages(calendar_id, sync_token='', page_token=None):
+            requested.append(sync_token)
+            yield {'items': [], 'nextSyncToken': 'next'}
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.property_cache', cache),
+            patch('app.cal.tasks.iter_event_pages', iter_event_pages),
+            patch('app.cal.tasks.process_events', return_value=[]),
+        ):
+            _sync_calendar_events(property_ref)
+
+        self.assertEqual(requested, ['current'])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def checkpointed_sync(self, property_id: str, checkpoint: dict) -> list:
+        property_ref = MOCK_DB.collection('properties').document(property_id)
+        property_ref.set({'externalCalendar': f'{property_id}@example.com', 'timezone': 'UTC', 'nextSyncToken': 'old'})
+        sync_checkpoint_ref(property_ref).set({'syncToken': 'old', 'pagesCompleted': 4, **checkpoint})
+        requested = []
+
+        def iter_event_pages(calendar_id, sync_token='', page_token=None):
+            requested.append(page_token)
+            if page_token == 'rejected':
+                raise http_error(400, 'badRequest')
+            yield {'items': [], 'nextSyncToken': 'new'}
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.iter_event_pages', iter_event_pages),
+            patch('app.cal.tasks.process_events', return_value=[]),
+        ):
+            _sync_calendar_events(property_ref)
+
+        self.assertEqual(property_ref.get().to_dict()['nextSyncToken'], 'new')
+        self.assertFalse(sync_checkpoint_ref(property_ref).get().exists)
+        return requested
+
+    def test_restarts_when_the_checkpoint_page_token_is_rejected(self):
+        checkpoint = {'pageToken': 'rejected', 'updatedAt': datetime.now(timezone.utc)}
+        self.assertEqual(self.checkpointed_sync('rejected_checkpoint_property', checkpoint), ['rejected', None])
+
+    def test_ignores_a_stale_checkpoint(self):
+        checkpoint = {'pageToken': 'page_5', 'updatedAt': datetime.now(timezone.utc) - timedelta(days=1)}
+        self.assertEqual(self.checkpointed_sync('stale_checkpoint_property', checkpoint), [None])
+
+
+class PropertyCacheTest(TestCase):
+    def test_serves_from_memory_until_ttl_or_invalidation(self):
+        property_ref = MOCK_DB.collection('properties').document('cached_property')
+        property_ref.set({'propertyName': 'Before', 'timezone': 'UTC'})
+        cache = PropertyCache(MOCK_DB, ttl=0.05)
+        cache.start()
+
+        self.assertEqual(cache.get(property_ref).get('propertyName'), 'Before')
+        property_ref.update({'propertyName': 'After'})
+        self.assertEqual(cache.get('properties/cached_property').get('propertyName'), 'Before')
+
+        cache.invalidate(property_ref)
+        self.assertEqual(cache.get('cached_property').get('propertyName'), 'After')
+
+        property_ref.update({'propertyName': 'Expired'})
+        time.sleep(0.06)
+        self.assertEqual(cache.get(property_ref).get('propertyName'), 'Expired')
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+        self.assertFalse(stats['listening'])
+        self.assertFalse(cache.get('missing_property').exists)
+
+
+class UserProfileCacheTest(TestCase):
+    def test_prefetch_serves_profiles_and_counts_saved_reads(self):
+        users = MOCK_DB.collection('users')
+        users.document('cached_host').set({'display_name': 'Host', 'email': 'host@example.com', 'password': 'x'})
+        users.document('cached_guest').set({'display_name': 'Guest', 'smsOptIn': False})
+        cache = UserProfileCache(MOCK_DB, max_size=2, ttl=60)
+
+        with cache.track('job'):
+            cache.prefetch([users.document('cached_host'), 'users/cached_guest', 'users/cached_host'])
+            host = cache.get(users.document('cached_host'))
+            cache.get('cached_host')
+            cache.get('users/cached_guest')
+
+        self.assertEqual(host['email'], 'host@example.com')
+        self.assertNotIn('password', host)
+        stats = cache.stats()
+        self.assertEqual(stats['jobs']['job'], {'reads_saved': 3, 'reads': 2})
+
+        self.assertIsNone(cache.get('missing_user'))
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+class FakeCalendarRequest:
+    def __init__(self, calendar_id: str, body: dict, method: str = 'POST'):
+        self.method = method
+        self.uri = f'https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events?alt=json'
+        self.body = body
+
+
+class FakeBatchHttpRequest:
+    def __init__(self, service: 'FakeCalendarService', callback):
+        self.service = service
+        self.callback = callback
+        self.requests = {}
+
+    def add(self, request: FakeCalendarRequest, request_id: str):
+        self.requests[request_id] = request
+
+    def execute(self):
+        self.service.batches.append(list(self.requests))
+        if len(self.service.batches) - 1 in self.service.failing_batches:
+            raise http_error(400, 'badRequest')
+        for request_id in self.requests:
+            errors = self.service.errors.get(request_id)
+            if errors:
+                self.callback(request_id, None, errors.pop(0))
+            else:
+                self.callback(request_id, {'id': f'event_{request_id}'}, None)
+
+
+class FakeCalendarService:
+    """
+    Answers event inserts sent through the batch endpoint, failing a request with the next of its `errors` if any
+    and the batches numbered in `failing_batches` as a whole.
+    """
+
+    def __init__(self, errors: dict[str, list[HttpError]] | None = None, failing_batches: set[int] = frozenset()):
+        self.errors = errors or {}
+        self.failing_batches = failing_batches
+        self.batches = []
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId: str, body: dict) -> FakeCalendarRequest:
+        return FakeCalendarRequest(calendarId, body)
+
+    def new_batch_http_request(self, callback) -> FakeBatchHttpRequest:
+        return FakeBatchHttpRequest(self, callback)
+
+
+def fast_limiter() -> GoogleApiLimiter:
+    return GoogleApiLimiter(rate=1000, burst=1000, base_delay=0.001, max_delay=0.01)
+
+
+class ExecuteCalendarBatchTest(TestCase):
+    def test_chunks_requests_and_retries_throttled_ones(self):
+        service = FakeCalendarService({'r5': [http_error(429)], 'r60': [http_error(503)], 'r7': [http_error(404)]})
+        requests = {f'r{i}': service.insert('cal@example.com', {'summary': str(i)}) for i in range(120)}
+        # Unlike an insert, a patch can be resent after a server error
+        requests['r60'] = FakeCalendarRequest('cal@example.com', {'summary': '60'}, method='PATCH')
+
+        with (
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+        ):
+            responses, errors = execute_calendar_batch(requests)
+
+        self.assertEqual([len(keys) for keys in service.batches], [50, 50, 20, 2])
+        self.assertEqual(service.batches[-1], ['r5', 'r60'])
+        self.assertEqual(len(responses), 119)
+        self.assertEqual(responses['r5'], {'id': 'event_r5'})
+        self.assertEqual(list(errors), ['r7'])
+        self.assertEqual(errors['r7'].resp.status, 404)
+
+    def test_does_not_resend_inserts_after_a_server_error(self):
+        service = FakeCalendarService({'r1': [http_error(503)], 'r2': [http_error(429)]})
+        requests = {f'r{i}': service.insert('cal@example.com', {'summary': str(i)}) for i in range(3)}
+
+        with (
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+        ):
+            responses, errors = execute_calendar_batch(requests)
+
+        self.assertEqual(service.batches, [['r0', 'r1', 'r2'], ['r2']])
+        self.assertEqual(sorted(responses), ['r0', 'r2'])
+        self.assertEqual(errors['r1'].resp.status, 503)
+
+    def test_failed_batch_keeps_other_responses(self):
+        service = FakeCalendarService(failing_batches={1})
+        requests = {f'r{i}': service.insert('cal@example.com', {'summary': str(i)}) for i in range(120)}
+
+        with (
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+        ):
+            responses, errors = execute_calendar_batch(requests)
+
+        self.assertEqual([len(keys) for keys in service.batches], [50, 50, 20])
+        self.assertEqual(len(responses), 70)
+        self.assertEqual(sorted(errors), sorted(f'r{i}' for i in range(50, 100)))
+        self.assertEqual(errors['r50'].resp.status, 400)
+
+    def test_create_events_for_future_trips_writes_event_ids_back(self):
+        MOCK_DB.collection('properties').document('future_events_property').set(
+            {'propertyName': 'Office', 'externalCalendar': 'future@example.com'}
+        )
+        MOCK_DB.collection('users').document('future_guest').set({'display_name': 'Grace'})
+        trips = MOCK_DB.collection('trips')
+        trip_data = {
+            'userRef': 'users/future_guest',
+            'isExternal': False,
+            'tripBeginDateTime': datetime(2030, 1, 1, 9, tzinfo=timezone.utc),
+            'tripEndDateTime': datetime(2030, 1, 1, 17, tzinfo=timezone.utc),
+        }
+        for trip_id in ('future_trip_0', 'future_trip_1', 'future_trip_2'):
+            trips.document(trip_id).set(trip_data)
+        trips.document('future_trip_done').set(dict(trip_data, eventId='existing_event'))
+        service = FakeCalendarService({'future_trip_1': [http_error(429)], 'future_trip_2': [http_error(404)]})
+
+        def future_trips(property_ref, external):
+            # MockFirestore cannot run the future trips query, so return the property's trips instead
+            self.assertEqual((property_ref.id, external), ('future_events_property', False))
+            trip_ids = ('future_trip_0', 'future_trip_1', 'future_trip_2', 'future_trip_done')
+            return [trips.document(trip_id).get() for trip_id in trip_ids]
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.future_trips', future_trips),
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+            patch('app.cal.tasks.CALENDAR_BATCH_LIMIT', 2),
+        ):
+            create_events_for_future_trips('future_events_property')
+
+        self.assertEqual(service.batches, [['future_trip_0', 'future_trip_1'], ['future_trip_2'], ['future_trip_1']])
+        self.assertEqual(trips.document('future_trip_0').get().to_dict()['eventId'], 'event_future_trip_0')
+        self.assertEqual(trips.document('future_trip_1').get().to_dict()['eventId'], 'event_future_trip_1')
+        self.assertNotIn('eventId', trips.document('future_trip_2').get().to_dict())
+        index_entry = MOCK_DB.collection('eventTrips').document('event_future_trip_0').get()
+        self.assertEqual(index_entry.to_dict()['tripRef'].id, 'future_trip_0')
+
+
+class CreateEventsForFutureTripsTest(TestCase):
+    def test_stores_event_ids_created_before_a_batch_fails(self):
+        MOCK_DB.collection('properties').document('partial_events_property').set(
+            {'propertyName': 'Office', 'externalCalendar': 'partial@example.com'}
+        )
+        MOCK_DB.collection('users').document('partial_guest').set({'display_name': 'Grace'})
+        trips = MOCK_DB.collection('trips')
+        trip_ids = ('partial_trip_0', 'partial_trip_1', 'partial_trip_2')
+        for trip_id in trip_ids:
+            trips.document(trip_id).set(
+                {
+                    'userRef': 'users/partial_guest',
+                    'isExternal': False,
+                    'tripBeginDateTime': datetime(2030, 1, 1, 9, tzinfo=timezone.utc),
+                    'tripEndDateTime': datetime(2030, 1, 1, 17, tzinfo=timezone.utc),
+                }
+            )
+        service = FakeCalendarService(failing_batches={1})
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch(
+                'app.cal.tasks.future_trips', lambda property_ref, external: [trips.document(i).get() for i in trip_ids]
+            ),
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+            patch('app.cal.tasks.CALENDAR_BATCH_LIMIT', 2),
+        ):
+            create_events_for_future_trips('partial_events_property')
+
+        self.assertEqual(trips.document('partial_trip_0').get().to_dict()['eventId'], 'event_partial_trip_0')
+        self.assertEqual(trips.document('partial_trip_1').get().to_dict()['eventId'], 'event_partial_trip_1')
+        self.assertNotIn('eventId', trips.document('partial_trip_2').get().to_dict())
+
+
+class CreateOrUpdateEventsFromTripsTest(TestCase):
+    def test_reports_a_result_per_item(self):
+        MOCK_DB.collection('properties').document('batch_no_calendar').set({'propertyName': 'Office'})
+        MOCK_DB.collection('properties').document('batch_property').set(
+            {'propertyName': 'Office', 'externalCalendar': 'calendar@example.com'}
+        )
+        MOCK_DB.collection('trips').document('batch_no_guest').set({'tripBeginDateTime': datetime(2030, 1, 1)})
+        items = [
+            EventFromTrip(trip_ref='trips/batch_trip', property_ref='properties/batch_missing'),
+            EventFromTrip(trip_ref='trips/batch_other', property_ref='properties/batch_no_calendar'),
+            EventFromTrip(trip_ref='trips/batch_missing', property_ref='properties/batch_property'),
+            EventFromTrip(trip_ref='trips/batch_no_guest', property_ref='properties/batch_property'),
+            EventFromTrip(trip_ref='trips/batch_no_property', property_ref=''),
+            EventFromTrip(trip_ref='', property_ref='properties/batch_property'),
+        ]
+
+        results = create_or_update_events_from_trips(items)
+
+        self.assertEqual([result['tripRef'] for result in results], [item.trip_ref for item in items])
+        self.assertEqual({result['status'] for result in results}, {'error'})
+        self.assertEqual(
+            [result['message'] for result in results],
+            [
+                'Property document does not exist',
+                'No external calendar set for property',
+                'Trip document does not exist',
+                'User document does not exist',
+                'Invalid property document reference',
+                'Trip document does not exist',
+            ],
+        )
+
+    def test_failed_calendar_does_not_fail_the_others(self):
+        properties = MOCK_DB.collection('properties')
+        properties.document('batch_ok_property').set({'propertyName': 'Office', 'externalCalendar': 'ok@example.com'})
+        properties.document('batch_bad_property').set({'propertyName': 'Suite', 'externalCalendar': 'bad@example.com'})
+        MOCK_DB.collection('users').document('batch_guest').set({'display_name': 'Grace'})
+        trip_data = {
+            'userRef': 'users/batch_guest',
+            'tripBeginDateTime': datetime(2030, 1, 1, 9, tzinfo=timezone.utc),
+            'tripEndDateTime': datetime(2030, 1, 1, 17, tzinfo=timezone.utc),
+        }
+        MOCK_DB.collection('trips').document('batch_ok_trip').set(trip_data)
+        MOCK_DB.collection('trips').document('batch_bad_trip').set(trip_data)
+        items = [
+            EventFromTrip(trip_ref='trips/batch_ok_trip', property_ref='properties/batch_ok_property'),
+            EventFromTrip(trip_ref='trips/batch_bad_trip', property_ref='properties/batch_bad_property'),
+        ]
+        service = FakeCalendarService(failing_batches={1})
+
+        _, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.get_calendar_service', return_value=service),
+            patch('app.cal.tasks.google_api_limiter', fast_limiter()),
+        ):
+            ok, bad = create_or_update_events_from_trips(items)
+
+        self.assertEqual((ok['status'], ok['eventId']), ('created', 'event_trips/batch_ok_trip'))
+        self.assertEqual(bad['status'], 'error')
+        trip = MOCK_DB.collection('trips').document('batch_ok_trip').get().to_dict()
+        self.assertEqual(trip['eventId'], 'event_trips/batch_ok_trip')
+
+    def test_rejects_duplicate_trips(self):
+        item = EventFromTrip(trip_ref='trips/batch_trip', property_ref='properties/batch_property')
+        with self.assertRaises(HTTPException) as cm:
+            process_create_or_update_events_from_trips(EventFromTripBatch(items=[item, item]), token='token')
+        self.assertEqual(cm.exception.status_code, 400)
+
+
+def availability_index_with(trips: dict[str, tuple[datetime, datetime]]) -> AvailabilityIndex:
+    index = AvailabilityIndex(MOCK_DB, ttl=60)
+    # MockFirestore cannot run the upcoming trips query, so start from these trips instead
+    index._load = lambda property_ref: [
+        (trip_id, start.timestamp(), end.timestamp()) for trip_id, (start, end) in trips.items()
+    ]
+    return index
+
+
+class UpdateExistingTripTest(TestCase):
+    def test_skips_unchanged_events_and_writes_only_changed_fields(self):
+        event = GCalEvent(
+            id='hash_event',
+            status='confirmed',
+            start={'dateTime': '2030-01-01T09:00:00+00:00'},
+            end={'dateTime': '2030-01-01T17:00:00+00:00'},
+            summary='Reserved',
+        )
+        property_ref = MOCK_DB.collection('properties').document('hash_property')
+        trip_data = convert_event_to_trip_data(event, property_ref, get_timezone('UTC'))
+        trip_ref = MOCK_DB.collection('trips').document('hash_event')
+        trip_ref.set(dict(trip_data.dict(), tripCreated=datetime(2029, 1, 1, tzinfo=timezone.utc)))
+
+        writes = TripWrites()
+        with patch('app.cal.tasks.availability_index', availability_index_with({})):
+            update_existing_trip(trip_ref.get(), trip_data, event, writes)
+            self.assertEqual(writes.counts['skipped'], 1)
+            self.assertEqual(writes._writes_by_event, {})
+
+            event.summary = 'Blocked'
+            update_existing_trip(trip_ref.get(), convert_event_to_trip_data(event, property_ref), event, writes)
+        [(action, _, changes, _, _)] = writes._writes_by_event['hash_event']
+        self.assertEqual(action, 'update')
+        self.assertEqual(set(changes), {'eventSummary', 'eventHash'})
+
+
+class TripWritesTest(TestCase):
+    def test_splits_batches_at_limit_without_splitting_events(self):
+        trips = MOCK_DB.collection('trips')
+        writes = TripWrites()
+        for i in range(499):
+            writes.create(f'split_{i}', trips.document(f'split_{i}'), {'eventId': f'split_{i}'}, 'Created %s', i)
+        # Would straddle the limit, so both writes of this event go in the second batch
+        writes.update('split_pair', trips.document('split_0'), {'eventSummary': 'Moved'}, 'Updated trip')
+        writes.delete('split_pair', trips.document('split_1'), 'Deleted trip')
+        for i in range(499, 600):
+            writes.create(f'split_{i}', trips.document(f'split_{i}'), {'eventId': f'split_{i}'}, 'Created %s', i)
+
+        batches, batch_patch = mock_batches(fail={1})
+        with batch_patch:
+            failed = writes.commit()
+
+        self.assertEqual([len(batch.writes) for batch in batches], [499, 103])
+        self.assertEqual(failed, {'split_pair', *(f'split_{i}' for i in range(499, 600))})
+        self.assertEqual((writes.counts['created'], writes.counts['updated'], writes.counts['deleted']), (499, 0, 0))
+        self.assertTrue(trips.document('split_1').get().exists)
+        self.assertFalse(trips.document('split_599').get().exists)
+
+    def test_process_events_commits_large_pages_and_reloads_indexes_on_failure(self):
+        # MockFirestore saves a deep copy of its whole store with every document reference, so use the path here
+        property_ref = 'properties/large_page_property'
+        start = datetime(2030, 1, 1, 9, tzinfo=timezone.utc)
+        events = [
+            GCalEvent(
+                id=f'large_page_{i}',
+                status='confirmed',
+                start={'dateTime': (start + timedelta(days=i)).isoformat()},
+                end={'dateTime': (start + timedelta(days=i, hours=8)).isoformat()},
+                summary='Reserved',
+            )
+            for i in range(600)
+        ]
+        booking, availability = booking_index_with({}), availability_index_with({})
+
+        batches, batch_patch = mock_batches(fail={1})
+        with (
+            batch_patch,
+            patch('app.cal.tasks.booking_index', booking),
+            patch('app.cal.tasks.availability_index', availability),
+            patch.object(settings, 'cal_event_index_fallback', False),
+        ):
+            self.assertEqual(process_events(events, property_ref, get_timezone('UTC')), [])
+
+        self.assertEqual([len(batch.writes) for batch in batches], [500, 100])
+        self.assertTrue(MOCK_DB.collection('trips').document('large_page_499').get().exists)
+        self.assertFalse(MOCK_DB.collection('trips').document('large_page_500').get().exists)
+        # The indexes already hold the trips that failed to write, so they are dropped and reloaded next time
+        self.assertEqual((booking.stats()['properties'], availability.stats()['properties']), (0, 0))
+
+
+class ReconcileCalendarEventsTest(TestCase):
+    def test_writes_only_changed_trips_and_removes_missing_events(self):
+        # MockFirestore saves a deep copy of its whole store with every document reference, so use the path here
+        property_ref = 'properties/reconcile_property'
+        utc = get_timezone('UTC')
+        trips = MOCK_DB.collection('trips')
+
+        def event(event_id: str, day: int) -> dict:
+            return {
+                'id': event_id,
+                'status': 'confirmed',
+                'summary': 'Reserved',
+                'start': {'dateTime': f'2030-01-{day:02}T09:00:00+00:00'},
+                'end': {'dateTime': f'2030-01-{day:02}T17:00:00+00:00'},
+            }
+
+        for event_id, day in [('reconcile_unchanged', 1), ('reconcile_moved', 2), ('reconcile_gone', 3)]:
+            trip_data = convert_event_to_trip_data(GCalEvent(**event(event_id, day)), property_ref, utc)
+            trips.document(event_id).set(trip_data.dict())
+        page = {
+            'items': [event('reconcile_unchanged', 1), event('reconcile_moved', 5), event('reconcile_new', 6)],
+            'nextSyncToken': 'fresh',
+        }
+
+        def future_trips(property_ref, external):
+            # MockFirestore cannot run the future trips query, so return the property's trips instead
+            self.assertTrue(external)
+            return [
+                trips.document(trip_id).get()
+                for trip_id in ('reconcile_unchanged', 'reconcile_moved', 'reconcile_gone')
+            ]
+
+        batches, batch_patch = mock_batches()
+        with (
+            batch_patch,
+            patch('app.cal.tasks.iter_event_pages', return_value=[page]),
+            patch('app.cal.tasks.future_trips', future_trips),
+            patch('app.cal.tasks.booking_index', booking_index_with({})),
+            patch('app.cal.tasks.availability_index', availability_index_with({})),
+            patch.object(settings, 'cal_event_index_fallback', False),
+        ):
+            self.assertEqual(reconcile_calendar_events(property_ref, 'reconcile@example.com', utc), ('fresh', []))
+
+        self.assertEqual(len(batches[0].writes), 3)
+        self.assertEqual(
+            trips.document('reconcile_moved').get().to_dict()['tripBeginDateTime'],
+            datetime(2030, 1, 5, 9, tzinfo=timezone.utc),
+        )
+        self.assertTrue(trips.document('reconcile_new').get().exists)
+        self.assertFalse(trips.document('reconcile_gone').get().exists)
+        self.assertTrue(trips.document('reconcile_unchanged').get().exists)
+
+
+class OrderedQuery:
+    """
+    Stands in for a Firestore query over the given trips, which MockFirestore cannot order by document id or page
+    through with a cursor, skipping trips deleted since it was built.
+    """
+
+    def __init__(self, trip_ids: list[str], order: tuple = (), limit: int | None = None, after: dict | None = None):
+        self.trip_ids, self.order, self._limit, self.after = trip_ids, order, limit, after
+
+    def order_by(self, field: str):
+        return OrderedQuery(self.trip_ids, self.order + (field,), self._limit, self.after)
+
+    def limit(self, count: int):
+        return OrderedQuery(self.trip_ids, self.order, count, self.after)
+
+    def start_after(self, cursor: dict):
+        return OrderedQuery(self.trip_ids, self.order, self._limit, cursor)
+
+    def stream(self):
+        trips = MOCK_DB.collection('trips')
+        docs = [doc for doc in (trips.document(trip_id).get() for trip_id in self.trip_ids) if doc.exists]
+
+        def key(doc):
+            return tuple(doc.id if field == '__name__' else doc.get(field) for field in self.order)
+
+        docs.sort(key=key)
+        if self.after:
+            after = tuple(self.after[field] for field in self.order)
+            docs = [doc for doc in docs if key(doc) > after]
+        return iter(docs[: self._limit])
+
+
+class DeleteTripsInBatchesTest(TestCase):
+    def setUp(self):
+        self.trips = MOCK_DB.collection('trips')
+        self.patches = [
+            patch('app.cal.tasks.booking_index', booking_index_with({})),
+            patch('app.cal.tasks.availability_index', availability_index_with({})),
+        ]
+        for index_patch in self.patches:
+            index_patch.start()
+
+    def tearDown(self):
+        for index_patch in self.patches:
+            index_patch.stop()
+
+    def add_trips(self, trips: dict[str, dict]) -> list[str]:
+        for trip_id, trip in trips.items():
+            self.trips.document(trip_id).set(
+                {
+                    'isExternal': True,
+                    'tripBeginDateTime': datetime(2030, 1, trip.pop('day'), tzinfo=timezone.utc),
+                    **trip,
+                }
+            )
+        return list(trips)
+
+    def test_clears_in_pages_and_resumes_from_the_cursor(self):
+        trip_ids = self.add_trips({f'clear_trip_{i}': {'day': 1 + i // 2} for i in range(7)})
+
+        batches, batch_patch = mock_batches()
+        with batch_patch, patch(
+            'app.cal.tasks.future_trips_query', lambda property_ref, external: OrderedQuery(trip_ids)
+        ):
+            first = clear_event_store('properties/clear_property', max_pages=2, page_size=3)
+            self.assertEqual((first['deleted'], first['pages'], first['complete']), (6, 2, False))
+            self.assertEqual(first['cursor']['__name__'], 'clear_trip_5')
+            self.assertTrue(self.trips.document('clear_trip_6').get().exists)
+
+            second = clear_event_store('properties/clear_property', start_after=first['cursor'], page_size=3)
+
+        self.assertEqual((second['deleted'], second['complete']), (1, True))
+        self.assertEqual([len(batch.writes) for batch in batches], [3, 3, 1])
+        self.assertFalse(any(self.trips.document(trip_id).get().exists for trip_id in trip_ids))
+
+    def test_deletes_only_trips_duplicating_the_event_trip(self):
+        trip_ids = self.add_trips(
+            {
+                'dup_event': {'day': 1, 'eventId': 'dup_event'},
+                'dup_copy': {'day': 1, 'eventId': 'dup_event'},
+                'dup_orphan': {'day': 2, 'eventId': 'dup_missing'},
+                'dup_booking': {'day': 3},
+            }
+        )
+
+        _, batch_patch = mock_batches()
+        with batch_patch, patch(
+            'app.cal.tasks.future_trips_query', lambda property_ref, external: OrderedQuery(trip_ids)
+        ):
+            result = delete_duplicate_trips('properties/dup_property')
+
+        self.assertEqual((result['deleted'], result['scanned'], result['complete']), (1, 4, True))
+        self.assertEqual(
+            [trip_id for trip_id in trip_ids if self.trips.document(trip_id).get().exists],
+            ['dup_event', 'dup_orphan', 'dup_booking'],
+        )
+
+
+class IntervalTreeTest(TestCase):
+    def test_overlapping_matches_brute_force(self):
+        rng = random.Random(7)
+        tree, intervals = IntervalTree(), {}
+        for i in range(500):
+            start = rng.uniform(0, 1000)
+            intervals[f't{i}'] = (start, start + rng.uniform(0.1, 20))
+            tree.add(f't{i}', *intervals[f't{i}'])
+        for i in range(0, 500, 3):
+            tree.remove(f't{i}')
+            del intervals[f't{i}']
+        tree.add('t1', 500, 510)
+        intervals['t1'] = (500, 510)
+
+        self.assertEqual(len(tree), len(intervals))
+        for _ in range(200):
+            start = rng.uniform(0, 1000)
+            end = start + rng.uniform(0, 30)
+            expected = {key for key, (s, e) in intervals.items() if s < end and e > start}
+            self.assertEqual(set(tree.overlapping(start, end)), expected)
+
+
+def booking_index_with(trips: dict[str, tuple[datetime, datetime]]) -> BookingIndex:
+    tree = IntervalTree()
+    for trip_id, (start, end) in trips.items():
+        tree.add(trip_id, start.timestamp(), end.timestamp())
+    index = BookingIndex(MOCK_DB, ttl=60, buffer=timedelta(minutes=30))
+    # MockFirestore cannot run the upcoming trips query, so start from these trips instead
+    index._load = lambda property_ref: tree
+    return index
+
+
+class BookingIndexTest(TestCase):
+    def test_finds_conflicts_with_buffer_time(self):
+        day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        index = booking_index_with({'booked': (day.replace(hour=9), day.replace(hour=12))})
+
+        self.assertEqual(index.put('p', 'inside', day.replace(hour=10), day.replace(hour=11)), ['booked'])
+        self.assertEqual(index.put('p', 'buffer', day.replace(hour=12, minute=20), day.replace(hour=13)), ['booked'])
+        self.assertEqual(index.put('p', 'clear', day.replace(hour=14), day.replace(hour=15)), [])
+        # Moving a trip does not conflict with where it used to be
+        self.assertEqual(index.put('p', 'clear', day.replace(hour=14, minute=30), day.replace(hour=15)), [])
+
+        index.remove('booked')
+        self.assertEqual(index.put('p', 'inside', day.replace(hour=10), day.replace(hour=11)), [])
+        self.assertEqual(index.put('p', 'inside', day.replace(hour=11), day.replace(hour=12)), ['buffer'])
+        self.assertEqual(index.stats()['loads'], 1)
+        self.assertEqual(index.stats()['trips'], 3)
+
+    def test_write_trip_data_flags_conflicting_trips(self):
+        event = GCalEvent(
+            id='conflict_event',
+            status='confirmed',
+            start={'dateTime': '2030-01-01T10:00:00+00:00'},
+            end={'dateTime': '2030-01-01T11:00:00+00:00'},
+            summary='Airbnb (Not available)',
+        )
+        property_ref = MOCK_DB.collection('properties').document('conflict_property')
+        trip_data = convert_event_to_trip_data(event, property_ref, get_timezone('UTC'))
+        day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        index = booking_index_with({'teamworks_trip': (day.replace(hour=9), day.replace(hour=12))})
+
+        with patch('app.cal.tasks.booking_index', index), patch(
+            'app.cal.tasks.availability_index', availability_index_with({})
+        ):
+            writes = TripWrites()
+            write_trip_data(event, trip_data, [], writes)
+            [(action, _, data, _, _)] = writes._writes_by_event['conflict_event']
+            self.assertEqual(action, 'create')
+            self.assertTrue(data['bookingConflict'])
+            self.assertEqual([ref.id for ref in data['conflictingTripRefs']], ['teamworks_trip'])
+            self.assertEqual(writes.conflicts[0]['conflictingTripIds'], ['teamworks_trip'])
+
+            trip_ref = MOCK_DB.collection('trips').document('conflict_event')
+            trip_ref.set(data)
+            writes = TripWrites()
+            write_trip_data(event, trip_data, [trip_ref.get()], writes)
+            self.assertEqual(writes.counts['skipped'], 1)
+
+            index.remove('teamworks_trip')
+            write_trip_data(event, trip_data, [trip_ref.get()], writes)
+            [(_, _, changes, _, _)] = writes._writes_by_event['conflict_event']
+            self.assertEqual(changes, {'bookingConflict': False, 'conflictingTripRefs': []})
+
+
+class AvailabilityIndexTest(TestCase):
+    def test_busy_periods_follow_trip_changes(self):
+        day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        index = availability_index_with({'morning': (day.replace(hour=9), day.replace(hour=10, minute=10))})
+
+        self.assertEqual(
+            index.busy('properties/p', day, day + timedelta(days=1)),
+            [(day.replace(hour=9), day.replace(hour=10, minute=15))],
+        )
+        self.assertEqual(index.busy('p', day.replace(hour=8), day.replace(hour=9)), [])
+
+        # Overlapping trips keep their shared slots busy until both are gone, and runs carry on over midnight
+        index.put('p', 'overnight', day.replace(hour=10), day.replace(hour=22) + timedelta(hours=4))
+        index.remove('morning')
+        self.assertEqual(
+            index.busy('p', day, day + timedelta(days=2)),
+            [(day.replace(hour=10), day + timedelta(days=1, hours=2))],
+        )
+
+        index.put('p', 'overnight', day.replace(hour=11), day.replace(hour=12))
+        self.assertEqual(index.busy('p', day, day + timedelta(days=2)), [(day.replace(hour=11), day.replace(hour=12))])
+        index.remove('overnight')
+        self.assertEqual(index.busy('p', day, day + timedelta(days=2)), [])
+        self.assertEqual(index.stats()['days'], 0)
+
+    def test_availability_endpoint(self):
+        day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        index = availability_index_with({'booked': (day.replace(hour=9), day.replace(hour=17))})
+        request = AvailabilityRequest(
+            ranges=[
+                {'property_ref': 'p', 'start': day.replace(hour=8), 'end': day.replace(hour=10)},
+                {'property_ref': 'p', 'start': day.replace(hour=17), 'end': day.replace(hour=18)},
+            ]
+        )
+
+        with patch('app.cal.views.availability_index', index):
+            results = process_availability(request)['results']
+
+        self.assertEqual([result['free'] for result in results], [False, True])
+        self.assertEqual(results[0]['busy'], [{'start': day.replace(hour=9), 'end': day.replace(hour=10)}])
+
+    def test_availability_endpoint_mixes_naive_and_aware_bounds(self):
+        day = datetime(2030, 1, 1)
+        index = availability_index_with({'booked': (day.replace(hour=9), day.replace(hour=17))})
+        aware = AvailabilityRequest(
+            ranges=[
+                {'property_ref': 'p', 'start': day.replace(hour=8), 'end': day.replace(hour=10, tzinfo=timezone.utc)}
+            ]
+        )
+        backwards = AvailabilityRequest(
+            ranges=[
+                {'property_ref': 'p', 'start': day.replace(hour=10, tzinfo=timezone.utc), 'end': day.replace(hour=8)}
+            ]
+        )
+
+        with patch('app.cal.views.availability_index', index):
+            self.assertFalse(process_availability(aware)['results'][0]['free'])
+            with self.assertRaises(HTTPException) as raised:
+                process_availability(backwards)
+        self.assertEqual(raised.exception.status_code, 400)
+
+
+class SyncSchedulerTest(TestCase):
+    def test_bounded_queue_drained_by_workers(self):
+        scheduler = SyncScheduler(workers=2, max_queue=2)
+        release = threading.Event()
+        running = []
+
+        def job():
+            running.append(threading.current_thread().name)
+            release.wait(2)
+
+        self.assertIsNotNone(scheduler.submit('a', job))
+        self.assertIsNotNone(scheduler.submit('b', job))
+        while len(running) < 2:
+            time.sleep(0.01)
+        self.assertIsNotNone(scheduler.submit('c', job))
+        self.assertIsNotNone(scheduler.submit('d', job))
+        self.assertIsNone(scheduler.submit('e', job))
+        release.set()
+
+        self.assertTrue(scheduler.wait_idle(timeout=2))
+        self.assertEqual(len(running), 4)
+        self.assertTrue(all(name.startswith('sync-worker') for name in running))
+        stats = scheduler.stats()
+        self.assertEqual((stats['completed'], stats['rejected'], stats['depth'], stats['workers']), (4, 1, 0, 2))
+        self.assertGreater(stats['classes']['webhook']['max_wait_seconds'], 0)
+
+    def test_webhooks_run_before_manual_and_bulk(self):
+        scheduler = SyncScheduler(workers=1, max_queue=10, aging_seconds=3600)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def blocker():
+            started.set()
+            release.wait(2)
+
+        scheduler.submit('blocker', blocker, 'bulk')
+        self.assertTrue(started.wait(2))
+        for key, priority in [('b1', 'bulk'), ('m1', 'manual'), ('b2', 'bulk'), ('w1', 'webhook')]:
+            scheduler.submit(key, lambda key=key: order.append(key), priority)
+        release.set()
+
+        self.assertTrue(scheduler.wait_idle(timeout=2))
+        self.assertEqual(order, ['w1', 'm1', 'b1', 'b2'])
+
+    def test_bulk_limit_leaves_workers_for_webhooks(self):
+        scheduler = SyncScheduler(workers=2, max_queue=10, limits={'bulk': 1})
+        release = threading.Event()
+        webhook_ran = threading.Event()
+
+        futures = [scheduler.submit(f'b{i}', lambda: release.wait(2), 'bulk') for i in range(3)]
+        scheduler.submit('w1', webhook_ran.set, 'webhook')
+
+        self.assertTrue(webhook_ran.wait(1))
+        self.assertEqual(scheduler.stats()['classes']['bulk']['running'], 1)
+        release.set()
+        self.assertTrue(all(future.result(timeout=2) for future in futures))
+
+    def test_aging_lets_waiting_bulk_work_run(self):
+        scheduler = SyncScheduler(workers=1, max_queue=10, aging_seconds=0.01)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def blocker():
+            started.set()
+            release.wait(2)
+
+        scheduler.submit('blocker', blocker, 'webhook')
+        self.assertTrue(started.wait(2))
+        scheduler.submit('b1', lambda: order.append('b1'), 'bulk')
+        time.sleep(0.1)
+        scheduler.submit('w1', lambda: order.append('w1'), 'webhook')
+        release.set()
+
+        self.assertTrue(scheduler.wait_idle(timeout=2))
+        self.assertEqual(order, ['b1', 'w1'])
+
+    def test_run_returns_result_and_raises_when_full(self):
+        scheduler = SyncScheduler(workers=1, max_queue=1)
+        self.assertEqual(scheduler.run('a', lambda: 'synced'), 'synced')
+        with self.assertRaises(ValueError):
+            scheduler.run('b', lambda: int('x'))
+
+        started = threading.Event()
+        release = threading.Event()
+        scheduler.submit('c', lambda: started.set() or release.wait(2))
+        self.assertTrue(started.wait(2))
+        self.assertIsNotNone(scheduler.submit('d', lambda: None, 'manual'))
+        with self.assertRaises(HTTPException) as cm:
+            scheduler.run('e', lambda: None)
+        self.assertEqual(cm.exception.status_code, 503)
+        release.set()
+
+    def test_full_bulk_queue_does_not_reject_webhooks(self):
+        scheduler = SyncScheduler(workers=2, max_queue=2, limits={'bulk': 1})
+        release = threading.Event()
+        webhook_ran = threading.Event()
+
+        def produce_bulk():
+            for i in range(5):
+                scheduler.submit(f'b{i}', lambda: release.wait(2), 'bulk', block=True)
+
+        producer = threading.Thread(target=produce_bulk)
+        producer.start()
+        while scheduler.stats()['classes']['bulk']['depth'] < 2:
+            time.sleep(0.01)
+
+        self.assertIsNotNone(scheduler.submit('w1', webhook_ran.set, 'webhook'))
+        self.assertTrue(webhook_ran.wait(1))
+        release.set()
+        producer.join(2)
+        self.assertTrue(scheduler.wait_idle(timeout=2))
+        self.assertEqual(scheduler.stats()['rejected'], 0)
+
+    def test_coalescer_runs_on_scheduler(self):
+        scheduler = SyncScheduler(workers=1, max_queue=10)
+        coalescer = SyncCoalescer(window=0.01, scheduler=scheduler)
+        threads = []
+
+        for _ in range(3):
+            coalescer.submit('properties/a', lambda: threads.append(threading.current_thread().name))
+
+        self.assertTrue(coalescer.wait_idle(timeout=2))
+        self.assertEqual(threads, ['sync-worker-0'])
+        self.assertEqual(scheduler.stats()['classes']['webhook']['completed'], 1)
+
+    def test_set_google_calendar_id_runs_on_the_scheduler(self):
+        scheduler = SyncScheduler(workers=1, max_queue=1)
+        calls = []
+
+        def initialize_trips_from_cal(property_ref, cal_id):
+            calls.append((property_ref, cal_id, threading.current_thread().name))
+
+        with (
+            patch('app.cal.views.sync_scheduler', scheduler),
+            patch('app.cal.views.initialize_trips_from_cal', initialize_trips_from_cal),
+        ):
+            set_google_calendar_id(
+                PropertyCal(property_ref='properties/set_cal', cal_id='set@example.com'), token='token'
+            )
+
+        self.assertEqual(calls, [('properties/set_cal', 'set@example.com', 'sync-worker-0')])
+        self.assertTrue(scheduler.wait_idle(timeout=2))
+        self.assertEqual(scheduler.stats()['classes']['manual']['completed'], 1)